@@ -69,6 +69,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "maker.middleware.DatasetConditionalGetMiddleware",
     "django.middleware.cache.FetchFromCacheMiddleware",
 ]
 
@@ -158,6 +159,13 @@ DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = env.bool(
     "DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS", default=True
 )
 
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "maker.utils.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -288,6 +296,8 @@ DISCORD_ALERT_BOT_WEBHOOK_BA = env("DISCORD_ALERT_BOT_WEBHOOK_BA", default="")
 DISCORD_ALERT_BOT_WEBHOOK_MKR = env("DISCORD_ALERT_BOT_WEBHOOK_MKR", default="")
 
 CRYPTOCOMPARE_API_KEY = env("CRYPTOCOMPARE_API_KEY", default="")
+# Requests per second shared by all workers
+CRYPTOCOMPARE_RATE_LIMIT = env.float("CRYPTOCOMPARE_RATE_LIMIT", default=10)
 
 BLOCKANALITICA_PAPI_URL = env("BLOCKANALITICA_PAPI_URL", default="")
 BLOCKANALITICA_DATALAKE_URL = env("BLOCKANALITICA_DATALAKE_URL", default="")
@@ -176,3 +176,28 @@ AWBTC_TOKEN_ADDRESS = "0x9ff58f4fFB29fA2266Ab25e75e2A8b3503311656"
 
 SLIPPAGE_PAIR_SOURCE_1INCH = "oneinch"
 SLIPPAGE_PAIR_SOURCE_COW = "cow"
+
+INGESTION_CHUNK_STATUS_PENDING = "pending"
+INGESTION_CHUNK_STATUS_RUNNING = "running"
+INGESTION_CHUNK_STATUS_DONE = "done"
+INGESTION_CHUNK_STATUS_FAILED = "failed"
+INGESTION_CHUNK_STATUSES = [
+    (INGESTION_CHUNK_STATUS_PENDING, INGESTION_CHUNK_STATUS_PENDING),
+    (INGESTION_CHUNK_STATUS_RUNNING, INGESTION_CHUNK_STATUS_RUNNING),
+    (INGESTION_CHUNK_STATUS_DONE, INGESTION_CHUNK_STATUS_DONE),
+    (INGESTION_CHUNK_STATUS_FAILED, INGESTION_CHUNK_STATUS_FAILED),
+]
+
+DRAWDOWN_SOURCE_OHLCV = "ohlcv"
+DRAWDOWN_SOURCE_OSM = "osm"
+DRAWDOWN_SOURCES = [
+    (DRAWDOWN_SOURCE_OHLCV, DRAWDOWN_SOURCE_OHLCV),
+    (DRAWDOWN_SOURCE_OSM, DRAWDOWN_SOURCE_OSM),
+]
+
+# Datasets whose changes invalidate cached responses
+DATASET_VAULTS = "vaults"
+DATASET_OSM = "osm"
+DATASET_RISK_PREMIUM = "risk_premium"
+DATASET_OHLCV = "ohlcv"
+DATASET_ILKS = "ilks"
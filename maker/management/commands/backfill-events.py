@@ -0,0 +1,52 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from django.core.management.base import BaseCommand
+
+from maker.modules.ingestion import (
+    DEFAULT_CHUNK_SIZE,
+    INGESTION_HANDLERS,
+    get_runnable_chunk_ids,
+    plan_chunks,
+)
+from maker.tasks import process_ingestion_chunk_task
+
+
+class Command(BaseCommand):
+    """Splits a block range of an ingestion stream into chunks and processes them.
+    By default chunks are queued on celery so they're processed concurrently by all
+    workers. Re-running the command for the same range only picks up chunks that
+    haven't been completed yet.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("stream", choices=sorted(INGESTION_HANDLERS.keys()))
+        parser.add_argument("from_block", type=int)
+        parser.add_argument("to_block", type=int)
+        parser.add_argument("--key", default="")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--inline",
+            action="store_true",
+            help="Process chunks in this process instead of queuing them",
+        )
+
+    def handle(self, *args, **options):
+        stream = options["stream"]
+        key = options["key"]
+        plan_chunks(
+            stream,
+            options["from_block"],
+            options["to_block"],
+            key=key,
+            chunk_size=options["chunk_size"],
+        )
+        chunk_ids = get_runnable_chunk_ids(stream=stream, key=key)
+        for chunk_id in chunk_ids:
+            if options["inline"]:
+                process_ingestion_chunk_task(chunk_id)
+            else:
+                process_ingestion_chunk_task.delay(chunk_id)
+
+        self.stdout.write("Processed {} chunks".format(len(chunk_ids)))
@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve
+from rest_framework.renderers import JSONRenderer
+
+from maker.utils.renderers import FastJSONRenderer
+
+
+def capture_payload(path):
+    """Returns the data the view behind path responds with, before rendering"""
+    request = RequestFactory().get(path)
+    match = resolve(urlsplit(path).path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        raise CommandError("{} responded with {}".format(path, response.status_code))
+    return response.data
+
+
+def get_synthetic_payload(rows):
+    """Rows shaped like VaultEventsView results"""
+    dt = datetime(2022, 1, 1)
+    return {
+        "count": rows,
+        "next": None,
+        "previous": None,
+        "results": [
+            {
+                "datetime": dt + timedelta(minutes=idx),
+                "operation": "DEPOSIT-GENERATE",
+                "order_index": "{:012d}000001".format(idx),
+                "block_number": 14000000 + idx,
+                "collateral": Decimal("12.345678901234567890") * idx,
+                "principal": Decimal("25000.123456789012345678"),
+                "before_ratio": 180.123456,
+                "after_ratio": 175.654321,
+                "collateral_price": Decimal("3012.551234567890000000"),
+                "tx_hash": "0x{:064x}".format(idx),
+            }
+            for idx in range(rows)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    """Compares FastJSONRenderer with DRF's JSONRenderer. Payloads are captured by
+    calling the views of the given paths in process, so they hold the same Decimals
+    and datetimes the API renders. Without paths a synthetic payload is used.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--rows", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options["paths"]:
+            payloads = [(path, capture_payload(path)) for path in options["paths"]]
+        else:
+            payloads = [("synthetic", get_synthetic_payload(options["rows"]))]
+
+        renderers = [JSONRenderer(), FastJSONRenderer()]
+        for name, data in payloads:
+            outputs = [renderer.render(data) for renderer in renderers]
+            if json.loads(outputs[0]) != json.loads(outputs[1]):
+                raise CommandError("Renderers output differs for {}".format(name))
+
+            timings = [
+                min(
+                    timeit.repeat(
+                        lambda: renderer.render(data),
+                        number=1,
+                        repeat=options["repeat"],
+                    )
+                )
+                for renderer in renderers
+            ]
+            self.stdout.write(
+                "{}: {} bytes, JSONRenderer {:.2f} ms, FastJSONRenderer {:.2f} ms, "
+                "{:.1f}x".format(
+                    name,
+                    len(outputs[0]),
+                    timings[0] * 1000,
+                    timings[1] * 1000,
+                    timings[0] / timings[1],
+                )
+            )
@@ -2,11 +2,73 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_etags
+
+from maker.utils.cache import get_cache_versions, get_etag
+from maker.utils.metrics import increment
 
 
 class HealthCheckMiddleware(MiddlewareMixin):
     def process_request(self, request):
         if request.META["PATH_INFO"] == "/ping/":
             return HttpResponse("pong!")
+
+
+def _etag_matches(etag, if_none_match):
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in {
+        value[2:] if value.startswith("W/") else value for value in etags
+    }
+
+
+class DatasetConditionalGetMiddleware(MiddlewareMixin):
+    """
+    Adds ETags to responses of views that declare `cache_datasets`. The ETag is
+    derived from the request and the current dataset versions, so a request with a
+    matching If-None-Match gets a 304 without running the view. Views that also
+    declare `cache_time_bucket` get a new ETag every that many seconds.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        view_class = getattr(view_func, "cls", None)
+        datasets = getattr(view_class, "cache_datasets", None)
+        if not datasets:
+            return None
+
+        versions = get_cache_versions(
+            datasets, getattr(view_class, "cache_time_bucket", None)
+        )
+        request.dataset_etag = get_etag(request, versions)
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match and _etag_matches(request.dataset_etag, if_none_match):
+            increment("conditional_get.not_modified")
+            response = HttpResponseNotModified()
+            response["ETag"] = request.dataset_etag
+            return response
+        return None
+
+    def process_response(self, request, response):
+        if response.status_code != 200:
+            return response
+
+        etag = getattr(request, "dataset_etag", None)
+        if etag and not response.has_header("ETag"):
+            response["ETag"] = etag
+
+        # Responses served by FetchFromCacheMiddleware skip process_view, but still
+        # carry the ETag they were cached with
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if (
+            response.has_header("ETag")
+            and if_none_match
+            and _etag_matches(response["ETag"], if_none_match)
+        ):
+            increment("conditional_get.not_modified")
+            not_modified = HttpResponseNotModified()
+            not_modified["ETag"] = response["ETag"]
+            return not_modified
+        return response
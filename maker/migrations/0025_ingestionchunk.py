@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Generated by Django 4.1.7 on 2026-10-19 03:00
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("maker", "0024_alter_urneventstate_art_alter_urneventstate_dart_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestionChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("stream", models.CharField(max_length=64)),
+                ("key", models.CharField(blank=True, default="", max_length=64)),
+                ("from_block", models.IntegerField()),
+                ("to_block", models.IntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "pending"),
+                            ("running", "running"),
+                            ("done", "done"),
+                            ("failed", "failed"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("error", models.TextField(null=True)),
+            ],
+            options={
+                "ordering": ["stream", "key", "from_block"],
+                "get_latest_by": "to_block",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ingestionchunk",
+            index=models.Index(
+                fields=["stream", "key", "status"], name="maker_inges_stream_9dbc10_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="ingestionchunk",
+            unique_together={("stream", "key", "from_block", "to_block")},
+        ),
+    ]
@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Generated by Django 4.1.7 on 2026-10-19 03:13
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("maker", "0025_ingestionchunk"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DrawdownHistogram",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("ohlcv", "ohlcv"), ("osm", "osm")], max_length=16
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=64)),
+                (
+                    "ohlcv_type",
+                    models.CharField(
+                        choices=[("histoday", "daily"), ("histohour", "hourly")],
+                        max_length=16,
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("bucket", models.IntegerField()),
+                ("amount", models.IntegerField()),
+                ("start_timestamp", models.IntegerField()),
+                ("end_timestamp", models.IntegerField()),
+            ],
+            options={
+                "ordering": ["-date"],
+                "get_latest_by": "date",
+                "unique_together": {
+                    ("source", "symbol", "ohlcv_type", "date", "bucket")
+                },
+            },
+        ),
+    ]
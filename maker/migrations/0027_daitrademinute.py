@@ -0,0 +1,61 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Generated by Django 4.1.7 on 2026-10-19 03:28
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("maker", "0026_drawdownhistogram"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DAITradeMinute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("datetime", models.DateTimeField(db_index=True)),
+                ("exchange", models.CharField(max_length=50)),
+                ("price_bucket", models.DecimalField(decimal_places=3, max_digits=32)),
+                ("count", models.IntegerField()),
+                ("amount", models.DecimalField(decimal_places=18, max_digits=32)),
+                ("price_min", models.DecimalField(decimal_places=18, max_digits=32)),
+                ("price_max", models.DecimalField(decimal_places=18, max_digits=32)),
+                ("price_sum", models.DecimalField(decimal_places=18, max_digits=32)),
+            ],
+            options={
+                "ordering": ["-datetime"],
+                "get_latest_by": "datetime",
+                "unique_together": {("datetime", "exchange", "price_bucket")},
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Generated by Django 4.1.7 on 2026-10-19 03:53
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Expression indexes matching the UPPER(<column>::text) LIKE UPPER(...) SQL Django
+# generates for icontains and istartswith. They aren't declared on the models, so
+# databases without pg_trgm (e.g. tests) can still be created from them.
+TRGM_INDEXES = [
+    ("maker_vault_owner_address_trgm", "maker_vault", "owner_address"),
+    ("maker_vault_ds_proxy_address_trgm", "maker_vault", "ds_proxy_address"),
+    ("maker_vault_owner_name_trgm", "maker_vault", "owner_name"),
+    ("maker_vault_uid_trgm", "maker_vault", "uid"),
+]
+
+
+def _create_trgm_index(name, table, column):
+    return migrations.RunSQL(
+        sql=(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} "
+            f"USING gin (UPPER({column}::text) gin_trgm_ops)"
+        ),
+        reverse_sql=f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("maker", "0027_daitrademinute"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="vault",
+            index=models.Index(
+                fields=["owner_address"], name="maker_vault_owner_a_4f437f_idx"
+            ),
+        ),
+        TrigramExtension(),
+        *[_create_trgm_index(*index) for index in TRGM_INDEXES],
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                "maker_urneventstate_ilk_tx_hash_prefix ON maker_urneventstate "
+                "(ilk, UPPER(tx_hash::text) text_pattern_ops)"
+            ),
+            reverse_sql=(
+                "DROP INDEX CONCURRENTLY IF EXISTS "
+                "maker_urneventstate_ilk_tx_hash_prefix"
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Generated by Django 4.1.7 on 2026-10-19 04:25
+
+from django.db import migrations
+
+
+def backfill_drawdown_histograms(apps, schema_editor):
+    # Drawdown views only read the histograms, so they're built for the whole
+    # history on deploy instead of waiting for the nightly update
+    from maker.modules.drawdowns import update_drawdown_histograms
+
+    update_drawdown_histograms(full=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("maker", "0028_vault_search_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_drawdown_histograms, reverse_code=migrations.RunPython.noop
+        ),
+    ]
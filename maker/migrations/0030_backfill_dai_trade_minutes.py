@@ -0,0 +1,27 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Generated by Django 4.1.7 on 2026-10-19 04:31
+
+from django.db import migrations
+
+
+def backfill_dai_trade_minutes(apps, schema_editor):
+    # The DAI trades endpoints only read the rollup, which is otherwise filled just
+    # for trades ingested after the deploy
+    from maker.modules.dai_trades import rebuild_dai_trade_minutes
+
+    rebuild_dai_trade_minutes()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("maker", "0029_backfill_drawdown_histograms"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_dai_trade_minutes, reverse_code=migrations.RunPython.noop
+        ),
+    ]
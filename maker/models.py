@@ -7,7 +7,15 @@ from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from model_utils.models import TimeStampedModel, UUIDModel
 
-from .constants import ASSET_TYPES, OHLCV_TYPE_DAILY, OHLCV_TYPES
+from .constants import (
+    ASSET_TYPES,
+    DRAWDOWN_SOURCES,
+    INGESTION_CHUNK_STATUS_DONE,
+    INGESTION_CHUNK_STATUS_PENDING,
+    INGESTION_CHUNK_STATUSES,
+    OHLCV_TYPE_DAILY,
+    OHLCV_TYPES,
+)
 
 
 class MakerBackedToken(TimeStampedModel):
@@ -238,6 +246,7 @@ class Vault(TimeStampedModel):
         indexes = [
             models.Index(fields=["ilk", "is_active"]),
             models.Index(fields=["ilk", "urn"]),
+            models.Index(fields=["owner_address"]),
         ]
         unique_together = ["urn", "ilk"]
 
@@ -760,6 +769,28 @@ class DAITrade(TimeStampedModel):
         ordering = ["-datetime"]
 
 
+class DAITradeMinute(TimeStampedModel):
+    """
+    DAI trades per minute, exchange and DAI price rounded to 3 decimals. Maintained
+    when trades are ingested, so the DAI trades endpoints don't have to go through
+    all the trades.
+    """
+
+    datetime = models.DateTimeField(db_index=True)
+    exchange = models.CharField(max_length=50)
+    price_bucket = models.DecimalField(max_digits=32, decimal_places=3)
+    count = models.IntegerField()
+    amount = models.DecimalField(max_digits=32, decimal_places=18)
+    price_min = models.DecimalField(max_digits=32, decimal_places=18)
+    price_max = models.DecimalField(max_digits=32, decimal_places=18)
+    price_sum = models.DecimalField(max_digits=32, decimal_places=18)
+
+    class Meta:
+        get_latest_by = "datetime"
+        ordering = ["-datetime"]
+        unique_together = ["datetime", "exchange", "price_bucket"]
+
+
 class ForumPost(TimeStampedModel):
     segments = ArrayField(models.CharField(max_length=128), blank=True, null=True)
     vault_types = ArrayField(models.CharField(max_length=128), blank=True, null=True)
@@ -789,6 +820,27 @@ class OSMDaily(TimeStampedModel):
         ordering = ["-timestamp"]
 
 
+class DrawdownHistogram(TimeStampedModel):
+    """
+    Number of drawdowns per day and bucket of 5%, so drawdown histograms for any
+    date range can be read without going through the OHLCV or OSM history.
+    """
+
+    source = models.CharField(max_length=16, choices=DRAWDOWN_SOURCES)
+    symbol = models.CharField(max_length=64)
+    ohlcv_type = models.CharField(max_length=16, choices=OHLCV_TYPES)
+    date = models.DateField()
+    bucket = models.IntegerField()
+    amount = models.IntegerField()
+    start_timestamp = models.IntegerField()
+    end_timestamp = models.IntegerField()
+
+    class Meta:
+        get_latest_by = "date"
+        ordering = ["-date"]
+        unique_together = ["source", "symbol", "ohlcv_type", "date", "bucket"]
+
+
 # TODO: remove this comment - below are models from API app
 
 
@@ -1244,3 +1296,73 @@ class AuctionEvent(TimeStampedModel):
     class Meta:
         get_latest_by = "order_index"
         ordering = ["order_index"]
+
+
+class IngestionChunkManager(models.Manager):
+    def cursor(self, stream, key=""):
+        """
+        Returns the last block up to which all chunks of the stream have been
+        ingested without gaps, or None if the first chunk isn't done yet.
+        """
+        chunks = (
+            self.filter(stream=stream, key=key)
+            .order_by("from_block")
+            .values_list("from_block", "to_block", "status")
+        )
+        cursor = None
+        for from_block, to_block, status in chunks:
+            if status != INGESTION_CHUNK_STATUS_DONE:
+                break
+            if cursor is not None and from_block > cursor + 1:
+                break
+            cursor = to_block
+        return cursor
+
+    def resume_block(self, stream, latest_block, key=""):
+        """
+        Returns the block a regular sync of the stream should continue after. While
+        chunks of the stream are still pending, rows past the cursor can come from
+        chunks that finished out of order, so `latest_block` (the last stored row)
+        would skip the chunks that haven't run yet.
+        """
+        chunks = self.filter(stream=stream, key=key)
+        if not chunks.exclude(status=INGESTION_CHUNK_STATUS_DONE).exists():
+            return latest_block
+
+        cursor = self.cursor(stream, key=key)
+        if cursor is None:
+            cursor = chunks.order_by("from_block").first().from_block - 1
+        if latest_block is None:
+            return cursor
+        return min(latest_block, cursor)
+
+
+class IngestionChunk(TimeStampedModel):
+    stream = models.CharField(max_length=64)
+    key = models.CharField(max_length=64, default="", blank=True)
+    from_block = models.IntegerField()
+    to_block = models.IntegerField()
+    status = models.CharField(
+        max_length=16,
+        choices=INGESTION_CHUNK_STATUSES,
+        default=INGESTION_CHUNK_STATUS_PENDING,
+    )
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True)
+
+    objects = IngestionChunkManager()
+
+    class Meta:
+        get_latest_by = "to_block"
+        ordering = ["stream", "key", "from_block"]
+        unique_together = ["stream", "key", "from_block", "to_block"]
+        indexes = [
+            models.Index(fields=["stream", "key", "status"]),
+        ]
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__}: stream={self.stream}, key={self.key}, "
+            f"from_block={self.from_block}, to_block={self.to_block}, "
+            f"status={self.status}>"
+        )
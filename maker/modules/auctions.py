@@ -17,7 +17,15 @@ from django.db import IntegrityError
 from django.db.models import Avg, F, Sum
 from django_bulk_load import bulk_insert_models
 
-from maker.models import OSM, AuctionEvent, AuctionV1, ClipperEvent, Ilk, Vault
+from maker.models import (
+    OSM,
+    AuctionEvent,
+    AuctionV1,
+    ClipperEvent,
+    Ilk,
+    IngestionChunk,
+    Vault,
+)
 from maker.modules.slippage import get_slippage_for_lp, get_slippage_to_dai
 from maker.sources.cortex import fetch_cortex_clipper_events
 from maker.utils.s3 import download_csv_file_object
@@ -620,11 +628,19 @@ def get_ilk_auctions_per_date(ilk, dt=None):
     )
 
 
-def save_clipper_events():
-    latest_block = ClipperEvent.latest_block_number()
+def save_clipper_events(from_block=None, to_block=None):
+    if from_block is None:
+        latest_block = IngestionChunk.objects.resume_block(
+            "clipper_events", ClipperEvent.latest_block_number()
+        )
+    else:
+        latest_block = from_block - 1
     events = fetch_cortex_clipper_events(latest_block)
     bulk_create = []
     for event in events:
+        # Same as for urn event states, events come ordered by block
+        if to_block is not None and event["block_number"] > to_block:
+            break
         bulk_create.append(ClipperEvent(**event))
         if len(bulk_create) >= 1000:
             bulk_insert_models(bulk_create, ignore_conflicts=True)
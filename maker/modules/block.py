@@ -2,15 +2,167 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from collections import OrderedDict
 from datetime import datetime
 
+import numpy as np
 from django.conf import settings
+from django.core.cache import cache
+from django_bulk_load import bulk_insert_models
 
 from maker.utils.blockchain.chain import Blockchain
-from maker.utils.metrics import auto_named_statsd_timer
+from maker.utils.metrics import auto_named_statsd_timer, increment
+from maker.utils.utils import chunks
 
 from ..models import Block
 
+BLOCK_LRU_SIZE = 50000
+BLOCK_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Distance between anchor blocks that are resolved exactly when estimating block
+# timestamps. 1000 blocks is roughly 3.5 hours.
+BLOCK_INTERPOLATION_STEP = 1000
+
+
+class _LRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            if key in self._data:
+                self._data.move_to_end(key)
+                found[key] = self._data[key]
+        return found
+
+    def set_many(self, items):
+        for key, value in items.items():
+            self._data[key] = value
+            self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+# Block timestamps never change, so we can keep them around for the whole lifetime
+# of the process
+_block_timestamps_lru = _LRU(BLOCK_LRU_SIZE)
+
+
+def _cache_key(block_number):
+    return "Block.timestamp.{}".format(block_number)
+
+
+class BlockResolver:
+    """
+    Resolves block numbers to timestamps. Looks into the in-process LRU first, then
+    into redis, then into the Block table with a single query and finally fetches the
+    remaining blocks from the node with batched requests.
+    """
+
+    def __init__(self, chain=None):
+        self._chain = chain
+
+    @property
+    def chain(self):
+        if not self._chain:
+            self._chain = Blockchain()
+        return self._chain
+
+    def _from_cache(self, block_numbers):
+        timestamps = _block_timestamps_lru.get_many(block_numbers)
+        missing = [number for number in block_numbers if number not in timestamps]
+        if missing:
+            cached = cache.get_many([_cache_key(number) for number in missing])
+            for number in missing:
+                timestamp = cached.get(_cache_key(number))
+                if timestamp is not None:
+                    timestamps[number] = timestamp
+        return timestamps
+
+    def _from_db(self, block_numbers):
+        return dict(
+            Block.objects.filter(block_number__in=block_numbers).values_list(
+                "block_number", "timestamp"
+            )
+        )
+
+    def _from_chain(self, block_numbers):
+        timestamps = self.chain.get_block_timestamps(block_numbers)
+        bulk_insert_models(
+            [
+                Block(
+                    block_number=number,
+                    timestamp=timestamp,
+                    datetime=datetime.fromtimestamp(timestamp),
+                )
+                for number, timestamp in timestamps.items()
+            ],
+            ignore_conflicts=True,
+        )
+        return timestamps
+
+    @auto_named_statsd_timer
+    def get_timestamps(self, block_numbers):
+        """Returns {block_number: timestamp} for all block numbers"""
+        block_numbers = set(block_numbers)
+        timestamps = self._from_cache(block_numbers)
+        increment("block_resolver.cache_hit", len(timestamps))
+
+        found = {}
+        missing = sorted(block_numbers - timestamps.keys())
+        if missing:
+            found.update(self._from_db(missing))
+            increment("block_resolver.db_hit", len(found))
+            missing = [number for number in missing if number not in found]
+        if missing:
+            found.update(self._from_chain(missing))
+            increment("block_resolver.chain_hit", len(missing))
+
+        if found:
+            _block_timestamps_lru.set_many(found)
+            cache.set_many(
+                {_cache_key(number): ts for number, ts in found.items()},
+                timeout=BLOCK_CACHE_TIMEOUT,
+            )
+            timestamps.update(found)
+        return timestamps
+
+    def get_estimated_timestamps(self, block_numbers, step=BLOCK_INTERPOLATION_STEP):
+        """
+        Returns {block_number: timestamp} where timestamps of blocks that aren't
+        known yet are linearly interpolated between anchor blocks on a fixed grid
+        of `step` blocks. Use it only where a timestamp that's off by a few seconds
+        is good enough, as it saves fetching every single block from the node.
+        """
+        block_numbers = set(block_numbers)
+        timestamps = self._from_cache(block_numbers)
+        missing = block_numbers - timestamps.keys()
+        if missing:
+            timestamps.update(self._from_db(missing))
+            missing = missing - timestamps.keys()
+        if not missing:
+            return timestamps
+
+        anchors = set()
+        for number in missing:
+            anchors.add(number // step * step)
+            anchors.add(number // step * step + step)
+        # Blocks past the chain head can't be used as anchors, resolve them exactly
+        latest_block = self.chain.get_latest_block()
+        anchors = {number for number in anchors if number <= latest_block}
+        anchors.update(number for number in missing if number > latest_block - step)
+
+        anchor_timestamps = self.get_timestamps(anchors)
+        xs = np.array(sorted(anchor_timestamps.keys()))
+        ys = np.array([anchor_timestamps[x] for x in xs])
+        for number in missing:
+            timestamps[number] = int(round(np.interp(number, xs, ys)))
+        return timestamps
+
 
 def save_latest_blocks():
     chain = Blockchain(node=settings.ETH_NODE_MAKER)
@@ -20,30 +172,24 @@ def save_latest_blocks():
     except Block.DoesNotExist:
         latest_db_block = latest_chain_block - 1
 
-    for block_number in range(latest_db_block, latest_chain_block):
-        block_info = chain.get_block_info(block_number)
-        Block.objects.get_or_create(
-            block_number=block_number,
-            defaults=dict(
-                timestamp=block_info.timestamp,
-                datetime=datetime.fromtimestamp(block_info.timestamp),
-            ),
-        )
+    resolver = BlockResolver(chain=chain)
+    for block_numbers in chunks(range(latest_db_block, latest_chain_block), 1000):
+        resolver.get_timestamps(block_numbers)
 
 
 @auto_named_statsd_timer
-def get_or_save_block(block_number):
-    try:
-        block = Block.objects.get(block_number=block_number)
-    except Block.DoesNotExist:
-        chain = Blockchain()
-        block_info = chain.get_block_info(block_number)
-        block_timestamp = block_info.timestamp
-        block, _ = Block.objects.get_or_create(
-            block_number=block_number,
-            defaults=dict(
-                timestamp=block_timestamp,
-                datetime=datetime.fromtimestamp(block_timestamp),
-            ),
-        )
-    return block
+def get_block_timestamp(block_number):
+    return get_block_timestamps([block_number])[block_number]
+
+
+@auto_named_statsd_timer
+def get_block_timestamps(block_numbers, chain=None, estimate=False):
+    """
+    Bulk version of `get_block_timestamp`. Blocks that aren't stored yet are fetched
+    with batched requests and saved. With `estimate`, their timestamps are
+    interpolated between anchor blocks instead. Returns {block_number: timestamp}.
+    """
+    resolver = BlockResolver(chain=chain)
+    if estimate:
+        return resolver.get_estimated_timestamps(block_numbers)
+    return resolver.get_timestamps(block_numbers)
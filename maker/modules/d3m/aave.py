@@ -4,55 +4,75 @@
 
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
 
 import numpy as np
-import pandas as pd
 from django.db.models.functions import TruncHour
 from eth_utils import to_checksum_address
 from web3 import Web3
 
 from maker.models import D3M, SurplusBuffer
-from maker.modules.block import get_or_save_block
+from maker.modules.block import get_block_timestamps
 from maker.sources.blockanalitica import fetch_aave_historic_rate
 from maker.utils.blockchain.chain import Blockchain
 
+from .curve import RateCurve, get_utilization_rates
 from .helper import get_d3m_contract_data
+from .market import get_market_state
 
 
 def get_target_rate_history():
     """DEPRECATED"""
     chain = Blockchain()
     filters = {
-        "fromBlock": 14054075,
-        "toBlock": "latest",
         "address": to_checksum_address("0x12F36cdEA3A28C35aC8C6Cc71D9265c17C74A27F"),
         "topics": [
             "0xe986e40cc8c151830d4f61050f4fb2e4add8567caad2d5f5496f9158e91fe4c7"
         ],
     }
-    events = chain.eth.get_logs(filters)
+    events = []
+    for _, _, logs in chain.scan_logs(filters, 14054075):
+        events.extend(logs)
+    timestamps = get_block_timestamps(
+        [event["blockNumber"] for event in events], chain=chain
+    )
 
     for event in events:
-        block = get_or_save_block(event["blockNumber"])
+        timestamp = timestamps[event["blockNumber"]]
         target_borrow_rate = chain.convert_ray(Web3.toInt(hexstr=event["data"]))
         D3M.objects.update_or_create(
-            timestamp=block.timestamp,
-            datetime=block.datetime,
+            timestamp=timestamp,
+            datetime=datetime.fromtimestamp(timestamp),
             block_number=event["blockNumber"],
             protocol="aave",
             defaults=dict(target_borrow_rate=target_borrow_rate),
         )
 
 
-def get_current_balance(balance_contract):
+def get_current_balance(balance_contract, block_number=None):
     chain = Blockchain()
     contract = chain.get_contract(
         "0x028171bca77440897b824ca71d1c56cac55b68a3", abi_type="erc20"
     )
-    data = contract.caller.balanceOf(to_checksum_address(balance_contract))
+    data = contract.caller(block_identifier=block_number or "latest").balanceOf(
+        to_checksum_address(balance_contract)
+    )
     return round(Decimal(data) / Decimal(1e18), 2)
 
 
+def fetch_market_state(block_number):
+    d3m_data = D3M.objects.filter(protocol="aave").latest()
+    return {
+        "block_number": block_number,
+        "balance": get_current_balance(d3m_data.balance_contract, block_number),
+        "market": get_dai_market(block_number),
+    }
+
+
+def get_cached_market_state():
+    return get_market_state("aave", fetch_market_state)
+
+
 def save_d3m():
     ilk = "DIRECT-AAVEV2-DAI"
     data = get_d3m_contract_data(ilk)
@@ -70,7 +90,7 @@ def save_d3m():
 
 def get_d3m_short_info():
     d3m_data = D3M.objects.filter(protocol="aave").latest()
-    balance = get_current_balance(d3m_data.balance_contract)
+    balance = get_cached_market_state()["balance"]
 
     utilization = 0
     if d3m_data.max_debt_ceiling:
@@ -91,8 +111,9 @@ def get_d3m_info():
     ilk = "DIRECT-AAVEV2-DAI"
     d3m_data = D3M.objects.filter(ilk=ilk).latest()
     surplus_buffer = SurplusBuffer.objects.latest().amount
-    stats = get_dai_market()
-    balance = get_current_balance(d3m_data.balance_contract)
+    state = get_cached_market_state()
+    stats = dict(state["market"])
+    balance = state["balance"]
 
     utilization = 0
     if d3m_data.max_debt_ceiling:
@@ -115,7 +136,7 @@ def get_d3m_info():
     return data
 
 
-def get_dai_market():
+def get_dai_market(block_number=None):
     data_provider_address = "0x057835Ad21a177dbdd3090bB1CAE03EaCF78Fc6d"
     underlying_address = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
     token_calls = []
@@ -155,7 +176,7 @@ def get_dai_market():
     )
 
     w3 = Blockchain()
-    data = w3.call_multicall(token_calls)
+    data = w3.call_multicall(token_calls, block_id=block_number)
     item = data["getReserveData"]
     conf_data = data["getReserveConfigurationData"]
     decimals = conf_data[0]
@@ -189,12 +210,29 @@ def get_historic_rates(days_ago=30):
 RESERVE_FACTOR = 0.1
 
 
+@lru_cache(maxsize=None)
+def get_dai_curve():
+    u_optimal = 0.8
+    base = 0
+    slope_1 = 0.04
+    slope_2 = 0.75
+
+    utilization_rates = get_utilization_rates()
+    borrow_rates = []
+    for u_rate in utilization_rates:
+        if u_rate < u_optimal:
+            borrow_rate = base + (u_rate / u_optimal) * slope_1
+        else:
+            borrow_rate = (
+                base + slope_1 + ((u_rate - u_optimal) / (1 - u_optimal) * slope_2)
+            )
+        borrow_rates.append(round(borrow_rate, 4))
+    return RateCurve(utilization_rates, borrow_rates)
+
+
 class D3MAaveCompute:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._dai_curve = None
-        self._borrow_rate_df_cache = {}
-        self._utilization_rate_df_cache = {}
         self._todays_rate = None
         self._defi_rate = None
         self._rates = None
@@ -208,7 +246,7 @@ class D3MAaveCompute:
 
     def get_rates(self):
         if not self._rates:
-            rate = get_dai_market()
+            rate = get_cached_market_state()["market"]
             self._rates = {
                 "borrow_rate": Decimal(str(rate["borrow_rate"])),
                 "total_supply": Decimal(str(rate["total_supply"])),
@@ -220,65 +258,18 @@ class D3MAaveCompute:
         return self._rates
 
     @property
-    def dai_curve(self):
-        if not self._dai_curve:
-            u_optimal = 0.8
-            base = 0
-            slope_1 = 0.04
-            slope_2 = 0.75
-
-            data = []
-
-            utilization_rates = np.around(
-                np.linspace(start=0, stop=1, num=10000, endpoint=True), 4
-            )
-
-            for u_rate in utilization_rates:
-                if u_rate < u_optimal:
-                    borrow_rate = base + (u_rate / u_optimal) * slope_1
-                else:
-                    borrow_rate = (
-                        base
-                        + slope_1
-                        + ((u_rate - u_optimal) / (1 - u_optimal) * slope_2)
-                    )
+    def curve(self):
+        return get_dai_curve()
 
-                data.append(
-                    {
-                        "utilization_rate": Decimal(str(u_rate)),
-                        "borrow_rate": Decimal(str(round(borrow_rate, 4))),
-                    }
-                )
-            self._dai_curve = data
-        return self._dai_curve
+    @property
+    def dai_curve(self):
+        return self.curve.to_list()
 
     def get_utilization_rate_gte(self, value):
-        # We call this function many, many times so it's a bit weird for speed purposes
-        if not self._borrow_rate_df_cache:
-            df = pd.DataFrame.from_dict(self.dai_curve)
-            df_chunks = np.array_split(df, 30)
-            for chunk in df_chunks:
-                self._borrow_rate_df_cache[max(chunk["borrow_rate"])] = chunk
-
-        for max_value, chunk in self._borrow_rate_df_cache.items():
-            if value <= max_value:
-                return chunk.loc[chunk["borrow_rate"] <= value].iloc[-1][
-                    "utilization_rate"
-                ]
+        return self.curve.get_utilization_rate_gte(value)
 
     def get_borrow_rate_gte(self, value):
-        # We call this function many, many times so it's a bit weird for speed purposes
-        if not self._utilization_rate_df_cache:
-            df = pd.DataFrame.from_dict(self.dai_curve)
-            df_chunks = np.array_split(df, 30)
-            for chunk in df_chunks:
-                self._utilization_rate_df_cache[max(chunk["utilization_rate"])] = chunk
-
-        for max_value, chunk in self._utilization_rate_df_cache.items():
-            if value <= max_value:
-                return chunk.loc[chunk["utilization_rate"] >= value].iloc[0][
-                    "borrow_rate"
-                ]
+        return self.curve.get_borrow_rate_gte(value)
 
     def compute_metrics(self, target_borrow_rate, d3m_dc, heatmap=False):
         rates = self.get_rates()
@@ -389,3 +380,95 @@ class D3MAaveCompute:
             data["d3m_balance"] = old_current_dai
             data["d3m_exposure"] = d3m_exposure - old_current_dai
         return data
+
+    def compute_metrics_vectorized(self, target_borrow_rates, d3m_dcs, heatmap=True):
+        """
+        Same as `compute_metrics` for arrays of target borrow rates and debt ceilings,
+        which are broadcast against each other. Returns a dict of float64 arrays.
+        """
+        rates = {key: float(value) for key, value in self.get_rates().items()}
+        target_borrow_rate = np.asarray(target_borrow_rates, dtype=np.float64)
+        d3m_dc = np.asarray(d3m_dcs, dtype=np.float64)
+        target_borrow_rate, d3m_dc = np.broadcast_arrays(target_borrow_rate, d3m_dc)
+
+        unwind = np.zeros(target_borrow_rate.shape, dtype=bool)
+        if not heatmap:
+            unwind = target_borrow_rate > rates["borrow_rate"]
+        old_current_dai = max(0, float(self.d3m_model.balance))
+        d3m_current_dai = np.where(unwind, 0, old_current_dai)
+        d3m_dc_additional = np.maximum(0, d3m_dc - d3m_current_dai)
+        d3m_dc_additional[target_borrow_rate == 0] = 0
+        dai_supply = np.where(
+            unwind, rates["total_supply"] - old_current_dai, rates["total_supply"]
+        )
+        dai_borrow = rates["total_borrow"]
+
+        average_stable_rate = rates["borrow_stable_rate"]
+        share_variable_debt = rates["variable_debt"] / rates["total_borrow"]
+        share_stable_debt = rates["stable_debt"] / rates["total_borrow"]
+
+        simulation_dai_borrow = np.trunc(dai_borrow)
+        d3m_supply_needed = np.maximum(
+            np.trunc(
+                simulation_dai_borrow
+                / self.curve.utilization_rates_for(target_borrow_rate)
+                - dai_supply
+            ),
+            0,
+        )
+        d3m_exposure = np.minimum(d3m_dc_additional, d3m_supply_needed)
+        simulation_dai_supply = np.trunc(dai_supply + d3m_exposure)
+        simulation_utilization_rate = np.round(
+            simulation_dai_borrow / simulation_dai_supply, 6
+        )
+        simulation_borrow_rate = np.round(
+            self.curve.borrow_rates_for(simulation_utilization_rate), 6
+        )
+        simulation_supply_rate = np.round(
+            simulation_utilization_rate
+            * (
+                share_stable_debt * average_stable_rate
+                + share_variable_debt * simulation_borrow_rate
+            )
+            * (1 - RESERVE_FACTOR),
+            6,
+        )
+
+        simulation_dai_supply_target = dai_supply + d3m_supply_needed
+        simulation_utilization_rate_target = np.round(
+            dai_borrow / simulation_dai_supply_target, 6
+        )
+        implied_supply_rate = np.round(
+            simulation_utilization_rate_target
+            * (
+                share_stable_debt * average_stable_rate
+                + share_variable_debt * target_borrow_rate
+            )
+            * (1 - RESERVE_FACTOR),
+            6,
+        )
+
+        d3m_exposure_total = d3m_exposure + d3m_current_dai
+        return {
+            "d3m_dc": d3m_dc,
+            "target_borrow_rate": target_borrow_rate,
+            "simulation_dai_borrow": np.broadcast_to(
+                simulation_dai_borrow, d3m_dc.shape
+            ),
+            "d3m_supply_needed": d3m_supply_needed,
+            "d3m_exposure": np.where(
+                unwind, d3m_exposure - old_current_dai, d3m_exposure
+            ),
+            "simulation_dai_supply": simulation_dai_supply,
+            "simulation_utilization_rate": simulation_utilization_rate,
+            "simulation_borrow_rate": simulation_borrow_rate,
+            "simulation_supply_rate": simulation_supply_rate,
+            "simulation_dai_supply_target": simulation_dai_supply_target,
+            "simulation_utilization_rate_target": simulation_utilization_rate_target,
+            "implied_supply_rate": implied_supply_rate,
+            "share_dai_deposits": d3m_exposure_total / simulation_dai_supply,
+            "d3m_revenue": simulation_supply_rate
+            * np.minimum(d3m_dc, d3m_exposure_total),
+            "d3m_balance": np.where(unwind, old_current_dai, d3m_current_dai),
+            "d3m_exposure_total": np.where(unwind, d3m_exposure, d3m_exposure_total),
+        }
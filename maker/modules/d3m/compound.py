@@ -4,9 +4,9 @@
 
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
 
 import numpy as np
-import pandas as pd
 from django.db.models.functions import TruncHour
 from eth_utils import to_checksum_address
 
@@ -14,7 +14,9 @@ from maker.models import D3M, SurplusBuffer
 from maker.sources.blockanalitica import fetch_compound_historic_rate
 from maker.utils.blockchain.chain import Blockchain
 
+from .curve import RateCurve, get_utilization_rates
 from .helper import get_d3m_contract_data
+from .market import get_market_state
 
 D3M_COMP = "0x621fE4Fde2617ea8FFadE08D0FF5A862aD287EC2"
 COMPTROLLER_ADDRESS = "0x3d9819210A31b4961b30EF54bE2aeD79B9c9Cd3B"
@@ -25,18 +27,32 @@ BLOCKS_PER_YEAR = 2628000
 ILK = "DIRECT-COMPV2-DAI"
 
 
-def get_current_balance(balance_contract):
+def get_current_balance(balance_contract, block_number=None):
     chain = Blockchain()
     contract = chain.get_contract(
         "0x5d3a536E4D6DbD6114cc1Ead35777bAB948E3643", abi_type="ceth"
     )
-    data = contract.caller.balanceOf(to_checksum_address(balance_contract))
-    exchange_rate = contract.caller.exchangeRateStored()
+    caller = contract.caller(block_identifier=block_number or "latest")
+    data = caller.balanceOf(to_checksum_address(balance_contract))
+    exchange_rate = caller.exchangeRateStored()
     return round(
         (Decimal(data) / Decimal(1e8)) * (Decimal(exchange_rate) / Decimal(1e28)), 2
     )
 
 
+def fetch_market_state(block_number):
+    d3m_data = D3M.objects.filter(protocol="compound").latest()
+    return {
+        "block_number": block_number,
+        "balance": get_current_balance(d3m_data.balance_contract, block_number),
+        "market": get_compound_dai_market(block_number),
+    }
+
+
+def get_cached_market_state():
+    return get_market_state("compound", fetch_market_state)
+
+
 def save_d3m():
     ilk = "DIRECT-COMPV2-DAI"
     data = get_d3m_contract_data(ilk)
@@ -54,7 +70,7 @@ def save_d3m():
 
 def get_d3m_short_info():
     d3m_data = D3M.objects.filter(protocol="compound").latest()
-    balance = get_current_balance(d3m_data.balance_contract)
+    balance = get_cached_market_state()["balance"]
     return {
         "protocol": "Compound",
         "protocol_slug": "compound",
@@ -72,8 +88,9 @@ def get_d3m_info():
     ilk = "DIRECT-COMPV2-DAI"
     d3m_data = D3M.objects.filter(ilk=ilk).latest()
     surplus_buffer = SurplusBuffer.objects.latest().amount
-    stats = get_compound_dai_market()
-    balance = get_current_balance(d3m_data.balance_contract)
+    state = get_cached_market_state()
+    stats = dict(state["market"])
+    balance = state["balance"]
     data = {
         "protocol": "Compound",
         "protocol_slug": "compound",
@@ -108,7 +125,7 @@ def get_historic_rates(days_ago=30):
     }
 
 
-def get_compound_dai_market():
+def get_compound_dai_market(block_number=None):
     token_address = "0x5d3a536E4D6DbD6114cc1Ead35777bAB948E3643"
     token_calls = []
     token_calls.append(
@@ -180,7 +197,7 @@ def get_compound_dai_market():
     )
 
     w3 = Blockchain()
-    data = w3.call_multicall(token_calls)
+    data = w3.call_multicall(token_calls, block_id=block_number)
     underlying_price = Decimal(data["underlying_price"]) / Decimal(1e18)
     data["total_supply"] = (data["total_supply"] / 10**8) * (
         data["exchange_rate"] / 10**28
@@ -204,12 +221,30 @@ def get_compound_dai_market():
     return data
 
 
+@lru_cache(maxsize=None)
+def get_dai_curve():
+    kink = Decimal("0.8")
+    base = 0
+    multiplier_per_block = Decimal("0.000000023782343987")
+    jump_multiplier_per_block = Decimal("0.000000518455098934")
+
+    utilization_rates = get_utilization_rates()
+    borrow_rates = []
+    for utilization in utilization_rates.tolist():
+        utilization = Decimal(str(utilization))
+        if utilization < kink:
+            rate_per_block = base + (utilization * multiplier_per_block)
+        else:
+            normal_rate = base + kink * multiplier_per_block
+            excess_util = utilization - kink
+            rate_per_block = normal_rate + (excess_util * jump_multiplier_per_block)
+        borrow_rates.append(round(rate_per_block * BLOCKS_PER_YEAR, 4))
+    return RateCurve(utilization_rates, borrow_rates)
+
+
 class D3MCompoundCompute:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._dai_curve = None
-        self._borrow_rate_df_cache = {}
-        self._utilization_rate_df_cache = {}
         self._todays_rate = None
         self._defi_rate = None
         self._rates = None
@@ -218,7 +253,7 @@ class D3MCompoundCompute:
 
     def get_rates(self):
         if not self._rates:
-            rate = get_compound_dai_market()
+            rate = get_cached_market_state()["market"]
             self._rates = {
                 "total_supply": Decimal(str(rate["total_supply"])),
                 "total_borrow": Decimal(str(rate["total_borrow"])),
@@ -243,69 +278,19 @@ class D3MCompoundCompute:
             self._d3m_balance = None
         return self._d3m_balance
 
+    @property
+    def curve(self):
+        return get_dai_curve()
+
     @property
     def dai_curve(self):
-        if not self._dai_curve:
-            kink = Decimal("0.8")
-            base = 0
-            multiplier_per_block = Decimal("0.000000023782343987")
-            jump_multiplier_per_block = Decimal("0.000000518455098934")
-
-            data = []
-
-            utilization_rates = np.around(
-                np.linspace(start=0, stop=1, num=10000, endpoint=True), 4
-            )
-
-            for utilization in utilization_rates:
-                utilization = Decimal(str(utilization))
-                if utilization < kink:
-                    rate_per_block = base + (utilization * multiplier_per_block)
-                    borrow_rate = rate_per_block * BLOCKS_PER_YEAR
-                else:
-                    normal_rate = base + kink * multiplier_per_block
-                    excess_util = utilization - kink
-                    rate_per_block = normal_rate + (
-                        excess_util * jump_multiplier_per_block
-                    )
-                    borrow_rate = rate_per_block * BLOCKS_PER_YEAR
-                data.append(
-                    {
-                        "utilization_rate": Decimal(str(utilization)),
-                        "borrow_rate": Decimal(str(round(borrow_rate, 4))),
-                    }
-                )
-            self._dai_curve = data
-        return self._dai_curve
+        return self.curve.to_list()
 
     def get_utilization_rate_gte(self, value):
-        # We call this function many, many times so it's a bit weird for speed purposes
-        if not self._borrow_rate_df_cache:
-            df = pd.DataFrame.from_dict(self.dai_curve)
-            df_chunks = np.array_split(df, 30)
-            for chunk in df_chunks:
-                self._borrow_rate_df_cache[max(chunk["borrow_rate"])] = chunk
-
-        for max_value, chunk in self._borrow_rate_df_cache.items():
-            if value <= max_value:
-                return chunk.loc[chunk["borrow_rate"] <= value].iloc[-1][
-                    "utilization_rate"
-                ]
+        return self.curve.get_utilization_rate_gte(value)
 
     def get_borrow_rate_gte(self, value):
-        # We call this function many, many times so it's a bit weird for speed purposes
-        if not self._utilization_rate_df_cache:
-            df = pd.DataFrame.from_dict(self.dai_curve)
-
-            df_chunks = np.array_split(df, 30)
-            for chunk in df_chunks:
-                self._utilization_rate_df_cache[max(chunk["utilization_rate"])] = chunk
-
-        for max_value, chunk in self._utilization_rate_df_cache.items():
-            if value <= max_value:
-                return chunk.loc[chunk["utilization_rate"] >= value].iloc[0][
-                    "borrow_rate"
-                ]
+        return self.curve.get_borrow_rate_gte(value)
 
     def compute_metrics(self, target_borrow_rate, d3m_dc, heatmap=False):
         rates = self.get_rates()
@@ -409,3 +394,85 @@ class D3MCompoundCompute:
             data["d3m_balance"] = old_current_dai
             data["d3m_exposure"] = d3m_exposure - old_current_dai
         return data
+
+    def compute_metrics_vectorized(self, target_borrow_rates, d3m_dcs, heatmap=True):
+        """
+        Same as `compute_metrics` for arrays of target borrow rates and debt ceilings,
+        which are broadcast against each other. Returns a dict of float64 arrays.
+        """
+        rates = {key: float(value) for key, value in self.get_rates().items()}
+        target_borrow_rate = np.asarray(target_borrow_rates, dtype=np.float64)
+        d3m_dc = np.asarray(d3m_dcs, dtype=np.float64)
+        target_borrow_rate, d3m_dc = np.broadcast_arrays(target_borrow_rate, d3m_dc)
+
+        unwind = np.zeros(target_borrow_rate.shape, dtype=bool)
+        if not heatmap:
+            unwind = target_borrow_rate > rates["borrow_rate"]
+        old_current_dai = max(0, float(self.d3m_model.balance))
+        d3m_current_dai = np.where(unwind, 0, old_current_dai)
+        dai_supply = np.where(
+            unwind, rates["total_supply"] - old_current_dai, rates["total_supply"]
+        )
+        dai_borrow = rates["total_borrow"]
+        d3m_dc_additional = np.maximum(0, d3m_dc - d3m_current_dai)
+
+        simulation_dai_borrow = np.trunc(dai_borrow)
+        d3m_supply_needed = np.maximum(
+            np.trunc(
+                simulation_dai_borrow
+                / self.curve.utilization_rates_for(target_borrow_rate)
+                - dai_supply
+            ),
+            0,
+        )
+        d3m_exposure = np.minimum(d3m_dc_additional, d3m_supply_needed)
+        simulation_dai_supply = np.trunc(dai_supply + d3m_exposure)
+        simulation_utilization_rate = np.round(
+            simulation_dai_borrow / simulation_dai_supply, 6
+        )
+        simulation_borrow_rate = np.round(
+            self.curve.borrow_rates_for(simulation_utilization_rate), 6
+        )
+        simulation_supply_rate = np.round(
+            simulation_utilization_rate * simulation_borrow_rate * (1 - RESERVE_FACTOR),
+            6,
+        )
+        simulation_dai_supply_target = dai_supply + d3m_supply_needed
+        simulation_utilization_rate_target = np.round(
+            dai_borrow / simulation_dai_supply_target, 6
+        )
+        implied_supply_rate = np.round(
+            simulation_utilization_rate_target
+            * target_borrow_rate
+            * (1 - RESERVE_FACTOR),
+            6,
+        )
+
+        d3m_exposure_total = d3m_exposure + d3m_current_dai
+        simulation_supply_reward_rate = (
+            rates["comp_price"] * rates["comp_supply_rewards_per_year"]
+        ) / simulation_dai_supply
+        return {
+            "d3m_dc": d3m_dc,
+            "target_borrow_rate": target_borrow_rate,
+            "simulation_dai_borrow": np.broadcast_to(
+                simulation_dai_borrow, d3m_dc.shape
+            ),
+            "d3m_supply_needed": d3m_supply_needed,
+            "d3m_exposure": np.where(
+                unwind, d3m_exposure - old_current_dai, d3m_exposure
+            ),
+            "simulation_dai_supply": simulation_dai_supply,
+            "simulation_utilization_rate": simulation_utilization_rate,
+            "simulation_borrow_rate": simulation_borrow_rate,
+            "simulation_supply_rate": simulation_supply_rate,
+            "simulation_dai_supply_target": simulation_dai_supply_target,
+            "simulation_utilization_rate_target": simulation_utilization_rate_target,
+            "implied_supply_rate": implied_supply_rate,
+            "simulation_supply_reward_rate": simulation_supply_reward_rate,
+            "share_dai_deposits": d3m_exposure_total / simulation_dai_supply,
+            "d3m_revenue": simulation_supply_rate * d3m_exposure_total,
+            "d3m_revenue_rewards": simulation_supply_reward_rate * d3m_exposure_total,
+            "d3m_balance": np.where(unwind, old_current_dai, d3m_current_dai),
+            "d3m_exposure_total": np.where(unwind, d3m_exposure, d3m_exposure_total),
+        }
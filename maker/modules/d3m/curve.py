@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from decimal import Decimal
+
+import numpy as np
+
+CURVE_POINTS = 10000
+
+
+def get_utilization_rates():
+    return np.around(np.linspace(start=0, stop=1, num=CURVE_POINTS, endpoint=True), 4)
+
+
+class RateCurve:
+    """
+    Borrow rate curve sampled at CURVE_POINTS utilization rates. Both rates are
+    non-decreasing, so lookups are binary searches over float64 arrays and work on
+    scalars and arrays alike.
+    """
+
+    def __init__(self, utilization_rates, borrow_rates):
+        self.utilization_rates = np.asarray(utilization_rates, dtype=np.float64)
+        self.borrow_rates = np.asarray(borrow_rates, dtype=np.float64)
+
+    def utilization_rates_for(self, borrow_rates):
+        """Returns the highest utilization rate with borrow rate <= borrow_rates"""
+        idx = np.searchsorted(
+            self.borrow_rates, np.asarray(borrow_rates, dtype=np.float64), side="right"
+        )
+        return self.utilization_rates[np.clip(idx - 1, 0, len(self.borrow_rates) - 1)]
+
+    def borrow_rates_for(self, utilization_rates):
+        """Returns the borrow rate of the lowest utilization rate >= utilization_rates"""
+        idx = np.searchsorted(
+            self.utilization_rates,
+            np.asarray(utilization_rates, dtype=np.float64),
+            side="left",
+        )
+        return self.borrow_rates[np.clip(idx, 0, len(self.utilization_rates) - 1)]
+
+    def get_utilization_rate_gte(self, value):
+        return Decimal(str(self.utilization_rates_for(float(value))))
+
+    def get_borrow_rate_gte(self, value):
+        return Decimal(str(self.borrow_rates_for(float(value))))
+
+    def to_list(self):
+        return [
+            {
+                "utilization_rate": Decimal(str(utilization_rate)),
+                "borrow_rate": Decimal(str(borrow_rate)),
+            }
+            for utilization_rate, borrow_rate in zip(
+                self.utilization_rates.tolist(), self.borrow_rates.tolist()
+            )
+        ]
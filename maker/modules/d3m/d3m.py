@@ -2,9 +2,36 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import logging
+
+import numpy as np
 
 from ...models import D3M, SurplusBuffer
-from . import aave, compound
+from ...utils.blockchain.chain import Blockchain
+from . import aave, compound, spark
+from .market import get_latest_market_state_block, save_market_state
+
+log = logging.getLogger(__name__)
+
+MARKET_STATE_FETCHERS = {
+    "aave": aave.fetch_market_state,
+    "compound": compound.fetch_market_state,
+    "spark": spark.fetch_market_state,
+}
+
+D3M_COMPUTE_CLASSES = {
+    "aave": aave.D3MAaveCompute,
+    "compound": compound.D3MCompoundCompute,
+}
+HEATMAP_STEPS = 21
+MAX_HEATMAP_POINTS = 10000
+HEATMAP_METRICS = [
+    "d3m_exposure_total",
+    "simulation_utilization_rate",
+    "simulation_borrow_rate",
+    "simulation_supply_rate",
+    "d3m_revenue",
+]
 
 
 def get_d3m_stats():
@@ -29,3 +56,47 @@ def get_protocol_stats(protocol):
         return aave.get_d3m_info()
     if protocol == "compound":
         return compound.get_d3m_info()
+
+
+def refresh_market_states():
+    """Saves the market state of all D3M protocols at the latest block"""
+    block_number = Blockchain().get_latest_block()
+    for protocol, fetch_market_state in MARKET_STATE_FETCHERS.items():
+        if get_latest_market_state_block(protocol) == block_number:
+            continue
+        try:
+            state = fetch_market_state(block_number)
+        except Exception:
+            log.exception("Couldn't fetch %s market state", protocol)
+            continue
+        save_market_state(protocol, block_number, state)
+
+
+def get_d3m_compute(protocol):
+    """Returns the compute object for protocol or None if it can't be simulated"""
+    compute_class = D3M_COMPUTE_CLASSES.get(protocol)
+    if not compute_class:
+        return None
+    return compute_class()
+
+
+def get_heatmap(compute, debt_ceilings, target_borrow_rates, metrics=None):
+    """
+    Computes metrics for every combination of debt ceiling and target borrow rate
+    at once. Each metric is returned as a list of rows, one per target borrow rate.
+    Values that can't be computed (e.g. a target borrow rate of 0) are None.
+    """
+    metrics = metrics or HEATMAP_METRICS
+    debt_ceilings = np.asarray(debt_ceilings, dtype=np.float64)
+    target_borrow_rates = np.asarray(target_borrow_rates, dtype=np.float64)
+    data = compute.compute_metrics_vectorized(
+        target_borrow_rates[:, np.newaxis], debt_ceilings[np.newaxis, :]
+    )
+    return {
+        "debt_ceilings": debt_ceilings.tolist(),
+        "target_borrow_rates": target_borrow_rates.tolist(),
+        "metrics": {
+            metric: np.where(np.isfinite(data[metric]), data[metric], None).tolist()
+            for metric in metrics
+        },
+    }
@@ -2,6 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from datetime import datetime
 from decimal import Decimal
 
 from eth_utils import to_bytes
@@ -12,7 +13,7 @@ from maker.constants import (
     MKR_DC_IAM_CONTRACT_ADDRESS,
 )
 from maker.models import D3M
-from maker.modules.block import get_or_save_block
+from maker.modules.block import get_block_timestamps
 from maker.utils.blockchain.chain import Blockchain
 
 
@@ -53,17 +54,20 @@ def get_target_rate_history(ilk):
     chain = Blockchain()
     topic1 = "{:<064}".format(ilk_bytes.hex())
     filters = {
-        "fromBlock": 16126312,
-        "toBlock": "latest",
         "topics": [
             "0x851aa1caf4888170ad8875449d18f0f512fd6deb2a6571ea1a41fb9f95acbcd1",
             f"0x{topic1}",
         ],
     }
-    events = chain.eth.get_logs(filters)
+    events = []
+    for _, _, logs in chain.scan_logs(filters, 16126312):
+        events.extend(logs)
+    timestamps = get_block_timestamps(
+        [event["blockNumber"] for event in events], chain=chain
+    )
 
     for event in events:
-        block = get_or_save_block(event["blockNumber"])
+        timestamp = timestamps[event["blockNumber"]]
         rate = int(event.data, 16)
         target_borrow_rate = round((1 + (rate / 1e15)) ** (60 * 60 * 24 * 365) - 1, 2)
         if ilk == "DIRECT-AAVEV2-DAI":
@@ -71,8 +75,8 @@ def get_target_rate_history(ilk):
         else:
             protocol = "compound"
         D3M.objects.update_or_create(
-            timestamp=block.timestamp,
-            datetime=block.datetime,
+            timestamp=timestamp,
+            datetime=datetime.fromtimestamp(timestamp),
             block_number=event["blockNumber"],
             ilk=ilk,
             protocol=protocol,
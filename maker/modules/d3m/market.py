@@ -0,0 +1,49 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+
+from django.core.cache import cache
+
+from maker.utils.blockchain.chain import Blockchain
+from maker.utils.metrics import increment
+
+log = logging.getLogger(__name__)
+
+MARKET_STATE_CACHE_KEY = "D3M.market_state.{}.{}"
+LATEST_MARKET_STATE_CACHE_KEY = "D3M.market_state.{}.latest"
+MARKET_STATE_TIMEOUT = 60 * 60
+
+
+def get_latest_market_state_block(protocol):
+    return cache.get(LATEST_MARKET_STATE_CACHE_KEY.format(protocol))
+
+
+def save_market_state(protocol, block_number, state):
+    cache.set(
+        MARKET_STATE_CACHE_KEY.format(protocol, block_number),
+        state,
+        MARKET_STATE_TIMEOUT,
+    )
+    cache.set(LATEST_MARKET_STATE_CACHE_KEY.format(protocol), block_number, None)
+
+
+def get_market_state(protocol, fetch_market_state):
+    """
+    Returns the latest on-chain market state of protocol, as saved by
+    `refresh_d3m_market_states_task`. Only when the cache is empty (e.g. right after a
+    deploy) the state is fetched with `fetch_market_state(block_number)`.
+    """
+    block_number = get_latest_market_state_block(protocol)
+    state = None
+    if block_number:
+        state = cache.get(MARKET_STATE_CACHE_KEY.format(protocol, block_number))
+
+    if state is None:
+        increment("d3m.market_state.miss")
+        log.warning("Missing cached %s market state, fetching it from node", protocol)
+        block_number = Blockchain().get_latest_block()
+        state = fetch_market_state(block_number)
+        save_market_state(protocol, block_number, state)
+    return state
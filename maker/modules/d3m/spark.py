@@ -12,6 +12,7 @@ from maker.utils.blockchain.chain import Blockchain
 from maker.utils.http import retry_get_json
 
 from .helper import get_d3m_contract_data
+from .market import get_market_state
 
 
 def get_current_balance(balance_contract):
@@ -23,13 +24,24 @@ def get_current_balance(balance_contract):
     return round(Decimal(data) / Decimal(1e18), 2)
 
 
-def get_current_debt():
+def get_current_debt(block_number=None):
     chain = Blockchain()
     contract = chain.get_contract("0xf705d2B7e92B3F38e6ae7afaDAA2fEE110fE5914")
-    data = contract.caller.totalSupply()
+    data = contract.caller(block_identifier=block_number or "latest").totalSupply()
     return round(Decimal(data) / Decimal(1e18), 2)
 
 
+def fetch_market_state(block_number):
+    return {
+        "block_number": block_number,
+        "debt": get_current_debt(block_number),
+    }
+
+
+def get_cached_market_state():
+    return get_market_state("spark", fetch_market_state)
+
+
 def save_d3m():
     ilk = "DIRECT-SPARK-DAI"
     data = get_d3m_contract_data(ilk)
@@ -54,7 +66,7 @@ def get_d3m_earnings():
 
 def get_d3m_short_info():
     d3m_data = D3M.objects.filter(protocol="spark").latest()
-    debt_balance = get_current_debt()
+    debt_balance = get_cached_market_state()["debt"]
     utilization = 0
     if d3m_data.max_debt_ceiling:
         utilization = debt_balance / d3m_data.max_debt_ceiling
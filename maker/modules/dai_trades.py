@@ -2,21 +2,24 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-import csv
+import io
 import logging
 import os
 from collections import defaultdict
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from operator import itemgetter
 from statistics import mean
 
+import numpy as np
+import pandas as pd
 import requests
+from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Avg, Max, Min, Sum
-from django.db.models.functions import TruncDay, TruncMinute
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, Min, Sum
+from django.db.models.functions import TruncDay
 
-from maker.models import DAITrade
+from maker.models import DAITrade, DAITradeMinute
 from maker.sources.cryptocompare import fetch_history_data
 from maker.utils.s3 import download_csv_file_object
 from maker.utils.utils import date_to_timestamp
@@ -27,6 +30,47 @@ EXCHANGE_SYMBOL_MAP = {
     "USDC": "kraken",
     "TUSD": "N/A",
 }
+STABLECOINS = {"USDT", "USDC", "TUSD"}
+
+# Number of CSV rows that are processed at once
+DAI_TRADES_CHUNK_SIZE = 50000
+DAI_TRADES_STAGING_TABLE = "maker_daitrade_staging"
+MIN_DAI_PRICE = Decimal("0.8")
+MAX_DAI_PRICE = Decimal("1.15")
+MINUTE_MS = 60 * 1000
+
+# round(dai_price, 3) with the same half to even rounding as Python's round()
+DAI_PRICE_BUCKET_SQL = """
+    CASE
+        WHEN dai_price * 1000 %% 1 = 0.5
+            THEN (trunc(dai_price * 1000) + mod(trunc(dai_price * 1000), 2)) / 1000
+        ELSE round(dai_price, 3)
+    END
+"""
+# Adds trades to their DAITradeMinute rows
+DAI_TRADE_MINUTES_SQL = """
+    INSERT INTO {table} (
+        created, modified, datetime, exchange, price_bucket, count, amount,
+        price_min, price_max, price_sum
+    )
+    SELECT
+        %s, %s, date_trunc('minute', datetime), exchange, {bucket}, COUNT(*),
+        SUM(dai_amount), MIN(dai_price), MAX(dai_price), SUM(dai_price)
+    FROM {trades}
+    WHERE dai_price IS NOT NULL AND dai_amount IS NOT NULL
+    GROUP BY 3, 4, 5
+    ON CONFLICT (datetime, exchange, price_bucket) DO UPDATE SET
+        modified = EXCLUDED.modified,
+        count = {table}.count + EXCLUDED.count,
+        amount = {table}.amount + EXCLUDED.amount,
+        price_min = LEAST({table}.price_min, EXCLUDED.price_min),
+        price_max = GREATEST({table}.price_max, EXCLUDED.price_max),
+        price_sum = {table}.price_sum + EXCLUDED.price_sum
+"""
+DAI_TRADES_DOWNLOAD_STATE_CACHE_KEY = "DAITrade.download.{}d"
+# Number of bytes at the end of the last download that have to match the start of
+# the next range request
+DAI_TRADES_TAIL_BYTES = 1024
 
 
 class DAITradesFetcher:
@@ -58,11 +102,9 @@ class DAITradesFetcher:
         return ohlcv
 
     def _fetch_full_ohlcv_minute_data(self, dt, from_symbol, exchange):
-        if from_symbol not in {
-            "USDT",
-            "USDC",
-            "TUSD",
-        } and dt.date() < date.today() - timedelta(days=5):
+        if from_symbol not in STABLECOINS and dt.date() < date.today() - timedelta(
+            days=5
+        ):
             ohlcv = self._fetch_ohlcv_minute_data_from_s3(dt, from_symbol, exchange)
         else:
             ts = None
@@ -91,10 +133,8 @@ class DAITradesFetcher:
                 ohlcv += data
         return ohlcv
 
-    def usd_price(self, dt, from_symbol):
-        timestamp = int(dt.timestamp())
-        if from_symbol == "WETH":
-            from_symbol = "ETH"
+    def _get_usd_prices(self, dt, from_symbol):
+        """Returns {minute timestamp: USD price} for from_symbol"""
         exchange = EXCHANGE_SYMBOL_MAP.get(from_symbol, "coinbase")
         key = from_symbol
 
@@ -115,19 +155,22 @@ class DAITradesFetcher:
                 self._usd_prices[key][int(ohlcv["time"])] = mean(
                     [Decimal(str(ohlcv["close"])), Decimal(str(ohlcv["open"]))]
                 )
+        return self._usd_prices[key]
+
+    def usd_price(self, dt, from_symbol):
+        timestamp = int(dt.timestamp())
+        if from_symbol == "WETH":
+            from_symbol = "ETH"
+        usd_prices = self._get_usd_prices(dt, from_symbol)
         try:
-            return self._usd_prices[key][timestamp]
+            return usd_prices[timestamp]
         except KeyError as e:
-            if dt < datetime.now() - timedelta(days=3) and from_symbol in {
-                "USDT",
-                "USDC",
-                "TUSD",
-            }:
+            if dt < datetime.now() - timedelta(days=3) and from_symbol in STABLECOINS:
                 # We might not be able to fetch historical prices, so in that case,
                 # use the last price (or first depending on how you look at it) that
                 # we have at that time. Only use this for stablecoins otherwise it's
                 # gonna be wrong
-                prices = sorted(self._usd_prices[key].items(), key=lambda x: x[0])
+                prices = sorted(usd_prices.items(), key=lambda x: x[0])
                 return prices[0][1]
             else:
                 log.warning(
@@ -135,98 +178,380 @@ class DAITradesFetcher:
                     dt,
                     timestamp,
                     from_symbol,
-                    extra={"_usd_prices": self._usd_prices[key]},
+                    extra={"_usd_prices": usd_prices},
                 )
-                log.warning("USD Prices: %s", self._usd_prices[key])
+                log.warning("USD Prices: %s", usd_prices)
                 raise e
 
-    def fetch(self, days=30):
+    def _get_usd_price_frame(self, dt, from_symbol):
+        usd_prices = self._get_usd_prices(dt, from_symbol)
+        prices = pd.DataFrame(
+            {
+                "minute": np.fromiter(usd_prices.keys(), dtype=np.int64),
+                "usd_price": pd.Series(list(usd_prices.values()), dtype=object),
+            }
+        )
+        prices["minute"] *= 1000
+        prices["symbol"] = from_symbol
+        return prices.sort_values("minute", kind="stable")
+
+    def _add_usd_prices(self, trades):
+        """
+        Adds the USD price of the non-DAI side of each trade. Prices are per minute,
+        so each trade is matched with the price of the minute it happened in.
+        """
+        trades["usd_price"] = None
+        priced = trades[trades["symbol"].notna()]
+        if priced.empty:
+            return trades
+
+        prices = pd.concat(
+            [
+                self._get_usd_price_frame(group["datetime"].min(), symbol)
+                for symbol, group in priced.groupby("symbol")
+            ],
+            ignore_index=True,
+        )
+        priced = pd.merge_asof(
+            priced.drop(columns="usd_price").reset_index().sort_values("time"),
+            prices.sort_values("minute", kind="stable"),
+            left_on="time",
+            right_on="minute",
+            by="symbol",
+            direction="backward",
+            tolerance=MINUTE_MS - 1,
+        ).set_index("index")
+
+        missing = priced["usd_price"].isna()
+        if missing.any():
+            fallback = (
+                missing
+                & priced["symbol"].isin(STABLECOINS)
+                & (priced["datetime"] < datetime.now() - timedelta(days=3))
+            )
+            # We might not be able to fetch historical prices of stablecoins, so in
+            # that case use the first price we have
+            first_prices = prices.groupby("symbol")["usd_price"].first()
+            priced.loc[fallback, "usd_price"] = priced.loc[fallback, "symbol"].map(
+                first_prices
+            )
+            missing &= ~fallback
+            if missing.any():
+                row = priced[missing].iloc[0]
+                log.warning(
+                    "Couldn't get price for date %s (timestamp %s) symbol %s",
+                    row["datetime"],
+                    row["timestamp"],
+                    row["symbol"],
+                )
+                raise KeyError(row["time"] // MINUTE_MS * 60)
+
+        trades.loc[priced.index, "usd_price"] = priced["usd_price"]
+        return trades
+
+    def _iter_new_trades(self, filename, last_timestamp=None):
+        """
+        Yields chunks of trades newer than last_timestamp, so that only a single
+        chunk of the file is kept in memory at once.
+        """
+        chunks = pd.read_csv(
+            filename,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=DAI_TRADES_CHUNK_SIZE,
+        )
+        for trades in chunks:
+            timestamps = trades["timestamp"].astype(float)
+            if last_timestamp is not None:
+                new = timestamps > last_timestamp
+                if not new.any():
+                    log.debug(
+                        "Skipping... (%s - %s - %s)",
+                        trades.index[-1],
+                        trades["timestamp"].iloc[-1],
+                        last_timestamp,
+                    )
+                    continue
+                trades = trades[new]
+                timestamps = timestamps[new]
+
+            # Timestamps have millisecond precision
+            trades["time"] = (timestamps * 1000).round().astype(np.int64)
+            trades["datetime"] = (
+                pd.to_datetime(trades["time"], unit="ms")
+                .dt.tz_localize("UTC")
+                .dt.tz_convert(settings.TIME_ZONE)
+                .dt.tz_localize(None)
+            )
+            amounts = trades["amount"].astype(float)
+            pair = trades["pair"].str.split("-", n=1, expand=True)
+            is_dai_usd = trades["pair"] == "DAI-USD"
+            is_dai_base = (pair[0] == "DAI") & ~is_dai_usd
+
+            # Ignore small trades. DAI-X amounts are in DAI, X-DAI ones in X.
+            keep = is_dai_usd | (is_dai_base & (amounts >= 1))
+            keep |= ~is_dai_usd & ~is_dai_base & (amounts >= 0.01)
+            trades = trades[keep]
+
+            symbol = pair[0].where(~is_dai_base, pair[1])[keep]
+            trades["symbol"] = symbol.replace("WETH", "ETH").where(
+                ~is_dai_usd[keep], None
+            )
+            if not trades.empty:
+                yield trades
+
+    def _save_trades(self, cursor, trades):
+        """
+        Loads trades into the staging table with COPY and moves the ones with a sane
+        DAI price into DAITrade. DAI prices and amounts are computed by the database
+        so they keep the full numeric precision.
+        """
+        buffer = io.StringIO()
+        trades.reset_index().to_csv(
+            buffer,
+            columns=[
+                "index",
+                "timestamp",
+                "datetime",
+                "pair",
+                "exchange",
+                "amount",
+                "price",
+                "usd_price",
+            ],
+            header=False,
+            index=False,
+            date_format="%Y-%m-%d %H:%M:%S.%f",
+        )
+        buffer.seek(0)
+        cursor.execute("TRUNCATE {}".format(DAI_TRADES_STAGING_TABLE))
+        cursor.copy_expert(
+            "COPY {} FROM STDIN WITH (FORMAT csv)".format(DAI_TRADES_STAGING_TABLE),
+            buffer,
+        )
+        now = datetime.now()
+        cursor.execute(
+            """
+            WITH trades AS (
+                INSERT INTO {table} (
+                    created, modified, timestamp, datetime, pair, exchange, amount,
+                    price, dai_price, dai_amount
+                )
+                SELECT
+                    %s, %s, timestamp, datetime, pair, exchange, amount, price,
+                    dai_price, dai_amount
+                FROM (
+                    SELECT
+                        row, timestamp, datetime, pair, exchange, amount, price,
+                        CASE
+                            WHEN pair = 'DAI-USD' THEN price
+                            WHEN split_part(pair, '-', 1) = 'DAI'
+                                THEN price * usd_price
+                            ELSE usd_price::numeric(65, 30) / price
+                        END AS dai_price,
+                        CASE
+                            WHEN split_part(pair, '-', 1) = 'DAI' THEN amount
+                            ELSE amount * price
+                        END AS dai_amount
+                    FROM {staging}
+                ) AS trades
+                WHERE dai_price BETWEEN %s AND %s
+                ORDER BY row
+                RETURNING datetime, exchange, dai_price, dai_amount
+            ), minutes AS (
+                {rollup}
+            )
+            SELECT COUNT(*) FROM trades
+            """.format(
+                table=DAITrade._meta.db_table,
+                staging=DAI_TRADES_STAGING_TABLE,
+                rollup=DAI_TRADE_MINUTES_SQL.format(
+                    table=DAITradeMinute._meta.db_table,
+                    trades="trades",
+                    bucket=DAI_PRICE_BUCKET_SQL,
+                ),
+            ),
+            [now, now, MIN_DAI_PRICE, MAX_DAI_PRICE, now, now],
+        )
+        created = cursor.fetchone()[0]
+        skipped = len(trades) - created
+        if skipped:
+            # Ignore DAI trades that are too far out of the intended price
+            log.info(
+                "Skipped %s DAI trades because price is too far out",
+                skipped,
+            )
+        return created
+
+    def _get_download_state(self, days):
+        return cache.get(DAI_TRADES_DOWNLOAD_STATE_CACHE_KEY.format(days))
+
+    def _set_download_state(self, days, state):
+        cache.set(DAI_TRADES_DOWNLOAD_STATE_CACHE_KEY.format(days), state, timeout=None)
+
+    def _write_response(self, response, f, state, skip=b""):
+        """
+        Writes the response body to f and updates size and tail of the download
+        state. The body must start with `skip`, which is not written. Returns False
+        if it doesn't.
+        """
+        for chunk in response.iter_content(chunk_size=8192):
+            if skip:
+                head, chunk = chunk[: len(skip)], chunk[len(skip) :]
+                if not skip.startswith(head):
+                    return False
+                skip = skip[len(head) :]
+            if not state["header"]:
+                state["header"] = chunk.partition(b"\n")[0] + b"\n"
+            f.write(chunk)
+            state["size"] += len(chunk)
+            state["tail"] = (state["tail"] + chunk)[-DAI_TRADES_TAIL_BYTES:]
+        return not skip
+
+    def _download(self, days, disk_filename, incremental=False):
+        """
+        Downloads the trades file to disk_filename and returns the new download
+        state, or None if the file didn't change since the last download.
+
+        In incremental mode the request is conditional on the ETag and Last-Modified
+        of the last download, and asks only for the bytes appended since then. The
+        range starts a few bytes before the end of the last download, so we can check
+        that the file was really appended to. If it wasn't, or the server ignores the
+        Range header, the whole file is downloaded.
+        """
         filename = "combined-DAI-trades-{}d.csv".format(days)
-        log.debug("Started fetching {}".format(filename))
-        disk_filename = "/tmp/DAI-trades-{}.csv".format(int(datetime.now().timestamp()))
         url = "https://dai.stablecoin.science/data/{}".format(filename)
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-            with open(disk_filename, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+        log.debug("Started fetching {}".format(filename))
+
+        previous = self._get_download_state(days) if incremental else None
+        headers = {}
+        if previous:
+            if previous["etag"]:
+                headers["If-None-Match"] = previous["etag"]
+            if previous["last_modified"]:
+                headers["If-Modified-Since"] = previous["last_modified"]
+            if previous["tail"].endswith(b"\n"):
+                start = previous["size"] - len(previous["tail"])
+                headers["Range"] = "bytes={}-".format(start)
+
+        with requests.get(url, stream=True, headers=headers) as response:
+            if response.status_code == 304:
+                log.debug("%s didn't change since the last download", filename)
+                return None
+
+            state = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "header": b"",
+                "size": 0,
+                "tail": b"",
+            }
+            if response.status_code == 206:
+                state.update(
+                    header=previous["header"],
+                    size=previous["size"],
+                    tail=previous["tail"],
+                )
+                with open(disk_filename, "wb") as f:
+                    f.write(previous["header"])
+                    appended = self._write_response(
+                        response, f, state, skip=previous["tail"]
+                    )
+                if appended:
+                    log.debug(
+                        "Fetched %s new bytes of %s",
+                        state["size"] - previous["size"],
+                        filename,
+                    )
+                    return state
+                log.info("%s was rewritten, fetching the whole file", filename)
+                return self._download(days, disk_filename)
+
+            if response.status_code != 416:
+                response.raise_for_status()
+                with open(disk_filename, "wb") as f:
+                    self._write_response(response, f, state)
+                log.debug("Finished fetching {}".format(filename))
+                return state
 
-        log.debug("Finished fetching {}".format(filename))
+        # The file got shorter than the last download
+        return self._download(days, disk_filename)
+
+    def fetch(self, days=30, incremental=False):
+        disk_filename = "/tmp/DAI-trades-{}.csv".format(int(datetime.now().timestamp()))
+        state = self._download(days, disk_filename, incremental=incremental)
+        if state is None:
+            return
 
         last_trade = DAITrade.objects.all().order_by("-timestamp").first()
-        if last_trade and last_trade.datetime < datetime.now() - timedelta(days=3):
-            log.warning("Last stored DAITrade was on %s", last_trade.datetime)
-
-        trades = []
-        with open(disk_filename, encoding="utf-8") as csv_file:
-            reader = csv.DictReader(csv_file)
-            for index, row in enumerate(reader):
-                if last_trade and Decimal(row["timestamp"]) <= last_trade.timestamp:
-                    if index % 10000 == 0:
-                        log.debug(
-                            "Skipping... ({} - {} - {})".format(
-                                index, row["timestamp"], last_trade.timestamp
-                            )
-                        )
-                    continue
+        last_timestamp = None
+        if last_trade:
+            last_timestamp = float(last_trade.timestamp)
+            if last_trade.datetime < datetime.now() - timedelta(days=3):
+                log.warning("Last stored DAITrade was on %s", last_trade.datetime)
 
-                dt = datetime.fromtimestamp(float(row["timestamp"]))
-                amount = Decimal(row["amount"])
-                price = Decimal(row["price"])
-
-                dt_minute = dt.replace(second=0, microsecond=0)
-                pair = row["pair"].split("-")
-                if row["pair"] == "DAI-USD":
-                    dai_price = price
-                    dai_amount = amount
-                elif pair[0] == "DAI":
-                    if amount < 1:  # Ignore small trades
-                        continue
-
-                    dai_price = price * self.usd_price(dt_minute, pair[1])
-                    dai_amount = amount
-                else:
-                    if amount < 0.01:  # amount ETH in DAI - ignore small trades
-                        continue
-                    dai_price = self.usd_price(dt_minute, pair[0]) / price
-                    dai_amount = amount * price
-
-                # Ignore DAI trades that are too far out of the intended price
-                if dai_price < Decimal("0.8") or dai_price > Decimal("1.15"):
-                    log.info(
-                        "Skipping DAI trade because price is too far out: %s",
-                        dai_price,
-                        extra={
-                            "dai_price": dai_price,
-                            "dai_amount": dai_amount,
-                            "row": row,
-                        },
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    CREATE TEMPORARY TABLE IF NOT EXISTS {} (
+                        row bigint,
+                        timestamp numeric,
+                        datetime timestamp,
+                        pair text,
+                        exchange text,
+                        amount numeric,
+                        price numeric,
+                        usd_price numeric
                     )
-                    continue
-
-                trades.append(
-                    DAITrade(
-                        timestamp=row["timestamp"],
-                        datetime=dt,
-                        pair=row["pair"],
-                        exchange=row["exchange"],
-                        amount=amount,
-                        price=price,
-                        dai_price=dai_price,
-                        dai_amount=dai_amount,
+                    """.format(
+                        DAI_TRADES_STAGING_TABLE
                     )
                 )
+                for trades in self._iter_new_trades(disk_filename, last_timestamp):
+                    trades = self._add_usd_prices(trades)
+                    with transaction.atomic():
+                        created = self._save_trades(cursor, trades)
+                    log.debug(
+                        "Created %s DAITrades up to index %s",
+                        created,
+                        trades.index[-1],
+                    )
+                cursor.execute(
+                    "DROP TABLE IF EXISTS {}".format(DAI_TRADES_STAGING_TABLE)
+                )
+            # Only remember the download once its trades are stored, so a failed run
+            # is retried with the same range
+            self._set_download_state(days, state)
+        finally:
+            # Cleanup after the run
+            os.remove(disk_filename)
+
+
+def rebuild_dai_trade_minutes():
+    """Recreates all DAITradeMinute rows from the stored trades"""
+    now = datetime.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        DAITradeMinute.objects.all().delete()
+        cursor.execute(
+            DAI_TRADE_MINUTES_SQL.format(
+                table=DAITradeMinute._meta.db_table,
+                trades=DAITrade._meta.db_table,
+                bucket=DAI_PRICE_BUCKET_SQL,
+            ),
+            [now, now],
+        )
 
-                if index > 0 and index % 5000 == 0:
-                    log.debug("Creating DAITrade on index {}".format(index))
-                    DAITrade.objects.bulk_create(trades)
-                    trades = []
-
-        # finish up the last remaining DAITrades that weren't in the full chunk
-        DAITrade.objects.bulk_create(trades)
 
-        # Cleanup after the run
-        os.remove(disk_filename)
+def _aggregate_trade_minutes():
+    return {
+        "price_max": Max("price_max"),
+        "price_min": Min("price_min"),
+        "price_avg": ExpressionWrapper(
+            Sum("price_sum") / Sum("count"), output_field=DecimalField()
+        ),
+        "amount_total": Sum("amount"),
+    }
 
 
 def trade_data_for_last_day():
@@ -234,25 +559,14 @@ def trade_data_for_last_day():
     # grouping
     now = datetime.now().replace(second=0, microsecond=0)
     dt = now - timedelta(days=1)
-    trades_query = DAITrade.objects.filter(datetime__gte=dt)
+    minutes = DAITradeMinute.objects.filter(datetime__gte=dt)
     trades = (
-        trades_query.annotate(dt=TruncMinute("datetime"))
-        .values("dt")
-        .annotate(
-            price_max=Max("dai_price"),
-            price_min=Min("dai_price"),
-            price_avg=Avg("dai_price"),
-            amount_total=Sum("dai_amount"),
-        )
+        minutes.values(dt=F("datetime"))
+        .annotate(**_aggregate_trade_minutes())
         .order_by("dt")
     )
 
-    agg = trades_query.aggregate(
-        price_max=Max("dai_price"),
-        price_min=Min("dai_price"),
-        price_avg=Avg("dai_price"),
-        amount_total=Sum("dai_amount"),
-    )
+    agg = minutes.aggregate(**_aggregate_trade_minutes())
     return {
         "trades": trades,
         "max": agg["price_max"],
@@ -270,16 +584,11 @@ def trade_data_daily():
 
     now = date.today()
     dt = now - timedelta(days=90)
-    trades_query = DAITrade.objects.filter(datetime__gte=dt)
+    minutes = DAITradeMinute.objects.filter(datetime__gte=dt)
     trades = (
-        trades_query.annotate(dt=TruncDay("datetime"))
+        minutes.annotate(dt=TruncDay("datetime"))
         .values("dt")
-        .annotate(
-            price_max=Max("dai_price"),
-            price_min=Min("dai_price"),
-            price_avg=Avg("dai_price"),
-            amount_total=Sum("dai_amount"),
-        )
+        .annotate(**_aggregate_trade_minutes())
         .order_by("dt")
     )
     cache.set(cache_key, trades, timeout=60 * 30)  # cache for 30 min
@@ -287,59 +596,46 @@ def trade_data_daily():
 
 
 def trade_volume_data(days=1):
-    dt = datetime.now() - timedelta(days=days)
-    trades = DAITrade.objects.filter(datetime__gte=dt).values("dai_price", "dai_amount")
-    rounded_data = defaultdict(Decimal)
-
-    for trade in trades:
-        rounded_data[round(trade["dai_price"], 3)] += trade["dai_amount"]
-    data = [{"price": k, "amount": v} for k, v in rounded_data.items()]
-    return sorted(data, key=itemgetter("price"))
+    dt = datetime.now().replace(second=0, microsecond=0) - timedelta(days=days)
+    return list(
+        DAITradeMinute.objects.filter(datetime__gte=dt)
+        .values(price=F("price_bucket"))
+        .annotate(amount=Sum("amount"))
+        .order_by("price")
+    )
 
 
 def trade_volume_data_per_exchange(days=1):
-    dt = datetime.now() - timedelta(days=days)
-    trades = DAITrade.objects.filter(datetime__gte=dt).values(
-        "dai_price", "dai_amount", "exchange"
+    dt = datetime.now().replace(second=0, microsecond=0) - timedelta(days=days)
+    return list(
+        DAITradeMinute.objects.filter(datetime__gte=dt)
+        .values("exchange", price=F("price_bucket"))
+        .annotate(amount=Sum("amount"))
+        .order_by("exchange", "price")
     )
-    rounded_data = defaultdict(lambda: defaultdict(Decimal))
-    for trade in trades:
-        rounded_data[trade["exchange"]][round(trade["dai_price"], 3)] += trade[
-            "dai_amount"
-        ]
-
-    data = []
-    for exchange, prices in rounded_data.items():
-        for price, amount in prices.items():
-            data.append({"exchange": exchange, "price": price, "amount": amount})
-    return sorted(data, key=itemgetter("exchange"))
 
 
 def get_stats():
     dt_yesterday = datetime.now().replace(second=0, microsecond=0) - timedelta(days=1)
-    last_24hr = DAITrade.objects.filter(datetime__gte=dt_yesterday).aggregate(
-        price_max=Max("dai_price"),
-        price_min=Min("dai_price"),
-        price_avg=Avg("dai_price"),
-        amount_total=Sum("dai_amount"),
+    last_24hr = DAITradeMinute.objects.filter(datetime__gte=dt_yesterday).aggregate(
+        **_aggregate_trade_minutes()
     )
 
-    dt_week_ago = datetime.now() - timedelta(days=7)
-    last_7days = DAITrade.objects.filter(datetime__gte=dt_week_ago).aggregate(
-        price_max=Max("dai_price"),
-        price_min=Min("dai_price"),
-        price_avg=Avg("dai_price"),
-        amount_total=Sum("dai_amount"),
+    dt_week_ago = datetime.now().replace(second=0, microsecond=0) - timedelta(days=7)
+    last_7days = DAITradeMinute.objects.filter(datetime__gte=dt_week_ago).aggregate(
+        **_aggregate_trade_minutes()
     )
 
     exchange_stats_last_7days = (
-        DAITrade.objects.filter(datetime__gte=dt_week_ago)
+        DAITradeMinute.objects.filter(datetime__gte=dt_week_ago)
         .values("exchange")
         .annotate(
-            max=Max("dai_price"),
-            min=Min("dai_price"),
-            avg=Avg("dai_price"),
-            amount_total=Sum("dai_amount"),
+            max=Max("price_max"),
+            min=Min("price_min"),
+            avg=ExpressionWrapper(
+                Sum("price_sum") / Sum("count"), output_field=DecimalField()
+            ),
+            amount_total=Sum("amount"),
         )
         .order_by("exchange")
     )
@@ -0,0 +1,263 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+
+from maker.constants import (
+    DRAWDOWN_PAIRS_HISTORY_DAYS,
+    DRAWDOWN_SOURCE_OHLCV,
+    DRAWDOWN_SOURCE_OSM,
+    OHLCV_TYPE_HOURLY,
+)
+from maker.models import OHLCV, OSM, DrawdownHistogram, MakerAsset, OHLCVPair
+from maker.utils.utils import round_to_closest
+
+log = logging.getLogger(__name__)
+
+# Buckets outside of (MIN_DRAWDOWN_BUCKET, 0) are stored, but not shown
+MIN_DRAWDOWN_BUCKET = -80
+
+
+def get_drawdown_pair_ids(symbol, ohlcv_type=None):
+    """Returns {ohlcv_type: [pair_id]} of the drawdown pairs for symbol"""
+    pairs = defaultdict(list)
+    for key in DRAWDOWN_PAIRS_HISTORY_DAYS.keys():
+        from_symbol, to_symbol, exchange, pair_ohlcv_type = key.split("-")
+        if from_symbol != symbol:
+            continue
+        if ohlcv_type and pair_ohlcv_type != ohlcv_type:
+            continue
+
+        pair_ids = OHLCVPair.objects.filter(
+            from_asset_symbol=from_symbol,
+            to_asset_symbol=to_symbol,
+            ohlcv_type=pair_ohlcv_type,
+            exchange=exchange,
+        ).values_list("id", flat=True)
+        pairs[pair_ohlcv_type] += pair_ids
+    return pairs
+
+
+def get_drawdown_ohlcv_types(symbol):
+    """Returns OHLCV types of the drawdown pairs for symbol"""
+    ohlcv_types = []
+    for key in DRAWDOWN_PAIRS_HISTORY_DAYS.keys():
+        from_symbol, _, _, ohlcv_type = key.split("-")
+        if from_symbol == symbol and ohlcv_type not in ohlcv_types:
+            ohlcv_types.append(ohlcv_type)
+    return ohlcv_types
+
+
+def get_ohlcv_drawdowns(pair_ids):
+    return OHLCV.objects.filter(
+        pair_id__in=pair_ids,
+        drawdown__lt=-2,
+        drawdown_hl__isnull=False,
+    )
+
+
+def iter_ohlcv_drawdown_buckets(ohlcvs):
+    """Yields (datetime, timestamp, bucket) for OHLCV drawdowns"""
+    for dt, timestamp, drawdown_hl in ohlcvs.values_list(
+        "datetime", "timestamp", "drawdown_hl"
+    ).iterator():
+        yield dt, timestamp, round_to_closest(drawdown_hl)
+
+
+def get_osm_drawdowns(symbol):
+    # Same as (next_price - current_price) / current_price * 100 <= -2, but lets
+    # the database skip the rows without a drawdown
+    return OSM.objects.filter(
+        symbol=symbol,
+        current_price__gt=0,
+        next_price__lte=F("current_price") * Decimal("0.98"),
+    )
+
+
+def iter_osm_drawdown_buckets(osms):
+    """Yields (datetime, timestamp, bucket) for OSM drawdowns"""
+    for dt, current_price, next_price in osms.values_list(
+        "datetime", "current_price", "next_price"
+    ).iterator():
+        drawdown = (next_price - current_price) / current_price * 100
+        if drawdown <= -2:
+            yield dt, int(dt.timestamp()), round_to_closest(drawdown)
+
+
+def _build_histogram(buckets):
+    histogram = {}
+    for dt, timestamp, bucket in buckets:
+        key = (dt.date(), bucket)
+        if key not in histogram:
+            histogram[key] = [0, timestamp, timestamp]
+        item = histogram[key]
+        item[0] += 1
+        item[1] = min(item[1], timestamp)
+        item[2] = max(item[2], timestamp)
+    return histogram
+
+
+def _update_histogram(source, symbol, ohlcv_type, rows, iter_buckets, full=False):
+    """
+    Recomputes the histogram for all days that got new rows since the last update,
+    or for the whole history when `full` is set.
+    """
+    histograms = DrawdownHistogram.objects.filter(
+        source=source, symbol=symbol, ohlcv_type=ohlcv_type
+    )
+    started = datetime.now()
+    last_update = None
+    if not full:
+        last_update = histograms.aggregate(Max("modified"))["modified__max"]
+
+    days = None
+    if last_update:
+        days = list(rows.filter(created__gte=last_update).dates("datetime", "day"))
+        if not days:
+            return
+        rows = rows.filter(datetime__date__in=days)
+
+    histogram = _build_histogram(iter_buckets(rows))
+    with transaction.atomic():
+        if days is None:
+            histograms.delete()
+        else:
+            histograms.filter(date__in=days).delete()
+        DrawdownHistogram.objects.bulk_create(
+            [
+                DrawdownHistogram(
+                    source=source,
+                    symbol=symbol,
+                    ohlcv_type=ohlcv_type,
+                    date=day,
+                    bucket=bucket,
+                    amount=amount,
+                    start_timestamp=start_timestamp,
+                    end_timestamp=end_timestamp,
+                    # Rows created while the histogram was being built are picked
+                    # up by the next update
+                    created=started,
+                    modified=started,
+                )
+                for (day, bucket), (
+                    amount,
+                    start_timestamp,
+                    end_timestamp,
+                ) in histogram.items()
+            ]
+        )
+    log.debug(
+        "Updated %s %s %s drawdown histogram for %s days",
+        source,
+        symbol,
+        ohlcv_type,
+        "all" if days is None else len(days),
+    )
+
+
+def update_drawdown_histograms(full=False):
+    symbols = {key.split("-")[0] for key in DRAWDOWN_PAIRS_HISTORY_DAYS.keys()}
+    for symbol in sorted(symbols):
+        for ohlcv_type, pair_ids in get_drawdown_pair_ids(symbol).items():
+            _update_histogram(
+                DRAWDOWN_SOURCE_OHLCV,
+                symbol,
+                ohlcv_type,
+                get_ohlcv_drawdowns(pair_ids),
+                iter_ohlcv_drawdown_buckets,
+                full=full,
+            )
+
+    for symbol in MakerAsset.objects.filter(is_active=True).values_list(
+        "symbol", flat=True
+    ):
+        _update_histogram(
+            DRAWDOWN_SOURCE_OSM,
+            symbol,
+            OHLCV_TYPE_HOURLY,
+            get_osm_drawdowns(symbol),
+            iter_osm_drawdown_buckets,
+            full=full,
+        )
+
+
+def _visible_buckets(histograms, min_bucket=MIN_DRAWDOWN_BUCKET):
+    histograms = histograms.filter(bucket__lt=0)
+    if min_bucket is not None:
+        histograms = histograms.filter(bucket__gt=min_bucket)
+    return histograms
+
+
+def get_drawdown_histogram(
+    source, symbol, ohlcv_type, since_timestamp=None, min_bucket=MIN_DRAWDOWN_BUCKET
+):
+    """
+    Returns {bucket: amount} of the visible buckets. With `since_timestamp` only
+    drawdowns from then on are counted: whole days are read from the histogram
+    and the first, partial day from the OHLCV rows.
+    """
+    histograms = DrawdownHistogram.objects.filter(
+        source=source, symbol=symbol, ohlcv_type=ohlcv_type
+    )
+    counter = defaultdict(int)
+    if since_timestamp is not None:
+        if source != DRAWDOWN_SOURCE_OHLCV:
+            raise ValueError("since_timestamp is only supported for OHLCV")
+        since_date = datetime.fromtimestamp(since_timestamp).date()
+        histograms = histograms.filter(date__gt=since_date)
+        pair_ids = get_drawdown_pair_ids(symbol, ohlcv_type)[ohlcv_type]
+        ohlcvs = get_ohlcv_drawdowns(pair_ids).filter(
+            datetime__date=since_date, timestamp__gte=since_timestamp
+        )
+        for _, _, bucket in iter_ohlcv_drawdown_buckets(ohlcvs):
+            if bucket < 0 and (min_bucket is None or bucket > min_bucket):
+                counter[bucket] += 1
+
+    buckets = (
+        _visible_buckets(histograms, min_bucket=min_bucket)
+        .values("bucket")
+        .annotate(amount=Sum("amount"))
+        .order_by("-bucket")
+        .values_list("bucket", "amount")
+    )
+    for bucket, amount in buckets:
+        counter[bucket] += amount
+    return dict(sorted(counter.items(), reverse=True))
+
+
+def get_drawdown_histograms(source, symbols, ohlcv_type):
+    """Returns {symbol: {bucket: amount}} of the visible buckets"""
+    buckets = (
+        _visible_buckets(
+            DrawdownHistogram.objects.filter(
+                source=source, symbol__in=symbols, ohlcv_type=ohlcv_type
+            )
+        )
+        .values("symbol", "bucket")
+        .annotate(amount=Sum("amount"))
+        .order_by("symbol", "-bucket")
+        .values_list("symbol", "bucket", "amount")
+    )
+    histograms = defaultdict(dict)
+    for symbol, bucket, amount in buckets:
+        histograms[symbol][bucket] = amount
+    return histograms
+
+
+def get_drawdown_timestamps(source, symbol, ohlcv_type):
+    """Returns timestamps of the first and last drawdown or None"""
+    data = DrawdownHistogram.objects.filter(
+        source=source, symbol=symbol, ohlcv_type=ohlcv_type
+    ).aggregate(
+        start_timestamp=Min("start_timestamp"), end_timestamp=Max("end_timestamp")
+    )
+    if data["start_timestamp"] is None:
+        return None
+    return data
@@ -7,17 +7,26 @@ from django_bulk_load import bulk_insert_models
 from maker.sources.cortex import fetch_cortex_urn_states
 from maker.utils.metrics import auto_named_statsd_timer
 
-from ..models import UrnEventState
+from ..models import IngestionChunk, UrnEventState
 
 # ATLAS-API DATA
 
 
 @auto_named_statsd_timer
-def save_urn_event_states():
-    latest_block = UrnEventState.latest_block_number()
+def save_urn_event_states(from_block=None, to_block=None):
+    if from_block is None:
+        latest_block = IngestionChunk.objects.resume_block(
+            "urn_event_states", UrnEventState.latest_block_number()
+        )
+    else:
+        latest_block = from_block - 1
     urn_states_data = fetch_cortex_urn_states(latest_block)
     bulk_create = []
     for urn_state in urn_states_data:
+        # Events are returned ordered the same way as `latest_block_number` expects
+        # them to be, so we can stop streaming once we're past the requested range
+        if to_block is not None and urn_state["block_number"] > to_block:
+            break
         bulk_create.append(UrnEventState(**urn_state))
         if len(bulk_create) >= 1000:
             bulk_insert_models(bulk_create, ignore_conflicts=True)
@@ -0,0 +1,140 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django_bulk_load import bulk_insert_models
+
+from maker.constants import (
+    INGESTION_CHUNK_STATUS_DONE,
+    INGESTION_CHUNK_STATUS_FAILED,
+    INGESTION_CHUNK_STATUS_PENDING,
+    INGESTION_CHUNK_STATUS_RUNNING,
+)
+
+from ..models import IngestionChunk, MakerAsset
+from .auctions import save_clipper_events
+from .events import save_urn_event_states
+from .osm import save_medianizer_prices, save_osm_for_asset
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50000
+MAX_CHUNK_ATTEMPTS = 5
+
+# Celery kills a task once it hits the time limit, so a chunk that has been running
+# for longer than that was left behind by a dead worker and can be picked up again.
+STALE_CHUNK_SECONDS = settings.CELERY_TASK_TIME_LIMIT
+
+
+def _save_osm(key, from_block, to_block):
+    save_osm_for_asset(key, last_block=from_block, to_block=to_block)
+
+
+def _save_medianizer(key, from_block, to_block):
+    asset = MakerAsset.objects.get(symbol=key)
+    save_medianizer_prices(
+        asset.symbol, asset.medianizer_address, from_block=from_block, to_block=to_block
+    )
+
+
+def _save_urn_event_states(key, from_block, to_block):
+    save_urn_event_states(from_block=from_block, to_block=to_block)
+
+
+def _save_clipper_events(key, from_block, to_block):
+    save_clipper_events(from_block=from_block, to_block=to_block)
+
+
+# Every handler gets called with (key, from_block, to_block), where both blocks are
+# inclusive. Handlers must be idempotent as a chunk is re-run from the start if the
+# worker processing it dies.
+INGESTION_HANDLERS = {
+    "osm": _save_osm,
+    "medianizer": _save_medianizer,
+    "urn_event_states": _save_urn_event_states,
+    "clipper_events": _save_clipper_events,
+}
+
+
+def _runnable_chunks_filter():
+    stale_dt = datetime.now() - timedelta(seconds=STALE_CHUNK_SECONDS)
+    return Q(attempts__lt=MAX_CHUNK_ATTEMPTS) & (
+        Q(status__in=[INGESTION_CHUNK_STATUS_PENDING, INGESTION_CHUNK_STATUS_FAILED])
+        | Q(status=INGESTION_CHUNK_STATUS_RUNNING, modified__lt=stale_dt)
+    )
+
+
+def plan_chunks(stream, from_block, to_block, key="", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Splits the block range into chunks of `chunk_size` blocks. Chunks that already
+    exist are left as they are, so planning the same range again is a no-op.
+    """
+    if stream not in INGESTION_HANDLERS:
+        raise ValueError("Unknown ingestion stream {}".format(stream))
+
+    chunks = []
+    for start in range(from_block, to_block + 1, chunk_size):
+        chunks.append(
+            IngestionChunk(
+                stream=stream,
+                key=key,
+                from_block=start,
+                to_block=min(start + chunk_size - 1, to_block),
+            )
+        )
+    if chunks:
+        bulk_insert_models(chunks, ignore_conflicts=True)
+    return len(chunks)
+
+
+def get_runnable_chunk_ids(stream=None, key=None):
+    chunks = IngestionChunk.objects.filter(_runnable_chunks_filter())
+    if stream is not None:
+        chunks = chunks.filter(stream=stream)
+    if key is not None:
+        chunks = chunks.filter(key=key)
+    return list(chunks.order_by("from_block").values_list("id", flat=True))
+
+
+def claim_chunk(chunk_id):
+    """
+    Marks the chunk as running. Only one worker can claim a chunk, so it doesn't
+    matter if the same chunk gets queued multiple times.
+    """
+    claimed = IngestionChunk.objects.filter(
+        _runnable_chunks_filter(), id=chunk_id
+    ).update(
+        status=INGESTION_CHUNK_STATUS_RUNNING,
+        attempts=F("attempts") + 1,
+        modified=datetime.now(),
+    )
+    return claimed == 1
+
+
+def process_chunk(chunk_id):
+    if not claim_chunk(chunk_id):
+        log.info("Skipping ingestion chunk %s as it's not runnable", chunk_id)
+        return False
+
+    chunk = IngestionChunk.objects.get(id=chunk_id)
+    log.info("Processing %r", chunk)
+    handler = INGESTION_HANDLERS[chunk.stream]
+    try:
+        handler(chunk.key, chunk.from_block, chunk.to_block)
+    except Exception as e:
+        IngestionChunk.objects.filter(id=chunk_id).update(
+            status=INGESTION_CHUNK_STATUS_FAILED,
+            error=str(e),
+            modified=datetime.now(),
+        )
+        raise
+
+    IngestionChunk.objects.filter(id=chunk_id).update(
+        status=INGESTION_CHUNK_STATUS_DONE, error=None, modified=datetime.now()
+    )
+    return True
@@ -6,13 +6,16 @@ import csv
 import io
 import logging
 import math
-import statistics
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from operator import itemgetter
 
+import numpy as np
+import pandas as pd
 import pytz
-from django.db.models import Avg
+from django.db.models import Avg, StdDev
+from django_bulk_load import bulk_insert_models
 
 from maker.constants import (
     DRAWDOWN_PAIRS_HISTORY_DAYS,
@@ -20,7 +23,7 @@ from maker.constants import (
     OHLCV_TYPE_DAILY,
     STABLECOINS,
 )
-from maker.models import OHLCV, OHLCVPair
+from maker.models import OHLCV, OHLCVPair, Volatility
 from maker.sources.cryptocompare import fetch_full_history, fetch_pair_mapping
 from maker.utils.s3 import upload_content_to_s3
 from maker.utils.utils import get_date_timestamp_days_ago, get_date_timestamp_eod
@@ -112,6 +115,27 @@ def _save_latest_ohlcv(pair, number_of_days):
     _save_asset_pair_ohlcv(pair, ohlcv_data, number_of_days=number_of_days)
 
 
+def _get_usd_prices(conversion_pairs, timestamps):
+    """
+    Returns {timestamp: average close of the conversion pairs} for the whole range of
+    timestamps, loaded with a single query.
+    """
+    if not timestamps:
+        return {}
+    prices = (
+        OHLCV.objects.filter(
+            pair__in=conversion_pairs,
+            timestamp__gte=min(timestamps),
+            timestamp__lte=max(timestamps),
+        )
+        .values("timestamp")
+        .annotate(close_avg=Avg("close"))
+        .order_by()
+        .values_list("timestamp", "close_avg")
+    )
+    return dict(prices)
+
+
 def _save_asset_pair_ohlcv(pair, ohlcv_data, number_of_days):
     from_timestamp = get_date_timestamp_days_ago(number_of_days)
     try:
@@ -123,14 +147,29 @@ def _save_asset_pair_ohlcv(pair, ohlcv_data, number_of_days):
     # We want first entry to be latest
     ohlcv_data = list(reversed(sorted(ohlcv_data, key=itemgetter("time"))))
 
-    conversion_pairs = None
+    new_ohlcv_data = []
+    for ohlcv in ohlcv_data:
+        # dont get ohlcv data from today since they are not complete
+        if ohlcv["close"] == 0:
+            continue
+        if last_timestamp and ohlcv["time"] <= last_timestamp:
+            break
+        if from_timestamp > ohlcv["time"]:
+            break
+        if ohlcv["volumeto"] is None:
+            continue
+        new_ohlcv_data.append(ohlcv)
+
+    if not new_ohlcv_data:
+        return
+
+    usd_prices = {}
     if not pair.to_asset_is_stable:
         conversion_pairs = OHLCVPair.objects.filter(
             from_asset_symbol=pair.to_asset_symbol, to_asset_symbol="USD"
         )
-        # check if conversion pair is updated for that timestamp
-        # if it is not first fetch data from conversion_pairs and the continue with
-        # pair data
+        # Conversion pairs are synced before the pairs that depend on them (see
+        # get_ohlcv_pairs_sync_order), this only catches up pairs that fell behind
         lastest_timestamp_from_ohlcv_data = ohlcv_data[0]["time"]
         for conversion_pair in conversion_pairs:
             ohlcv_exists = OHLCV.objects.filter(
@@ -139,35 +178,23 @@ def _save_asset_pair_ohlcv(pair, ohlcv_data, number_of_days):
             if not ohlcv_exists:
                 _save_latest_ohlcv(conversion_pair, number_of_days=number_of_days)
 
+        usd_prices = _get_usd_prices(
+            conversion_pairs, [ohlcv["time"] for ohlcv in new_ohlcv_data]
+        )
+
     if pair.exchange in EXCHANGES:
         haircut = Decimal(EXCHANGES[pair.exchange]["haircut"] / 100)
     else:
         haircut = Decimal("100")
 
     to_create = []
-    for ohlcv in ohlcv_data:
-        # dont get ohlcv data from today since they are not complete
-        if ohlcv["close"] == 0:
-            continue
-        if last_timestamp and ohlcv["time"] <= last_timestamp:
-            break
-        if from_timestamp > ohlcv["time"]:
-            break
-
+    for ohlcv in new_ohlcv_data:
         volumen_to = ohlcv["volumeto"]
-        if volumen_to is None:
-            continue
-
         if pair.to_asset_is_stable:
             volume_usd = Decimal(volumen_to) * haircut
         else:
-            usd_history = (
-                OHLCV.objects.filter(timestamp=ohlcv["time"], pair__in=conversion_pairs)
-                .values("timestamp")
-                .annotate(close_avg=Avg("close"))
-                .first()
-            )
-            if not usd_history:
+            usd_price = usd_prices.get(ohlcv["time"])
+            if usd_price is None:
                 log.warning(
                     "No USD conversion pair for pair: %s - %s (%s)",
                     pair.from_asset_symbol,
@@ -176,7 +203,6 @@ def _save_asset_pair_ohlcv(pair, ohlcv_data, number_of_days):
                 )
                 continue
 
-            usd_price = usd_history["close_avg"]
             volume_usd = (Decimal(volumen_to) * usd_price) * haircut
 
         drawdown = (ohlcv["close"] * 100) / ohlcv["open"] - 100
@@ -207,17 +233,102 @@ def _save_asset_pair_ohlcv(pair, ohlcv_data, number_of_days):
         OHLCV.objects.bulk_create(to_create)
 
 
+def get_ohlcv_pairs_sync_order(pairs):
+    """
+    Splits OHLCV pairs by their dependencies. Pairs quoted in an asset that isn't
+    stable need the pairs converting that asset to USD to be synced first.
+
+    Returns (independent_pair_ids, [(conversion_pair_ids, dependent_pair_ids)]).
+    """
+    dependent = defaultdict(list)
+    independent = []
+    for pair in pairs:
+        if pair.to_asset_is_stable:
+            independent.append(pair.id)
+        else:
+            dependent[pair.to_asset_symbol].append(pair.id)
+
+    groups = []
+    for to_asset_symbol, dependent_pair_ids in sorted(dependent.items()):
+        conversion_pair_ids = list(
+            OHLCVPair.objects.filter(
+                from_asset_symbol=to_asset_symbol, to_asset_symbol="USD"
+            )
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        groups.append((conversion_pair_ids, dependent_pair_ids))
+
+    # Conversion pairs are synced as part of their group
+    conversion_pair_ids = {
+        pair_id for conversion_pair_ids, _ in groups for pair_id in conversion_pair_ids
+    }
+    independent = [
+        pair_id for pair_id in independent if pair_id not in conversion_pair_ids
+    ]
+    return independent, groups
+
+
 def calculate_volatility(ohlcv_pair, trailing_days=90, for_date=None):
     if not for_date:
         for_date = datetime.now()
     dt_from = for_date - timedelta(days=trailing_days)
-    drawdowns = OHLCV.objects.filter(
+    std = OHLCV.objects.filter(
         pair=ohlcv_pair, datetime__gte=dt_from, datetime__date__lte=for_date
-    ).values_list("drawdown", flat=True)
-    if not drawdowns:
+    ).aggregate(std=StdDev("drawdown"))["std"]
+    if std is None:
         return
-    std = statistics.pstdev(drawdowns)
-    return std * Decimal(math.sqrt(24))
+    return Decimal(str(std)) * Decimal(math.sqrt(24))
+
+
+def calculate_volatility_history(ohlcv_pair, start_date, end_date, trailing_days=90):
+    """
+    Returns {date: volatility} for every date between start_date and end_date with
+    the same trailing window as `calculate_volatility`. Drawdowns are loaded once
+    and the rolling population standard deviation is computed from daily sums.
+    """
+    window_start = start_date - timedelta(days=trailing_days)
+    rows = list(
+        OHLCV.objects.filter(
+            pair=ohlcv_pair,
+            datetime__gte=window_start,
+            datetime__date__lte=end_date,
+            drawdown__isnull=False,
+        ).values_list("datetime", "drawdown")
+    )
+    if not rows:
+        return {}
+
+    ohlcvs = pd.DataFrame.from_records(rows, columns=["datetime", "drawdown"])
+    values = ohlcvs["drawdown"].astype(np.float64)
+    # Shift the values by their mean so the sums of squares don't lose precision
+    values = values - values.mean()
+    daily = (
+        pd.DataFrame({"count": 1, "sum": values, "sum_sq": values**2})
+        .groupby(ohlcvs["datetime"].dt.normalize())
+        .sum()
+        .reindex(pd.date_range(window_start, end_date, freq="D"), fill_value=0)
+    )
+    # Window of each date includes the trailing days and the date itself
+    windows = daily.rolling(trailing_days + 1, min_periods=1).sum()
+    windows = windows[windows.index >= pd.Timestamp(start_date)]
+    windows = windows[windows["count"] > 0]
+
+    mean = windows["sum"] / windows["count"]
+    variance = (windows["sum_sq"] / windows["count"] - mean**2).clip(lower=0)
+    stds = np.sqrt(variance) * math.sqrt(24)
+    return {dt.date(): Decimal(str(std)) for dt, std in stds.items()}
+
+
+def save_volatility_history(ohlcv_pair, start_date, end_date):
+    volatilities = calculate_volatility_history(ohlcv_pair, start_date, end_date)
+    bulk_insert_models(
+        [
+            Volatility(pair=ohlcv_pair, date=for_date, volatility=volatility)
+            for for_date, volatility in volatilities.items()
+        ],
+        ignore_conflicts=True,
+    )
 
 
 def _history_to_csv(history):
@@ -6,6 +6,8 @@ import logging
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+import numpy as np
+import pandas as pd
 from django.conf import settings
 from django.db.models import F, Value
 from django_bulk_load import bulk_insert_models
@@ -13,14 +15,18 @@ from eth_utils import to_checksum_address
 from web3 import Web3
 
 from maker.models import TokenPriceHistory
-from maker.modules.block import get_or_save_block
+from maker.modules.block import get_block_timestamp, get_block_timestamps
 from maker.utils.blockchain.chain import Blockchain
+from maker.utils.timeseries import DOWNSAMPLE_LTTB, downsample
 from maker.utils.utils import date_to_timestamp
 
-from ..models import OSM, MakerAsset, Medianizer, OSMDaily
+from ..models import OSM, IngestionChunk, MakerAsset, Medianizer, OSMDaily
 
 log = logging.getLogger(__name__)
 
+# to_next_change is in minutes, so responses including it can be reused for a minute
+TO_NEXT_CHANGE_TIME_BUCKET = 60
+
 
 def _convert_price(hex_price):
     return Decimal(int(hex_price[34:], 16)) / 10**18
@@ -44,25 +50,45 @@ def get_next_osm_price(asset, block_number, chain):
         current_price, next_price = _get_osm_price(
             Web3.toChecksumAddress(asset.oracle_address), block_number, chain
         )
-    block = get_or_save_block(block_number)
-    return current_price, next_price, block.timestamp
+    return current_price, next_price, get_block_timestamp(block_number)
+
 
+def fetch_osm_prices(asset, block_numbers, chain):
+    """
+    Batched version of `get_next_osm_price`. Fetches current (slot 3) and next
+    (slot 4) OSM price and block timestamp for all blocks with batched requests.
+    Returns a list of (block_number, current_price, next_price, timestamp).
+    """
+    storage = {}
+    if asset.type in ["asset", "lp"]:
+        storage = chain.get_storage_at_many(asset.oracle_address, [3, 4], block_numbers)
+    timestamps = get_block_timestamps(block_numbers, chain=chain)
+
+    prices = []
+    for block_number in block_numbers:
+        current_price = Decimal("0")
+        next_price = Decimal("0")
+        if storage:
+            current_price = _convert_price(storage[(block_number, 3)])
+            next_price = _convert_price(storage[(block_number, 4)])
+        prices.append(
+            (block_number, current_price, next_price, timestamps[block_number])
+        )
+    return prices
 
-def fetch_block_numbers_from_poke_events(asset, from_block=None, chain=None):
+
+def fetch_block_numbers_from_poke_events(
+    asset, from_block=None, chain=None, to_block=None
+):
     if asset.type == "lp":
         topic = Web3.keccak(text="Value(uint128,uint128)").hex()
     else:
         topic = Web3.keccak(text="LogValue(bytes32)").hex()
-    step = 50000
-    end_block = chain.get_latest_block()
-    for block_number in range(from_block, end_block, step):
-        filters = {
-            "fromBlock": block_number,
-            "toBlock": block_number + step,
-            "address": Web3.toChecksumAddress(asset.oracle_address),
-            "topics": [topic],
-        }
-        events = chain.eth.get_logs(filters)
+    filters = {
+        "address": Web3.toChecksumAddress(asset.oracle_address),
+        "topics": [topic],
+    }
+    for _, _, events in chain.scan_logs(filters, from_block, to_block=to_block):
         block_numbers = set()
         for event in events:
             block_numbers.add(event["blockNumber"])
@@ -70,21 +96,28 @@ def fetch_block_numbers_from_poke_events(asset, from_block=None, chain=None):
         yield sorted(block_numbers)
 
 
-def save_osm_for_asset(symbol, last_block=None):
+def save_osm_for_asset(symbol, last_block=None, to_block=None):
     chain = Blockchain(node=settings.ETH_NODE_MAKER)
     asset = MakerAsset.objects.get(symbol=symbol)
     if not last_block:
         try:
-            last_block = OSM.objects.latest_for_asset(asset.symbol).block_number + 1
+            latest_block = OSM.objects.latest_for_asset(asset.symbol).block_number
         except OSM.DoesNotExist:
-            last_block = 8936795
+            latest_block = None
+        resume_block = IngestionChunk.objects.resume_block(
+            "osm", latest_block, key=asset.symbol
+        )
+        last_block = 8936795 if resume_block is None else resume_block + 1
 
-    for block_numbers in fetch_block_numbers_from_poke_events(asset, last_block, chain):
+    for block_numbers in fetch_block_numbers_from_poke_events(
+        asset, last_block, chain, to_block=to_block
+    ):
+        if not block_numbers:
+            continue
         bulk_create = []
-        for block_number in block_numbers:
-            current_price, next_price, timestamp = get_next_osm_price(
-                asset, block_number, chain
-            )
+        for block_number, current_price, next_price, timestamp in fetch_osm_prices(
+            asset, block_numbers, chain
+        ):
             bulk_create.append(
                 OSM(
                     symbol=asset.symbol,
@@ -116,47 +149,77 @@ def get_medianizer_address(oracle_address, chain=None):
     return data["medianizer_address"]
 
 
-def save_medianizer_prices(symbol, medianizer_address, chain=None, from_block=0):
+def fetch_medianizer_prices(reads, chain):
+    """
+    Reads medianizer prices for (medianizer_address, block_number) pairs with
+    batched requests. Returns {(medianizer_address, block_number): price}.
+
+    `read()` on a medianizer is only allowed for whitelisted contracts, so we read
+    the price from its storage (slot 1) instead of going through multicall.
+    """
+    values = chain.get_storage_at_batch(
+        [(address, 1, block_number) for address, block_number in reads]
+    )
+    return {
+        (address, block_number): chain.covert_to_number(value) / Decimal(10**18)
+        for (address, _, block_number), value in values.items()
+    }
+
+
+def save_medianizer_prices_for_assets(assets, from_blocks, to_block=None):
+    """
+    Saves medianizer prices for multiple assets with a single log scan over all
+    medianizer addresses. `from_blocks` maps asset symbol to the first block we
+    want prices for.
+    """
     chain = Blockchain(node=settings.ETH_NODE_MAKER)
-    medianizer_address = to_checksum_address(medianizer_address)
+    symbols = {
+        to_checksum_address(asset.medianizer_address): asset.symbol for asset in assets
+    }
+    if not symbols:
+        return
+
     topic = chain.to_hex_topic("LogMedianPrice(uint256,uint256)")
-    end_block = chain.get_latest_block()
-    step = 50000
-    for block_number in range(from_block, end_block, step):
-        bulk_create = []
-        if block_number + step > end_block:
-            end_block = "latest"
-        filters = {
-            "fromBlock": block_number,
-            "toBlock": end_block,
-            "address": medianizer_address,
-            "topics": [topic],
-        }
-        events = chain.eth.get_logs(filters)
-        block_numbers = set()
+    filters = {
+        "address": list(symbols.keys()),
+        "topics": [topic],
+    }
+    from_block = min(from_blocks[symbol] for symbol in symbols.values())
+    for _, _, events in chain.scan_logs(filters, from_block, to_block=to_block):
+        reads = set()
         for event in events:
-            block_numbers.add(event["blockNumber"])
-        blocks = sorted(block_numbers)
-        for block_number in blocks:
-            hex_value = chain.get_storage_at(
-                medianizer_address, 1, block_identifier=block_number
-            )
-            price = chain.covert_to_number(hex_value) / Decimal(10**18)
-            block = get_or_save_block(block_number)
+            address = to_checksum_address(event["address"])
+            if event["blockNumber"] >= from_blocks[symbols[address]]:
+                reads.add((address, event["blockNumber"]))
+        if not reads:
+            continue
+
+        prices = fetch_medianizer_prices(sorted(reads), chain)
+        timestamps = get_block_timestamps(
+            {block_number for _, block_number in reads}, chain=chain
+        )
+        bulk_create = []
+        for (address, block_number), price in prices.items():
+            timestamp = timestamps[block_number]
             bulk_create.append(
                 Medianizer(
-                    symbol=symbol,
+                    symbol=symbols[address],
                     price=price,
-                    block_number=block.block_number,
-                    timestamp=block.timestamp,
-                    datetime=block.datetime,
+                    block_number=block_number,
+                    timestamp=timestamp,
+                    datetime=datetime.fromtimestamp(timestamp),
                 )
             )
-        if not bulk_create:
-            continue
         bulk_insert_models(bulk_create, ignore_conflicts=True)
 
 
+def save_medianizer_prices(
+    symbol, medianizer_address, chain=None, from_block=0, to_block=None
+):
+    asset = MakerAsset(symbol=symbol, medianizer_address=medianizer_address)
+    save_medianizer_prices_for_assets([asset], {symbol: from_block}, to_block=to_block)
+
+
 def get_osm_and_medianizer(symbol):
     try:
         osm = OSM.objects.filter(symbol=symbol).latest()
@@ -201,7 +264,11 @@ def get_osm_and_medianizer(symbol):
     return data
 
 
-def get_price_history(symbol, days_ago):
+def get_price_history(symbol, days_ago, points=None, method=DOWNSAMPLE_LTTB):
+    """
+    Returns OSM, medianizer and chainlink prices since `days_ago`. When `points` is
+    set, each of the series is downsampled to at most that many points.
+    """
     data = []
     underyling_symbol = symbol
     if symbol == "ETH":
@@ -226,31 +293,67 @@ def get_price_history(symbol, days_ago):
         .filter(underlying_symbol=underyling_symbol, timestamp__gte=timestamp)
         .values("key", "timestamp", "amount")
     )
-    data.extend(osm_history)
-    data.extend(medianizer_history)
-    data.extend(chainlink_history)
+    for history in [osm_history, medianizer_history, chainlink_history]:
+        if points:
+            data.extend(
+                downsample(list(history.order_by("timestamp")), points, method=method)
+            )
+        else:
+            data.extend(history)
     return data
 
 
-def _get_greatest_drop_from_price_list(price_list):
-    daily_high = max(price_list)
-    daily_low = min(price_list)
-    low = None
-    greatest_drop = None
-    drop_start = None
-    drop_end = None
+def _get_osm_daily(symbol, osms):
+    """
+    Builds OSMDaily rows out of (datetime, current_price, next_price) tuples
+    ordered by datetime. Only days with at least two OSM updates and a price drop
+    during the day are returned.
+    """
+    if not osms:
+        return []
+
+    osms = pd.DataFrame(osms, columns=["datetime", "current_price", "next_price"])
+    osms["date"] = osms["datetime"].dt.date
 
-    for price in reversed(price_list):
-        if low is None or price < low:
-            low = price
+    dailies = []
+    for day, day_osms in osms.groupby("date", sort=True):
+        if len(day_osms) < 2:
+            continue
+        daily_open = day_osms["current_price"].iloc[0]
+        daily_close = day_osms["next_price"].iloc[-1]
+        if daily_open == 0:
+            continue
 
-        drop = (low - price) / price * 100
-        if greatest_drop is None or drop < greatest_drop:
-            greatest_drop = drop
-            drop_start = price
-            drop_end = low
+        # Prices during the day are the open price followed by all next prices
+        prices = [daily_open, *day_osms["next_price"]]
+        values = np.array(prices, dtype=np.float64)
+        # Lowest price from each price until the end of the day
+        lows = np.minimum.accumulate(values[::-1])[::-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drops = np.where(values > 0, (lows - values) / values, 0)
+        # On ties prefer the latest drop
+        start = len(drops) - 1 - int(drops[::-1].argmin())
+        if drops[start] >= 0:
+            continue
 
-    return daily_low, daily_high, greatest_drop, drop_start, drop_end
+        drop_start = prices[start]
+        drop_end = prices[start + int(values[start:].argmin())]
+        dailies.append(
+            OSMDaily(
+                symbol=symbol,
+                date=day,
+                open=daily_open,
+                close=daily_close,
+                timestamp=date_to_timestamp(day),
+                drawdown=(daily_close - daily_open) / daily_open * 100,
+                daily_low=prices[int(values.argmin())],
+                daily_high=prices[int(values.argmax())],
+                greatest_drop=(drop_end - drop_start) / drop_start * 100,
+                drop_start=drop_start,
+                drop_end=drop_end,
+            )
+        )
+    return dailies
 
 
 def save_osm_daily():
@@ -261,50 +364,22 @@ def save_osm_daily():
             latest_daily = OSMDaily.objects.filter(symbol=asset.symbol).latest()
             start_date = latest_daily.date
         except OSMDaily.DoesNotExist:
-            start_date = (
-                OSM.objects.filter(symbol=asset.symbol).earliest().datetime.date()
-            )
-
-        days_diff = (end_date - start_date).days
-
-        for d in range(1, days_diff + 1):
-            day = start_date + timedelta(days=d)
-            osms = OSM.objects.filter(symbol=asset.symbol, datetime__date=day).order_by(
-                "datetime"
-            )
-            osms = list(osms)
-            if len(osms) < 2:
-                continue
-            daily_open = osms[0].current_price
-            daily_close = osms[-1].next_price
-            if daily_open == 0:
-                continue
-            daily_drawdown = (daily_close - daily_open) / daily_open * 100
-            price_list = [daily_open]
-            for osm in osms:
-                price_list.append(osm.next_price)
-
-            (
-                daily_low,
-                daily_high,
-                greatest_drop,
-                drop_start,
-                drop_end,
-            ) = _get_greatest_drop_from_price_list(price_list)
-
-            if greatest_drop < 0:
-                OSMDaily.objects.get_or_create(
-                    symbol=asset.symbol,
-                    date=day,
-                    defaults={
-                        "open": daily_open,
-                        "close": daily_close,
-                        "timestamp": date_to_timestamp(day),
-                        "drawdown": daily_drawdown,
-                        "daily_low": daily_low,
-                        "daily_high": daily_high,
-                        "greatest_drop": greatest_drop,
-                        "drop_start": drop_start,
-                        "drop_end": drop_end,
-                    },
+            try:
+                start_date = (
+                    OSM.objects.filter(symbol=asset.symbol).earliest().datetime.date()
                 )
+            except OSM.DoesNotExist:
+                continue
+
+        # Load the whole missing range with a single query
+        osms = OSM.objects.filter(
+            symbol=asset.symbol,
+            datetime__date__gt=start_date,
+            datetime__date__lte=end_date,
+        ).order_by("datetime")
+        dailies = _get_osm_daily(
+            asset.symbol,
+            list(osms.values_list("datetime", "current_price", "next_price")),
+        )
+        if dailies:
+            bulk_insert_models(dailies, ignore_conflicts=True)
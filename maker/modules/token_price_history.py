@@ -2,11 +2,14 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 import logging
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
 from django.conf import settings
 from django.db import IntegrityError
+from django.db.models import Q, Subquery
 from django_bulk_load import bulk_insert_models
 from web3 import Web3
 
@@ -19,6 +22,23 @@ from maker.utils.utils import chunks
 log = logging.getLogger(__name__)
 
 
+# Number of rounds fetched with a single multicall and the number of multicalls
+# that run concurrently
+ROUNDS_CHUNK_SIZE = 2500
+ROUNDS_FETCH_WORKERS = 4
+
+# WBTC rounds are read from the BTC feed
+CHAINLINK_UNDERLYING_OVERRIDES = {
+    "0xeb4c2781e4eba804ce9a9803c67d0893436bb27d": (
+        "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599"
+    ),
+}
+
+# Tokens whose feed is denominated in USD. Feeds of all other tokens are
+# denominated in ETH and get converted to USD with the ETH price history.
+USD_FEED_SYMBOLS = ["ENS", "USDP", "sUSD", "UST", "MATIC", "CVX", "LUSD"]
+
+
 def sync_chainlink_rounds():
     w3 = Blockchain(node=settings.ETH_NODE_MAKER)
     save_eth_rounds(chain=w3)
@@ -26,287 +46,193 @@ def sync_chainlink_rounds():
     save_remaining_rounds(chain=w3)
 
 
-def save_eth_rounds(chain=None):
-    w3 = Blockchain(_web3=chain)
-    token = Asset.objects.get(underlying_symbol="ETH")
+def _get_saved_round(token):
     try:
-        saved_round = int(
-            TokenPriceHistory.objects.filter(underlying_symbol="ETH").latest().round_id
+        return int(
+            TokenPriceHistory.objects.filter(underlying_symbol=token.underlying_symbol)
+            .latest()
+            .round_id
         )
     except TokenPriceHistory.DoesNotExist:
-        populate_eth_price_history(chain=w3)
-        return
-    latest_phase = get_token_phase_id(token.address, chain=w3)
-    decimals = get_token_decimals(token.address, chain=w3)
-    aggregator = get_token_aggregator(token.address, latest_phase["id"], chain=w3)
-    latest_aggregator_round = get_latest_round(aggregator["address"])
-    latest_proxy_round = latest_phase["id"] << 64 | latest_aggregator_round
-    if saved_round == latest_proxy_round:
-        return
-    earliest_proxy_round = latest_phase["id"] << 64 | 1
-    all_rounds = [*range(earliest_proxy_round, latest_proxy_round + 1, 1)]
-    if saved_round in all_rounds:
-        all_rounds = all_rounds[all_rounds.index(saved_round) + 1 :]
-    else:
-        previous_aggregator = get_token_aggregator(
-            token.address, latest_phase["id"] - 1, chain=w3
-        )
-        previous_aggregator_round = get_latest_round(previous_aggregator["address"])
-        end_proxy_round = (latest_phase["id"] - 1) << 64 | previous_aggregator_round
-        start_proxy_round = (latest_phase["id"] - 1) << 64 | 1
-        previous_rounds = [*range(start_proxy_round, end_proxy_round + 1, 1)]
-        previous_rounds = previous_rounds[previous_rounds.index(saved_round) + 1 :]
-        all_rounds = previous_rounds + all_rounds
-    for rounds in chunks(all_rounds, 5000):
-        rounds_data = get_price_history(token.address, rounds, chain=w3)
-        for round_id, data in rounds_data.items():
-            TokenPriceHistory.objects.get_or_create(
-                underlying_address=token.address,
-                round_id=str(round_id),
-                timestamp=data[3],
-                defaults={
-                    "underlying_symbol": token.underlying_symbol,
-                    "price": data[1] / 10 ** decimals["number"],
-                },
+        return None
+
+
+def _get_rounds_after(underlying_address, saved_round, chain):
+    """
+    Returns all proxy round ids after `saved_round`, including the rounds of any
+    phases that started since.
+    """
+    latest_phase = get_token_phase_id(underlying_address, chain=chain)["id"]
+    saved_phase = saved_round >> 64
+    rounds = []
+    for phase in range(saved_phase, latest_phase + 1):
+        aggregator = get_token_aggregator(underlying_address, phase, chain=chain)
+        latest_aggregator_round = get_latest_round(aggregator["address"], chain=chain)
+        first_round = phase << 64 | 1
+        if phase == saved_phase:
+            first_round = saved_round + 1
+        rounds.extend(range(first_round, (phase << 64 | latest_aggregator_round) + 1))
+    return rounds
+
+
+def _get_all_rounds(underlying_address, chain, first_aggregator_round=1):
+    phase = get_token_phase_id(underlying_address, chain=chain)
+    aggregator_addresses = get_token_aggregators(
+        underlying_address, phase["id"], chain=chain
+    )
+    rounds = []
+    for idx, (phase_id, phase_aggregator) in enumerate(aggregator_addresses.items()):
+        latest_aggregator_round = get_latest_round(phase_aggregator, chain=chain)
+        earliest_aggregator_round = first_aggregator_round if idx == 0 else 1
+        rounds.extend(
+            range(
+                phase_id << 64 | earliest_aggregator_round,
+                (phase_id << 64 | latest_aggregator_round) + 1,
             )
+        )
+    return rounds
 
 
-def save_exceptions_rounds(chain=None):
+def fetch_rounds(underlying_address, rounds, chain=None):
+    """
+    Fetches round data in chunks of `ROUNDS_CHUNK_SIZE` rounds. Chunks are fetched
+    concurrently, no matter which phase or aggregator they belong to, but they're
+    always yielded in order as {round_id: round_data}.
+    """
     w3 = Blockchain(_web3=chain)
-    tokens = Asset.objects.filter(
-        underlying_symbol__in=["ENS", "USDP", "sUSD", "UST", "MATIC", "CVX", "LUSD"]
+    round_chunks = list(chunks(rounds, ROUNDS_CHUNK_SIZE))
+    with ThreadPoolExecutor(max_workers=ROUNDS_FETCH_WORKERS) as executor:
+        # Only keep a few chunks in flight so we don't hold the whole history in
+        # memory when the chunks are written slower than they're fetched
+        for batch in chunks(round_chunks, ROUNDS_FETCH_WORKERS):
+            yield from executor.map(
+                lambda chunk: get_price_history(underlying_address, chunk, chain=w3),
+                batch,
+            )
+
+
+def get_eth_prices_at(timestamps):
+    """
+    Returns {timestamp: price} with the ETH price of the latest round at or before
+    each timestamp. Prices are loaded with a single range query and matched in
+    memory.
+    """
+    if not timestamps:
+        return {}
+    start, end = min(timestamps), max(timestamps)
+    eth_prices = TokenPriceHistory.objects.filter(underlying_symbol="ETH")
+    previous = (
+        eth_prices.filter(timestamp__lt=start)
+        .order_by("-timestamp")
+        .values("timestamp")[:1]
     )
-    for token in tokens:
-        try:
-            saved_round = int(
-                TokenPriceHistory.objects.filter(
-                    underlying_symbol=token.underlying_symbol
-                )
-                .latest()
-                .round_id
+    rows = list(
+        eth_prices.filter(
+            Q(timestamp__gte=start, timestamp__lte=end)
+            | Q(timestamp=Subquery(previous))
+        )
+        .order_by("timestamp")
+        .values_list("timestamp", "price")
+    )
+    price_timestamps = [row[0] for row in rows]
+
+    prices = {}
+    for timestamp in timestamps:
+        idx = bisect_right(price_timestamps, timestamp) - 1
+        if idx < 0:
+            raise TokenPriceHistory.DoesNotExist(
+                "No ETH price at or before {}".format(timestamp)
             )
-        except TokenPriceHistory.DoesNotExist:
-            backpopulate_exception_tokens_history(token, chain=w3)
-            continue
-        latest_phase = get_token_phase_id(token.address, chain=w3)
-        decimals = get_token_decimals(token.address, chain=w3)
-        aggregator = get_token_aggregator(token.address, latest_phase["id"], chain=w3)
+        prices[timestamp] = rows[idx][1]
+    return prices
 
-        latest_aggregator_round = get_latest_round(aggregator["address"])
-        latest_proxy_round = latest_phase["id"] << 64 | latest_aggregator_round
-        if saved_round == latest_proxy_round:
-            continue
-        earliest_proxy_round = latest_phase["id"] << 64 | 1
-        all_rounds = [*range(earliest_proxy_round, latest_proxy_round + 1, 1)]
-        if saved_round in all_rounds:
-            all_rounds = all_rounds[all_rounds.index(saved_round) + 1 :]
-        else:
-            previous_aggregator = get_token_aggregator(
-                token.address, latest_phase["id"] - 1, chain=w3
+
+def save_rounds(token, rounds_data, decimals, convert_to_usd=False):
+    eth_prices = {}
+    if convert_to_usd:
+        eth_prices = get_eth_prices_at({data[3] for data in rounds_data.values()})
+
+    bulk_create = []
+    for round_id, data in rounds_data.items():
+        price = data[1] / 10 ** decimals["number"]
+        if convert_to_usd:
+            price = Decimal(str(price)) * eth_prices[data[3]]
+        bulk_create.append(
+            TokenPriceHistory(
+                underlying_symbol=token.underlying_symbol,
+                price=price,
+                timestamp=data[3],
+                round_id=str(round_id),
+                underlying_address=token.address,
             )
-            previous_aggregator_round = get_latest_round(previous_aggregator["address"])
-            end_proxy_round = (latest_phase["id"] - 1) << 64 | previous_aggregator_round
-            start_proxy_round = (latest_phase["id"] - 1) << 64 | 1
-            previous_rounds = [*range(start_proxy_round, end_proxy_round + 1, 1)]
-            previous_rounds = previous_rounds[previous_rounds.index(saved_round) + 1 :]
-            all_rounds = previous_rounds + all_rounds
-        for rounds in chunks(all_rounds, 5000):
-            rounds_data = get_price_history(token.address, rounds, chain=w3)
-            for round_id, data in rounds_data.items():
-                TokenPriceHistory.objects.get_or_create(
-                    underlying_address=token.address,
-                    round_id=str(round_id),
-                    timestamp=data[3],
-                    defaults={
-                        "underlying_symbol": token.underlying_symbol,
-                        "price": data[1] / 10 ** decimals["number"],
-                    },
-                )
+        )
+    bulk_insert_models(bulk_create, ignore_conflicts=True)
 
 
-def save_remaining_rounds(chain=None):
+def sync_token_rounds(
+    token, convert_to_usd=False, first_aggregator_round=1, chain=None
+):
+    """
+    Saves all rounds of the token's chainlink feed that aren't stored yet. Rounds
+    are written with a bulk insert per fetched chunk.
+    """
     w3 = Blockchain(_web3=chain)
+    underlying_address = CHAINLINK_UNDERLYING_OVERRIDES.get(
+        token.address, token.address
+    )
+    saved_round = _get_saved_round(token)
+    if saved_round is None:
+        rounds = _get_all_rounds(
+            underlying_address, w3, first_aggregator_round=first_aggregator_round
+        )
+    else:
+        rounds = _get_rounds_after(underlying_address, saved_round, w3)
+    if not rounds:
+        return
+
+    decimals = get_token_decimals(underlying_address, chain=w3)
+    for rounds_data in fetch_rounds(underlying_address, rounds, chain=w3):
+        save_rounds(token, rounds_data, decimals, convert_to_usd=convert_to_usd)
+
+
+def save_eth_rounds(chain=None):
+    token = Asset.objects.get(underlying_symbol="ETH")
+    sync_token_rounds(token, chain=chain)
+
+
+def save_exceptions_rounds(chain=None):
+    tokens = Asset.objects.filter(underlying_symbol__in=USD_FEED_SYMBOLS)
+    for token in tokens:
+        sync_token_rounds(token, chain=chain)
+
+
+def save_remaining_rounds(chain=None):
     tokens = Asset.objects.all().exclude(
-        underlying_symbol__in=[
-            "ETH",
-            "ENS",
-            "sUSD",
-            "USDP",
-            "UST",
-            "MATIC",
-            "CVX",
-            "LUSD",
-        ]
+        underlying_symbol__in=["ETH"] + USD_FEED_SYMBOLS
     )
     for token in tokens:
         if token.address not in CHAINLINK_PROXY_ADDRESSES:
             continue
-        underlying_address = token.address
-        if underlying_address == "0xeb4c2781e4eba804ce9a9803c67d0893436bb27d":
-            underlying_address = "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599"
-        try:
-            saved_round = int(
-                TokenPriceHistory.objects.filter(
-                    underlying_symbol=token.underlying_symbol
-                )
-                .latest()
-                .round_id
-            )
-        except TokenPriceHistory.DoesNotExist:
-            backpopulate_remaining_tokens_history(token, chain=w3)
-            continue
-        latest_phase = get_token_phase_id(underlying_address, chain=w3)
-        decimals = get_token_decimals(underlying_address, chain=w3)
-        aggregator = get_token_aggregator(
-            underlying_address, latest_phase["id"], chain=w3
+        # The first rounds of ETH denominated feeds are older than the ETH price
+        # history we have, so we skip them
+        sync_token_rounds(
+            token, convert_to_usd=True, first_aggregator_round=40, chain=chain
         )
 
-        latest_aggregator_round = get_latest_round(aggregator["address"])
-        latest_proxy_round = latest_phase["id"] << 64 | latest_aggregator_round
-        if saved_round == latest_proxy_round:
-            all_rounds = [saved_round]
-        else:
-            earliest_proxy_round = latest_phase["id"] << 64 | 1
-            all_rounds = [*range(earliest_proxy_round, latest_proxy_round + 1, 1)]
-            if saved_round in all_rounds:
-                all_rounds = all_rounds[all_rounds.index(saved_round) + 1 :]
-            else:
-                previous_aggregator = get_token_aggregator(
-                    underlying_address, latest_phase["id"] - 1, chain=w3
-                )
-                previous_aggregator_round = get_latest_round(
-                    previous_aggregator["address"]
-                )
-                end_proxy_round = (
-                    latest_phase["id"] - 1
-                ) << 64 | previous_aggregator_round
-                start_proxy_round = (latest_phase["id"] - 1) << 64 | 1
-                previous_rounds = [*range(start_proxy_round, end_proxy_round + 1, 1)]
-                previous_rounds = previous_rounds[
-                    previous_rounds.index(saved_round) + 1 :
-                ]
-                all_rounds = previous_rounds + all_rounds
-        for rounds in chunks(all_rounds, 5000):
-            rounds_data = get_price_history(underlying_address, rounds, chain=w3)
-            for round_id, data in rounds_data.items():
-                price_in_eth = data[1] / 10 ** decimals["number"]
-                eth_price = (
-                    TokenPriceHistory.objects.filter(underlying_symbol="ETH")
-                    .latest()
-                    .price
-                )
-                price_in_usd = Decimal(str(price_in_eth)) * eth_price
-
-                TokenPriceHistory.objects.update_or_create(
-                    underlying_address=token.address,
-                    round_id=str(round_id),
-                    timestamp=data[3],
-                    defaults={
-                        "underlying_symbol": token.underlying_symbol,
-                        "price": price_in_usd,
-                    },
-                )
-
 
 def backpopulate_exception_tokens_history(token, chain=None):
-    w3 = Blockchain(_web3=chain)
-    bulk_create = []
-    latest_phase = get_token_phase_id(token.address, chain=w3)
-    decimals = get_token_decimals(token.address, chain=w3)
-    aggregator_addresses = get_token_aggregators(
-        token.address, latest_phase["id"], chain=w3
-    )
-
-    for phase, phase_aggregator in aggregator_addresses.items():
-        latest_aggregator_round = get_latest_round(phase_aggregator)
-        latest_proxy_round = phase << 64 | latest_aggregator_round
-        earliest_proxy_round = phase << 64 | 1
-        all_rounds = [*range(earliest_proxy_round, latest_proxy_round + 1, 1)]
-        for rounds in chunks(all_rounds, 5000):
-            rounds_data = get_price_history(token.address, rounds, chain=w3)
-            for round_id, data in rounds_data.items():
-                bulk_create.append(
-                    TokenPriceHistory(
-                        underlying_symbol=token.underlying_symbol,
-                        price=data[1] / 10 ** decimals["number"],
-                        timestamp=data[3],
-                        round_id=str(round_id),
-                        underlying_address=token.address,
-                    )
-                )
-    bulk_insert_models(bulk_create, ignore_conflicts=True)
+    sync_token_rounds(token, chain=chain)
 
 
 def backpopulate_remaining_tokens_history(token, chain=None):
-    w3 = Blockchain(_web3=chain)
-    bulk_create = []
-    underlying_address = token.address
-    if underlying_address == "0xeb4c2781e4eba804ce9a9803c67d0893436bb27d":
-        underlying_address = "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599"
-    phase = get_token_phase_id(underlying_address, chain=w3)
-    decimals = get_token_decimals(underlying_address, chain=w3)
-    aggregator_addresses = get_token_aggregators(
-        underlying_address, phase["id"], chain=w3
+    sync_token_rounds(
+        token, convert_to_usd=True, first_aggregator_round=40, chain=chain
     )
 
-    for phase_id, phase_aggregator in aggregator_addresses.items():
-        latest_aggregator_round = get_latest_round(phase_aggregator)
-        latest_proxy_round = phase_id << 64 | latest_aggregator_round
-        earliest_proxy_round = phase_id << 64 | 1
-        if phase_aggregator == list(aggregator_addresses.values())[0]:
-            earliest_proxy_round = phase_id << 64 | 40
-        all_rounds = [*range(earliest_proxy_round, latest_proxy_round + 1, 1)]
-        for rounds in chunks(all_rounds, 5000):
-            rounds_data = get_price_history(underlying_address, rounds, chain=w3)
-            for round_id, data in rounds_data.items():
-                price_in_eth = data[1] / 10 ** decimals["number"]
-                eth_price = (
-                    TokenPriceHistory.objects.filter(
-                        underlying_symbol="ETH", timestamp__lte=data[3]
-                    )
-                    .latest()
-                    .price
-                )
-                price_in_usd = Decimal(str(price_in_eth)) * eth_price
-                bulk_create.append(
-                    TokenPriceHistory(
-                        underlying_symbol=token.underlying_symbol,
-                        price=price_in_usd,
-                        timestamp=data[3],
-                        round_id=str(round_id),
-                        underlying_address=token.address,
-                    )
-                )
-    bulk_insert_models(bulk_create, ignore_conflicts=True)
-
 
 def populate_eth_price_history(chain=None):
-    w3 = Blockchain(_web3=chain)
-    bulk_create = []
     token = Asset.objects.get(underlying_symbol="ETH")
-    latest_phase = get_token_phase_id(token.address, chain=w3)
-    decimals = get_token_decimals(token.address, chain=w3)
-    aggregator_addresses = get_token_aggregators(
-        token.address, latest_phase["id"], chain=w3
-    )
-    for phase, phase_aggregator in aggregator_addresses.items():
-        latest_aggregator_round = get_latest_round(phase_aggregator)
-        latest_proxy_round = phase << 64 | latest_aggregator_round
-        earliest_proxy_round = phase << 64 | 1
-        all_rounds = [*range(earliest_proxy_round, latest_proxy_round + 1, 1)]
-        for rounds in chunks(all_rounds, 2500):
-            rounds_data = get_price_history(token.address, rounds, chain=w3)
-            for round_id, data in rounds_data.items():
-                bulk_create.append(
-                    TokenPriceHistory(
-                        underlying_symbol=token.underlying_symbol,
-                        price=data[1] / 10 ** decimals["number"],
-                        timestamp=data[3],
-                        round_id=str(round_id),
-                        underlying_address=token.address,
-                    )
-                )
-    bulk_insert_models(bulk_create, ignore_conflicts=True)
+    sync_token_rounds(token, chain=chain)
 
 
 def get_token_decimals(underlying_address, chain=None):
@@ -4,119 +4,252 @@
 
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from json import JSONDecodeError
 
 from django.conf import settings
+from django.core.cache import cache
 
-from maker.utils.http import retry_get_json
+from maker.utils.http import requests_retry_session, retry_get_json
+from maker.utils.metrics import increment
+from maker.utils.rate_limit import RedisTokenBucket
 from maker.utils.utils import get_date_timestamp_eod
 
 log = logging.getLogger(__name__)
 
+CRYPTOCOMPARE_API_URL = "https://min-api.cryptocompare.com/data"
+
+HISTORY_PAGE_LIMIT = 2000
+# Candle length in seconds for each history endpoint. Pages of the endpoints
+# listed here can be computed in advance and fetched concurrently.
+HISTORY_INTERVALS = {
+    "histoday": 60 * 60 * 24,
+    "histohour": 60 * 60,
+    "histominute": 60,
+}
+HISTORY_FETCH_WORKERS = 4
+HISTORY_CACHE_TIMEOUT = 60 * 60 * 24
 
-def fetch_history_data(
-    symbol, pair_symbol, exchange, ts, limit=2000, ohlcv_type="histoday"
-):
-    params = {
-        "fsym": symbol,
-        "tsym": pair_symbol,
-        "limit": limit,
-        "toTs": int(ts) if ts is not None else None,
-    }
-    url = f"https://min-api.cryptocompare.com/data/v2/{ohlcv_type}"
-    if exchange == "N/A":
-        params["tryConversion"] = "true"
-    else:
-        params["tryConversion"] = "false"
-        params["e"] = exchange
-    headers = {"authorization": f"Apikey {settings.CRYPTOCOMPARE_API_KEY}"}
-
-    retries = 1
-    while retries < 6:
-        try:
-            content = retry_get_json(url, params=params, headers=headers)
-        except JSONDecodeError:
-            log.error("Could not fetch_history_data")
-
-        if content["Response"] == "Error" and not content["Data"]:
-            time.sleep(retries * 2)
-            retries += 1
-        else:
-            break
 
-    if content["Response"] == "Error" and (
-        content.get("ParamWithError") == "e"
-        or content.get("ParamWithError") == "toTs"
-        or not content["Data"]
+class CryptoCompareClient:
+    """
+    CryptoCompare API client. All requests go through a token bucket shared by all
+    workers, so concurrent tasks stay within the API rate limit. History pages of
+    closed candles never change, so they're cached.
+    """
+
+    def __init__(self, api_key=None, rate_limiter=None, workers=HISTORY_FETCH_WORKERS):
+        self.api_key = api_key or settings.CRYPTOCOMPARE_API_KEY
+        self.rate_limiter = rate_limiter or RedisTokenBucket(
+            "cryptocompare", settings.CRYPTOCOMPARE_RATE_LIMIT
+        )
+        self.workers = workers
+        self.session = requests_retry_session()
+
+    def get_json(self, path, params=None):
+        self.rate_limiter.acquire()
+        increment("cryptocompare.requests")
+        return retry_get_json(
+            "{}/{}".format(CRYPTOCOMPARE_API_URL, path),
+            params=params,
+            headers={"authorization": f"Apikey {self.api_key}"},
+            session=self.session,
+        )
+
+    def _history_cache_key(self, symbol, pair_symbol, exchange, ts, limit, ohlcv_type):
+        interval = HISTORY_INTERVALS.get(ohlcv_type)
+        # Only cache pages where all the candles are already closed
+        if ts is None or not interval or ts + interval > time.time():
+            return None
+        return "cryptocompare.{}.{}.{}.{}.{}.{}".format(
+            ohlcv_type, symbol, pair_symbol, exchange, int(ts), limit
+        )
+
+    def fetch_history_data(
+        self, symbol, pair_symbol, exchange, ts, limit=2000, ohlcv_type="histoday"
+    ):
+        cache_key = self._history_cache_key(
+            symbol, pair_symbol, exchange, ts, limit, ohlcv_type
+        )
+        if cache_key:
+            content = cache.get(cache_key)
+            if content is not None:
+                increment("cryptocompare.cache_hit")
+                return content
+
+        params = {
+            "fsym": symbol,
+            "tsym": pair_symbol,
+            "limit": limit,
+            "toTs": int(ts) if ts is not None else None,
+        }
+        if exchange == "N/A":
+            params["tryConversion"] = "true"
+        else:
+            params["tryConversion"] = "false"
+            params["e"] = exchange
+
+        retries = 1
+        while retries < 6:
+            try:
+                content = self.get_json(ohlcv_type, params=params)
+            except JSONDecodeError:
+                log.error("Could not fetch_history_data")
+
+            if content["Response"] == "Error" and not content["Data"]:
+                time.sleep(retries * 2)
+                retries += 1
+            else:
+                break
+
+        if content["Response"] == "Error" and (
+            content.get("ParamWithError") == "e"
+            or content.get("ParamWithError") == "toTs"
+            or not content["Data"]
+        ):
+            return None
+
+        if cache_key:
+            cache.set(cache_key, content, HISTORY_CACHE_TIMEOUT)
+        return content
+
+    def _iter_history_pages(
+        self, symbol, pair_symbol, exchange, ts, from_timestamp, ohlcv_type
+    ):
+        interval = HISTORY_INTERVALS.get(ohlcv_type)
+        if not interval:
+            # Page boundaries aren't known, so follow TimeFrom of each response
+            to_timestamp = ts
+            while True:
+                response = self.fetch_history_data(
+                    symbol,
+                    pair_symbol,
+                    exchange,
+                    to_timestamp,
+                    limit=HISTORY_PAGE_LIMIT,
+                    ohlcv_type=ohlcv_type,
+                )
+                yield response
+                if not response or not response["Data"]["Data"]:
+                    return
+                to_timestamp = response["Data"]["TimeFrom"] - 1
+
+        # Each page ends with the candle containing toTs and starts `limit` candles
+        # before it
+        to_timestamps = []
+        to_timestamp = ts
+        while True:
+            to_timestamps.append(to_timestamp)
+            time_from = (
+                to_timestamp // interval * interval - HISTORY_PAGE_LIMIT * interval
+            )
+            if from_timestamp > time_from:
+                break
+            to_timestamp = time_from - 1
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(
+                lambda to_timestamp: self.fetch_history_data(
+                    symbol,
+                    pair_symbol,
+                    exchange,
+                    to_timestamp,
+                    limit=HISTORY_PAGE_LIMIT,
+                    ohlcv_type=ohlcv_type,
+                ),
+                to_timestamps,
+            )
+
+    def fetch_full_history(
+        self,
+        symbol,
+        pair_symbol,
+        exchange,
+        ts=None,
+        ohlcv_type="histoday",
+        number_of_days=90,
     ):
-        return None
+        """
+        Returns a history between ts and ts + number_of_days.
+
+        :param ts: timestamp up to which the records will be returned
+        :param number_of_days: 0 returns today's data, 1 returns yesterday's data and
+        so on
+        """
+        all_data = []
+        if not ts:
+            yesterday = date.today() - timedelta(days=1)
+            ts = get_date_timestamp_eod(yesterday)
+
+        from_timestamp = ts - 60 * 60 * 24 * number_of_days
+        pages = self._iter_history_pages(
+            symbol, pair_symbol, exchange, ts, from_timestamp, ohlcv_type
+        )
+        for response in pages:
+            if not response:
+                break
+
+            data = response["Data"]["Data"]
+            if not data:
+                break
+
+            ts = response["Data"]["TimeFrom"]
+            if from_timestamp > ts:
+                # Attach last few rows unill the time exceeds the from_timestamp
+                rows = [row for row in data if row["time"] > from_timestamp]
+                all_data = rows + all_data
+                break
+            else:
+                # add data to the start as it's returned time ascending
+                all_data = data + all_data
+
+        return all_data
+
+    def get_prices(self, symbols):
+        return self.get_json(
+            "pricemulti", params={"fsyms": ",".join(symbols), "tsyms": "USD"}
+        )
+
+    def fetch_pair_mapping(self, symbol):
+        content = self.get_json("pair/mapping/fsym", params={"fsym": symbol})
+        return content["Data"]
+
+
+_client = None
 
-    return content
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = CryptoCompareClient()
+    return _client
+
+
+def fetch_history_data(
+    symbol, pair_symbol, exchange, ts, limit=2000, ohlcv_type="histoday"
+):
+    return get_client().fetch_history_data(
+        symbol, pair_symbol, exchange, ts, limit=limit, ohlcv_type=ohlcv_type
+    )
 
 
 def get_prices(symbols):
-    symbol_string = ",".join(symbols)
-    url = f"https://min-api.cryptocompare.com/data/pricemulti?fsyms={symbol_string}&tsyms=USD"
-    headers = {"authorization": f"Apikey {settings.CRYPTOCOMPARE_API_KEY}"}
-    content = retry_get_json(url, headers=headers)
-    return content
+    return get_client().get_prices(symbols)
 
 
 def fetch_pair_mapping(symbol):
-    url = "https://min-api.cryptocompare.com/data/pair/mapping/fsym"
-    params = {"fsym": symbol}
-    headers = {"authorization": f"Apikey {settings.CRYPTOCOMPARE_API_KEY}"}
-    content = retry_get_json(url, params=params, headers=headers)
-    data = content["Data"]
-    return data
+    return get_client().fetch_pair_mapping(symbol)
 
 
 def fetch_full_history(
     symbol, pair_symbol, exchange, ts=None, ohlcv_type="histoday", number_of_days=90
 ):
-    """
-    Returns a history between ts and ts + number_of_days.
-
-    :param ts: timestamp up to which the records will be returned
-    :param number_of_days: 0 returns today's data, 1 returns yesterday's data and so on
-    """
-    all_data = []
-    if not ts:
-        yesterday = date.today() - timedelta(days=1)
-        ts = get_date_timestamp_eod(yesterday)
-
-    from_timestamp = ts - 60 * 60 * 24 * number_of_days
-    to_timestamp = ts
-    while True:
-        response = fetch_history_data(
-            symbol,
-            pair_symbol,
-            exchange,
-            to_timestamp,
-            limit=2000,
-            ohlcv_type=ohlcv_type,
-        )
-        if not response:
-            break
-
-        data = response["Data"]["Data"]
-        if not data:
-            break
-
-        ts = response["Data"]["TimeFrom"]
-        # Endpont returns the time including the to_timestamp time, so we substract 1
-        # so it doesn't return the time that was included in the previous response
-        to_timestamp = ts - 1
-
-        if from_timestamp > ts:
-            # Attach last few rows unill the time exceeds the from_timestamp
-            for row in data:
-                if row["time"] > from_timestamp:
-                    all_data.append(row)
-            break
-        else:
-            # add data to the start as it's returned time ascending
-            all_data = data + all_data
-
-    return all_data
+    return get_client().fetch_full_history(
+        symbol,
+        pair_symbol,
+        exchange,
+        ts=ts,
+        ohlcv_type=ohlcv_type,
+        number_of_days=number_of_days,
+    )
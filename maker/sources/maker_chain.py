@@ -10,7 +10,7 @@ from web3 import Web3
 
 from maker.constants import MCD_JUG_CONTRACT_ADDRESS, MCD_SPOT_CONTRACT_ADDRESS
 from maker.models import Ilk, IlkHistoricParams
-from maker.modules.block import get_or_save_block
+from maker.modules.block import get_block_timestamps
 from maker.utils.blockchain.chain import Blockchain
 
 
@@ -51,18 +51,20 @@ def sync_lr_for_ilk():
         # Increase position by 1 to get to the `mat` field aka liquidation ratio
         position = hex(int(position, 16) + 1)
 
+        # Params only change a few times a year, so interpolated timestamps are
+        # precise enough and save fetching every block from the node
+        timestamps = get_block_timestamps(block_numbers, chain=chain, estimate=True)
         for block_number in sorted(block_numbers):
             storage = chain.get_storage_at(
                 MCD_SPOT_CONTRACT_ADDRESS, position, block_identifier=block_number
             )
             lr = int(Decimal(int(storage, 16)) / 10**27 * 100)
-            block = get_or_save_block(block_number)
             bulk_create.append(
                 IlkHistoricParams(
                     ilk=ilk.ilk,
                     type="lr",
                     block_number=block_number,
-                    timestamp=block.timestamp,
+                    timestamp=timestamps[block_number],
                     lr=lr,
                 )
             )
@@ -107,6 +109,8 @@ def sync_stability_fee_for_ilk():
         index = "0000000000000000000000000000000000000000000000000000000000000001"
         position = Web3.keccak(hexstr=key + index).hex()
 
+        # Same as for liquidation ratios, estimated timestamps are good enough
+        timestamps = get_block_timestamps(block_numbers, chain=chain, estimate=True)
         for block_number in sorted(block_numbers):
             storage = chain.get_storage_at(
                 MCD_JUG_CONTRACT_ADDRESS, position, block_identifier=block_number
@@ -114,12 +118,11 @@ def sync_stability_fee_for_ilk():
             fee = Decimal(int(storage, 16)) / 10**27
             fee = fee ** (60 * 60 * 24 * 365) - 1
 
-            block = get_or_save_block(block_number)
             bulk_create.append(
                 IlkHistoricParams(
                     ilk=ilk.ilk,
                     block_number=block_number,
-                    timestamp=block.timestamp,
+                    timestamp=timestamps[block_number],
                     type="stability_fee",
                     stability_fee=fee,
                 )
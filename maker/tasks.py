@@ -7,18 +7,29 @@ from datetime import date, datetime, timedelta
 from decimal import Decimal
 
 from celery.schedules import crontab
+from django.db.models import Max
 from django_bulk_load import bulk_update_models
 
 from maker.modules.balances import sync_save_protocols, sync_wallet_balances
 
 from .celery import app
-from .constants import DRAWDOWN_PAIRS_HISTORY_DAYS, OHLCV_TYPE_DAILY, OHLCV_TYPE_HOURLY
+from .constants import (
+    DATASET_ILKS,
+    DATASET_OHLCV,
+    DATASET_OSM,
+    DATASET_RISK_PREMIUM,
+    DATASET_VAULTS,
+    DRAWDOWN_PAIRS_HISTORY_DAYS,
+    OHLCV_TYPE_DAILY,
+    OHLCV_TYPE_HOURLY,
+)
 from .models import (
     OSM,
     Asset,
     GasPrice,
     Ilk,
     IlkHistoricStats,
+    IngestionChunk,
     MakerAsset,
     Medianizer,
     OHLCVPair,
@@ -31,15 +42,23 @@ from .modules.asset import get_asset_total_supplies, save_assets_systemic_risk
 from .modules.auctions import sync_auctions
 from .modules.block import save_latest_blocks
 from .modules.d3m import aave, compound, spark
+from .modules.d3m.d3m import refresh_market_states
 from .modules.dai_growth import (
     sync_dai_supply_growth_periodical,
     sync_monthly_dai_supply,
 )
-from .modules.dai_trades import DAITradesFetcher
+from .modules.dai_trades import DAITradesFetcher, rebuild_dai_trade_minutes
 from .modules.defi import fetch_defi_balance, save_rates_for_protocols
+from .modules.drawdowns import update_drawdown_histograms
 from .modules.events import save_urn_event_states
 from .modules.ilk import save_stats_for_vault
 from .modules.ilks import create_or_update_vaults, save_ilks
+from .modules.ingestion import (
+    DEFAULT_CHUNK_SIZE,
+    get_runnable_chunk_ids,
+    plan_chunks,
+    process_chunk,
+)
 from .modules.liquidations import (
     save_maker_liquidations,
     save_vaults_liquidation_snapshot,
@@ -47,11 +66,18 @@ from .modules.liquidations import (
 from .modules.liquidity_score import calculate_liquidity_score_for_all_assets
 from .modules.ohlcv import (
     calculate_volatility,
+    get_ohlcv_pairs_sync_order,
+    save_volatility_history,
     save_yesterdays_histominute_ohlcv,
     sync_history_for_ohlcv_pair,
     sync_ohlcv_asset_pairs,
 )
-from .modules.osm import save_medianizer_prices, save_osm_daily, save_osm_for_asset
+from .modules.osm import (
+    save_medianizer_prices,
+    save_medianizer_prices_for_assets,
+    save_osm_daily,
+    save_osm_for_asset,
+)
 from .modules.pool import save_pool_info
 from .modules.psm import claculate_and_save_psm_dai_supply
 from .modules.risk import save_overall_stats, save_surplus_buffer
@@ -65,6 +91,7 @@ from .modules.vaults_at_risk import (
 )
 from .sources.blocknative import fetch_gas_prices
 from .sources.maker_chain import sync_lr_for_ilk, sync_stability_fee_for_ilk
+from .utils.cache import bump_dataset_version, revalidate_response
 from .utils.utils import yesterday_date
 
 log = logging.getLogger(__name__)
@@ -134,6 +161,15 @@ SCHEDULE = {
     "sync_ohlcv_task": {
         "schedule": crontab(minute="15", hour="0"),
     },
+    "resume_ingestion_chunks_task": {
+        "schedule": crontab(minute="*/15"),
+    },
+    "update_drawdown_histograms_task": {
+        "schedule": crontab(minute="30", hour="1"),
+    },
+    "refresh_d3m_market_states_task": {
+        "schedule": crontab(minute="*/1"),
+    },
     # "save_osm_daily_task": {
     #     "schedule": crontab(minute="15", hour="0"),
     # },
@@ -181,6 +217,8 @@ SCHEDULE = {
 @app.task
 def sync_ilk_vaults_task(ilk):
     create_or_update_vaults(ilk)
+    bump_dataset_version(DATASET_VAULTS)
+    bump_dataset_version(DATASET_ILKS)
 
 
 @app.task
@@ -210,23 +248,52 @@ def save_osm_for_asset_task(symbol):
             return
     save_osm_for_asset(symbol)
     refresh_vaults_at_risk(symbol)
+    bump_dataset_version(DATASET_OSM)
+    bump_dataset_version(DATASET_VAULTS)
 
 
 @app.task
 def save_medianizer_prices_task(symbol, medianizer_address, from_block):
     save_medianizer_prices(symbol, medianizer_address, from_block=from_block)
+    bump_dataset_version(DATASET_OSM)
+
+
+# Datasets whose cached responses change when a chunk of the stream gets ingested
+INGESTION_STREAM_DATASETS = {
+    "osm": (DATASET_OSM,),
+    "medianizer": (DATASET_OSM,),
+    "urn_event_states": (DATASET_OSM, DATASET_VAULTS),
+}
+
+
+@app.task
+def process_ingestion_chunk_task(chunk_id):
+    if not process_chunk(chunk_id):
+        return
+    stream = IngestionChunk.objects.values_list("stream", flat=True).get(id=chunk_id)
+    for dataset in INGESTION_STREAM_DATASETS.get(stream, ()):
+        bump_dataset_version(dataset)
+
+
+@app.task
+def backfill_task(stream, from_block, to_block, key="", chunk_size=DEFAULT_CHUNK_SIZE):
+    plan_chunks(stream, from_block, to_block, key=key, chunk_size=chunk_size)
+    for chunk_id in get_runnable_chunk_ids(stream=stream, key=key):
+        process_ingestion_chunk_task.delay(chunk_id)
 
 
 @app.task
 def sync_ilk_params_task():
     sync_lr_for_ilk()
     sync_stability_fee_for_ilk()
+    bump_dataset_version(DATASET_ILKS)
 
 
 @app.task
 def sync_history_for_ohlcv_pair_task(pair_id):
     pair = OHLCVPair.objects.get(id=pair_id)
     sync_history_for_ohlcv_pair(pair)
+    bump_dataset_version(DATASET_OHLCV)
 
 
 @app.task()
@@ -270,6 +337,7 @@ def save_backed_assets_task():
 @app.task
 def sync_ilks_task():
     save_ilks()
+    bump_dataset_version(DATASET_ILKS)
 
 
 @app.task
@@ -286,6 +354,11 @@ def sync_d3m_task():
     save_overall_stats()
 
 
+@app.task
+def refresh_d3m_market_states_task():
+    refresh_market_states()
+
+
 @app.task
 def check_to_sync_vaults():
     # block_number = get_last_block_for_vaults()
@@ -318,24 +391,27 @@ def sync_osm_task():
 
 @app.task
 def sync_medianizer_prices_task():
-    assets = MakerAsset.objects.filter(
-        is_active=True, medianizer_address__isnull=False, type="asset"
+    assets = list(
+        MakerAsset.objects.filter(
+            is_active=True, medianizer_address__isnull=False, type="asset"
+        )
     )
-    for asset in assets:
-        try:
-            latest_block_number = (
-                Medianizer.objects.filter(symbol=asset.symbol).latest().block_number
-            )
-        except Medianizer.DoesNotExist:
-            latest_block_number = 8936795
-
-        save_medianizer_prices_task.apply_async(
-            args=(
-                asset.symbol,
-                asset.medianizer_address,
-                latest_block_number,
-            )
+    latest_blocks = dict(
+        Medianizer.objects.filter(symbol__in=[asset.symbol for asset in assets])
+        .values("symbol")
+        .annotate(block_number=Max("block_number"))
+        .values_list("symbol", "block_number")
+    )
+    from_blocks = {
+        asset.symbol: IngestionChunk.objects.resume_block(
+            "medianizer", latest_blocks.get(asset.symbol, 8936794), key=asset.symbol
         )
+        + 1
+        for asset in assets
+    }
+    # All assets are synced together so they share the log scan and batched reads
+    save_medianizer_prices_for_assets(assets, from_blocks)
+    bump_dataset_version(DATASET_OSM)
 
 
 @app.task
@@ -353,12 +429,15 @@ def save_ilk_stats_task():
             total_debt=ilk.dai_debt,
             dc_iam_line=ilk.dc_iam_line,
         )
+    bump_dataset_version(DATASET_ILKS)
 
 
 @app.task
 def compute_risk_premiums_task():
     save_protection_score()
     compute_all_vault_types()
+    bump_dataset_version(DATASET_RISK_PREMIUM)
+    bump_dataset_version(DATASET_ILKS)
 
 
 @app.task
@@ -387,14 +466,19 @@ def sync_monthly_dai_supply_task():
 
 
 @app.task
-def sync_dai_trades_from_stablecoin_science_task(days=30):
-    # We're running this task on compute because it'll take ~120mb of RAM and we don't
-    # want the container to crash.
+def sync_dai_trades_from_stablecoin_science_task(days=30, incremental=True):
+    # The CSV is processed in chunks of DAI_TRADES_CHUNK_SIZE rows, so memory usage
+    # doesn't grow with the size of the file.
     fetcher = DAITradesFetcher()
-    fetcher.fetch(days=days)
+    fetcher.fetch(days=days, incremental=incremental)
     del fetcher
 
 
+@app.task
+def rebuild_dai_trade_minutes_task():
+    rebuild_dai_trade_minutes()
+
+
 @app.task
 def sync_ohlcv_asset_pairs_task():
     assets = MakerAsset.objects.filter(type="asset", is_active=True)
@@ -405,6 +489,14 @@ def sync_ohlcv_asset_pairs_task():
 @app.task
 def save_osm_daily_task():
     save_osm_daily()
+    bump_dataset_version(DATASET_OSM)
+
+
+@app.task
+def update_drawdown_histograms_task(full=False):
+    update_drawdown_histograms(full=full)
+    bump_dataset_version(DATASET_OHLCV)
+    bump_dataset_version(DATASET_OSM)
 
 
 @app.task()
@@ -457,18 +549,23 @@ def sync_chainlink_rounds_task():
 
 @app.task
 def sync_ohlcv_task():
-    pairs = OHLCVPair.objects.filter(is_active=True).values("id", "to_asset_symbol")
-    # Make sure to first update pairs to USD symbol, as that's then used in the
-    # underlying calculations for OHLCV. The code handles it correctly if it's not in
-    # the correct order, but it can cause exceptions because of concurrent running
-    # of different pairs.
-    sorted_pairs = sorted(
-        pairs,
-        key=lambda p: "ZZZ" if p["to_asset_symbol"] == "USD" else p["to_asset_symbol"],
-        reverse=True,
-    )
-    for pair in sorted_pairs:
-        sync_history_for_ohlcv_pair_task.delay(pair["id"])
+    pairs = OHLCVPair.objects.filter(is_active=True)
+    independent_pair_ids, groups = get_ohlcv_pairs_sync_order(pairs)
+    for pair_id in independent_pair_ids:
+        sync_history_for_ohlcv_pair_task.delay(pair_id)
+    for conversion_pair_ids, dependent_pair_ids in groups:
+        sync_dependent_ohlcv_pairs_task.delay(conversion_pair_ids, dependent_pair_ids)
+
+
+@app.task
+def sync_dependent_ohlcv_pairs_task(conversion_pair_ids, dependent_pair_ids):
+    # Pairs converting the quote asset to USD are synced first, as the USD volume of
+    # the dependent pairs is calculated from them
+    for pair in OHLCVPair.objects.filter(id__in=conversion_pair_ids):
+        sync_history_for_ohlcv_pair(pair)
+    bump_dataset_version(DATASET_OHLCV)
+    for pair_id in dependent_pair_ids:
+        sync_history_for_ohlcv_pair_task.delay(pair_id)
 
 
 @app.task
@@ -489,19 +586,23 @@ def save_yesterdays_histominute_ohlcv_for_drawdown_pairs():
         )
 
 
-@app.task
-def sync_volatility_task():
+def _get_volatility_pairs():
     for key in list(DRAWDOWN_PAIRS_HISTORY_DAYS.keys()):
         from_asset_symbol, to_asset_symbol, exchange, ohlcv_type = key.split("-")
         if ohlcv_type != OHLCV_TYPE_HOURLY:
             continue
 
-        pair = OHLCVPair.objects.get(
+        yield OHLCVPair.objects.get(
             from_asset_symbol=from_asset_symbol,
             to_asset_symbol=to_asset_symbol,
             exchange=exchange,
             ohlcv_type=OHLCV_TYPE_HOURLY,
         )
+
+
+@app.task
+def sync_volatility_task():
+    for pair in _get_volatility_pairs():
         for_date = date.today() - timedelta(days=1)
 
         volatility = calculate_volatility(pair, for_date=for_date)
@@ -509,6 +610,17 @@ def sync_volatility_task():
             continue
 
         Volatility.objects.create(pair=pair, date=for_date, volatility=volatility)
+    bump_dataset_version(DATASET_OHLCV)
+
+
+@app.task
+def backfill_volatility_task(days=90):
+    """Saves missing volatility of the last `days` days up to yesterday"""
+    end_date = date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=days - 1)
+    for pair in _get_volatility_pairs():
+        save_volatility_history(pair, start_date, end_date)
+    bump_dataset_version(DATASET_OHLCV)
 
 
 @app.task
@@ -517,6 +629,13 @@ def sync_pools_task():
         sync_pool_task.delay(pool.id)
 
 
+@app.task
+def resume_ingestion_chunks_task():
+    """Re-queues chunks that failed or were left behind by a crashed worker"""
+    for chunk_id in get_runnable_chunk_ids():
+        process_ingestion_chunk_task.delay(chunk_id)
+
+
 @app.task
 def save_latest_blocks_task():
     save_latest_blocks()
@@ -533,6 +652,7 @@ def update_vaults_market_price():
         "symbol", flat=True
     ):
         refresh_market_risk_for_vaults(symbol)
+    bump_dataset_version(DATASET_VAULTS)
 
 
 @app.task
@@ -543,3 +663,8 @@ def sync_debank_balances_task():
 @app.task(time_limit=45 * 60)
 def sync_save_protocols_task():
     sync_save_protocols()
+
+
+@app.task
+def revalidate_response_task(view_path, url, query, view_kwargs):
+    revalidate_response(view_path, url, query, view_kwargs)
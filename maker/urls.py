@@ -36,6 +36,7 @@ from .views.auctions import (
 from .views.d3m import (
     D3MComputeView,
     D3MDaiBorrowCurveView,
+    D3MHeatmapView,
     D3MHistoricRatesView,
     D3MsView,
     D3MView,
@@ -314,6 +315,11 @@ urlpatterns = [
         D3MComputeView.as_view(),
         name="d3m-protocol-compute",
     ),
+    path(
+        "d3ms/<str:protocol>/heatmap/",
+        D3MHeatmapView.as_view(),
+        name="d3m-protocol-heatmap",
+    ),
     path(
         "d3ms/<str:protocol>/rates/",
         D3MHistoricRatesView.as_view(),
@@ -4,6 +4,7 @@
 
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
 import requests
@@ -14,9 +15,12 @@ from requests.packages.urllib3.util.retry import Retry
 from web3 import Web3
 
 from maker.utils.metrics import auto_named_statsd_timer
+from maker.utils.utils import chunks
 
 log = logging.getLogger(__name__)
 
+BATCH_REQUEST_SIZE = 100
+
 
 class Blockchain:
     def __init__(self, node=settings.ETH_NODE, _web3=None, *args, **kwargs):
@@ -27,10 +31,11 @@ class Blockchain:
         else:
             self._web3 = _web3
         self._abis = {}
+        self._session = None
 
     @property
-    def web3(self):
-        if not self._web3:
+    def session(self):
+        if not self._session:
             session = requests.Session()
             retries = 3
             retry = Retry(
@@ -44,10 +49,17 @@ class Blockchain:
             adapter = HTTPAdapter(max_retries=retry)
             session.mount("http://", adapter)
             session.mount("https://", adapter)
+            self._session = session
+        return self._session
 
+    @property
+    def web3(self):
+        if not self._web3:
             self._web3 = Web3(
                 Web3.HTTPProvider(
-                    self._node_address, request_kwargs={"timeout": 60}, session=session
+                    self._node_address,
+                    request_kwargs={"timeout": 60},
+                    session=self.session,
                 )
             )
         return self._web3
@@ -134,6 +146,85 @@ class Blockchain:
         ).hex()
         return content
 
+    @auto_named_statsd_timer
+    def batch_request(self, calls, batch_size=BATCH_REQUEST_SIZE):
+        """
+        Sends (method, params) calls to the node as JSON-RPC batch requests and
+        returns their results in the same order as the calls.
+        """
+        results = []
+        for batch in chunks(calls, batch_size):
+            payload = [
+                {"jsonrpc": "2.0", "id": idx, "method": method, "params": params}
+                for idx, (method, params) in enumerate(batch)
+            ]
+            response = self.session.post(self._node_address, json=payload, timeout=60)
+            response.raise_for_status()
+            # Responses to a batch request can come back in any order
+            responses = {item["id"]: item for item in response.json()}
+            for idx in range(len(batch)):
+                item = responses[idx]
+                if "error" in item:
+                    raise ValueError(item["error"])
+                results.append(item["result"])
+        return results
+
+    def get_storage_at_batch(self, reads):
+        """
+        Helper function to get stored data for many (address, position, block_number)
+        reads with batched requests. Returns {(address, position, block_number): hex}.
+        """
+        calls = [
+            (
+                "eth_getStorageAt",
+                [Web3.toChecksumAddress(address), hex(position), hex(block_number)],
+            )
+            for address, position, block_number in reads
+        ]
+        results = self.batch_request(calls)
+        # Pad the value to the full 32 bytes so it has the same shape as values
+        # returned by `get_storage_at`
+        return {
+            read: "0x" + result[2:].zfill(64) for read, result in zip(reads, results)
+        }
+
+    def get_storage_at_many(self, address, positions, block_numbers):
+        """
+        Helper function to get stored data from contract for every position on every
+        block with batched requests. Returns {(block_number, position): hex_value}.
+        """
+        reads = [
+            (address, position, block_number)
+            for block_number in block_numbers
+            for position in positions
+        ]
+        return {
+            (block_number, position): value
+            for (_, position, block_number), value in self.get_storage_at_batch(
+                reads
+            ).items()
+        }
+
+    def get_block_timestamps(self, block_numbers):
+        """
+        Helper function to get timestamps for multiple blocks with batched requests
+        """
+        calls = [
+            ("eth_getBlockByNumber", [hex(block_number), False])
+            for block_number in block_numbers
+        ]
+        results = self.batch_request(calls)
+        return {
+            block_number: int(result["timestamp"], 16)
+            for block_number, result in zip(block_numbers, results)
+        }
+
+    def scan_logs(self, filters, from_block, to_block=None, **kwargs):
+        """
+        Helper function to fetch logs over a big block range. See `LogScanner`.
+        """
+        return LogScanner(self, **kwargs).scan(filters, from_block, to_block=to_block)
+
     def get_first_block(self, token_address, from_block=0, to_block="latest"):
         token_address = Web3.toChecksumAddress(token_address)
         contract = self.get_contract(token_address, abi_type="ceth")
@@ -163,3 +254,77 @@ class Blockchain:
         Helper function to get decimal number from ray
         """
         return Decimal(ray) / 10**27
+
+
+class LogScanner:
+    """
+    Fetches logs for a block range in windows. Several windows are fetched
+    concurrently, but they're always yielded in block order. The window size adapts
+    to the number of logs returned: it grows while windows are sparse and shrinks
+    when they get dense. Windows the node refuses to return (usually because of
+    too many results) are split in half and retried.
+    """
+
+    def __init__(
+        self,
+        chain,
+        step=50000,
+        min_step=1,
+        max_step=1000000,
+        target_results=2000,
+        workers=4,
+    ):
+        self.chain = chain
+        self.step = step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.target_results = target_results
+        self.workers = workers
+
+    def _fetch(self, filters, from_block, to_block):
+        try:
+            return self.chain.eth.get_logs(
+                dict(filters, fromBlock=from_block, toBlock=to_block)
+            )
+        except ValueError:
+            if to_block <= from_block:
+                raise
+            middle = (from_block + to_block) // 2
+            log.debug(
+                "Splitting get_logs window %s-%s at %s", from_block, to_block, middle
+            )
+            return self._fetch(filters, from_block, middle) + self._fetch(
+                filters, middle + 1, to_block
+            )
+
+    def _next_step(self, results_count):
+        if results_count > self.target_results:
+            self.step = max(self.min_step, self.step // 2)
+        elif results_count < self.target_results // 4:
+            self.step = min(self.max_step, self.step * 2)
+
+    def scan(self, filters, from_block, to_block=None):
+        """
+        Yields (from_block, to_block, logs) for consecutive windows from `from_block`
+        up to and including `to_block` (or the latest block).
+        """
+        if to_block is None:
+            to_block = self.chain.get_latest_block()
+
+        start = from_block
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while start <= to_block:
+                windows = []
+                while len(windows) < self.workers and start <= to_block:
+                    window_end = min(start + self.step - 1, to_block)
+                    windows.append((start, window_end))
+                    start = window_end + 1
+
+                results = executor.map(
+                    lambda window: self._fetch(filters, *window), windows
+                )
+                max_count = 0
+                for (window_start, window_end), logs in zip(windows, results):
+                    max_count = max(max_count, len(logs))
+                    yield window_start, window_end, logs
+                self._next_step(max_count)
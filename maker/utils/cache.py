@@ -0,0 +1,269 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import logging
+import pickle
+import time
+from functools import wraps
+from urllib.parse import urlencode, urlsplit
+
+from django.core.cache import cache
+from django.http import HttpRequest, QueryDict
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from maker.utils.metrics import increment
+
+log = logging.getLogger(__name__)
+
+DATASET_VERSION_CACHE_KEY = "dataset_version.{}"
+RESPONSE_CACHE_KEY = "response.{}.{}"
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 3
+SWR_CACHE_KEY = "swr.{}.{}"
+SWR_LOCK_KEY = "swr.{}.{}.lock"
+SWR_STALE_FOR = 60 * 60 * 24
+SWR_LOCK_TIMEOUT = 60 * 10
+TIME_BUCKET_VERSION = "time_bucket"
+
+
+def _new_version():
+    # Versions start from the current time, so a counter that got evicted from the
+    # cache never goes back to a value that was already used
+    return time.time_ns()
+
+
+def get_dataset_versions(datasets):
+    """Returns {dataset: version}"""
+    keys = {dataset: DATASET_VERSION_CACHE_KEY.format(dataset) for dataset in datasets}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for dataset, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions[dataset] = version
+    return versions
+
+
+def get_cache_versions(datasets, time_bucket=None):
+    """
+    Returns the dataset versions a cached response is valid for. Views whose data
+    also changes with the wall clock pass `time_bucket` (in seconds), so their
+    responses are valid only until the end of the current bucket.
+    """
+    versions = get_dataset_versions(datasets)
+    if time_bucket:
+        versions[TIME_BUCKET_VERSION] = int(time.time() // time_bucket)
+    return versions
+
+
+def bump_dataset_version(dataset):
+    """
+    Marks dataset as changed. Call it from the tasks that write the dataset, so
+    cached responses built from it are not served anymore.
+    """
+    key = DATASET_VERSION_CACHE_KEY.format(dataset)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def get_normalized_query(request, exclude=()):
+    """Returns the query string with params sorted, so their order doesn't matter"""
+    return urlencode(
+        sorted(item for item in request.GET.lists() if item[0] not in exclude),
+        doseq=True,
+    )
+
+
+def _get_request_url(request):
+    # Paginated responses hold absolute links, so responses built for one host
+    # can't be served to another
+    return "{}://{}{}".format(request.scheme, request.get_host(), request.path)
+
+
+def _get_request_digest(request, versions):
+    return hashlib.sha1(
+        "{}?{}|{}".format(
+            _get_request_url(request),
+            get_normalized_query(request),
+            ",".join(str(versions[dataset]) for dataset in sorted(versions)),
+        ).encode()
+    ).hexdigest()
+
+
+def get_response_cache_key(request, datasets, time_bucket=None):
+    digest = _get_request_digest(request, get_cache_versions(datasets, time_bucket))
+    return RESPONSE_CACHE_KEY.format(request.path, digest)
+
+
+def get_etag(request, versions):
+    """
+    Returns the ETag of a response built from datasets at `versions`, so it can be
+    compared with If-None-Match before the view runs
+    """
+    return '"{}"'.format(_get_request_digest(request, versions))
+
+
+def cache_response(*datasets, timeout=RESPONSE_CACHE_TIMEOUT, time_bucket=None):
+    """
+    Class decorator for APIView and PaginatedApiView subclasses that caches
+    successful GET responses. The cache key is made of the path, the query params and
+    the current versions of `datasets`, so responses are fresh as soon as one of the
+    datasets is bumped with `bump_dataset_version`. With `time_bucket` responses are
+    also recomputed every `time_bucket` seconds.
+    """
+
+    def decorator(view_class):
+        get = view_class.get
+
+        @wraps(get)
+        def cached_get(self, request, *args, **kwargs):
+            key = get_response_cache_key(request, datasets, time_bucket)
+            cached = cache.get(key)
+            if cached is not None:
+                increment("response_cache.hit")
+                return Response(cached["data"], status=cached["status"])
+
+            increment("response_cache.miss")
+            response = get(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                try:
+                    cache.set(
+                        key,
+                        {"data": response.data, "status": response.status_code},
+                        timeout,
+                    )
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    log.exception("Couldn't cache response for %s", request.path)
+            return response
+
+        view_class.get = cached_get
+        view_class.cache_datasets = datasets
+        view_class.cache_time_bucket = time_bucket
+        return view_class
+
+    return decorator
+
+
+def _get_swr_keys(request):
+    digest = hashlib.sha1(
+        "{}?{}".format(
+            _get_request_url(request), get_normalized_query(request)
+        ).encode()
+    ).hexdigest()
+    return (
+        SWR_CACHE_KEY.format(request.path, digest),
+        SWR_LOCK_KEY.format(request.path, digest),
+    )
+
+
+def stale_while_revalidate(*datasets, fresh_for, stale_for=SWR_STALE_FOR):
+    """
+    Class decorator for expensive APIViews. A cached response is served as is for
+    `fresh_for` seconds. After that, or as soon as one of `datasets` is bumped, it's
+    still served for up to `stale_for` seconds while a single
+    `revalidate_response_task` recomputes it in the background. Only a cold cache
+    makes the request wait for the view.
+    """
+
+    def decorator(view_class):
+        get = view_class.get
+        view_path = "{}.{}".format(view_class.__module__, view_class.__qualname__)
+
+        def compute(self, request, key, versions, *args, **kwargs):
+            response = get(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                cache.set(
+                    key,
+                    {
+                        "data": response.data,
+                        "status": response.status_code,
+                        "fresh_until": time.time() + fresh_for,
+                        "versions": versions,
+                    },
+                    fresh_for + stale_for,
+                )
+            return response
+
+        @wraps(get)
+        def swr_get(self, request, *args, **kwargs):
+            key, lock_key = _get_swr_keys(request)
+            versions = get_dataset_versions(datasets)
+
+            if getattr(request, "swr_revalidate", False):
+                try:
+                    return compute(self, request, key, versions, *args, **kwargs)
+                finally:
+                    cache.delete(lock_key)
+
+            cached = cache.get(key)
+            if cached is None:
+                increment("swr_cache.miss")
+                return compute(self, request, key, versions, *args, **kwargs)
+
+            if cached["fresh_until"] > time.time() and cached["versions"] == versions:
+                increment("swr_cache.hit")
+            else:
+                increment("swr_cache.stale")
+                # cache.add is atomic, so only one request per key schedules the
+                # recompute until the task is done or the lock expires
+                if cache.add(lock_key, 1, SWR_LOCK_TIMEOUT):
+                    _schedule_revalidation(
+                        lock_key,
+                        view_path,
+                        _get_request_url(request),
+                        get_normalized_query(request),
+                        kwargs,
+                    )
+            response = Response(cached["data"], status=cached["status"])
+            # The stale data doesn't match the current dataset versions, so the ETag
+            # must be the one it was computed with
+            response["ETag"] = get_etag(request, cached["versions"])
+            return response
+
+        view_class.get = swr_get
+        view_class.cache_datasets = datasets
+        return view_class
+
+    return decorator
+
+
+def _schedule_revalidation(lock_key, view_path, url, query, view_kwargs):
+    from maker.tasks import revalidate_response_task
+
+    try:
+        revalidate_response_task.delay(view_path, url, query, view_kwargs)
+    except Exception:
+        cache.delete(lock_key)
+        log.exception("Couldn't schedule revalidation of %s", url)
+
+
+class _RevalidationRequest(HttpRequest):
+    """GET request with the scheme, host, path and query of the stale request"""
+
+    def __init__(self, url, query):
+        super().__init__()
+        parts = urlsplit(url)
+        self._scheme = parts.scheme
+        self.method = "GET"
+        self.path = self.path_info = parts.path
+        self.GET = QueryDict(query)
+        self.META["QUERY_STRING"] = query
+        self.META["HTTP_HOST"] = parts.netloc
+
+    def _get_scheme(self):
+        return self._scheme
+
+
+def revalidate_response(view_path, url, query, view_kwargs):
+    """Recomputes the response of a view decorated with stale_while_revalidate"""
+    request = _RevalidationRequest(url, query)
+    request.swr_revalidate = True
+    view = import_string(view_path).as_view()
+    return view(request, **view_kwargs)
@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import time
+
+from django_redis import get_redis_connection
+
+from maker.utils.metrics import increment
+
+log = logging.getLogger(__name__)
+
+# Refills the bucket based on the time passed since the last call and takes the
+# requested tokens if there are enough of them. Returns the number of seconds to
+# wait before trying again, or 0 if the tokens were taken. Redis time is used so
+# all workers share the same clock.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    Rate limiter shared by all processes through redis. Tokens are refilled at
+    `rate` per second up to `capacity`, so short bursts are allowed while the
+    average rate stays within the limit.
+    """
+
+    def __init__(self, name, rate, capacity=None, redis=None):
+        self.key = "rate_limit.{}".format(name)
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._redis = redis
+        self._script = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            try:
+                self._redis = get_redis_connection("default")
+            except NotImplementedError:
+                # The cache backend isn't redis (e.g. in tests), so there's nothing
+                # to share the bucket through
+                log.debug("Rate limiting is disabled for %s", self.key)
+                self._redis = False
+        return self._redis
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` are available"""
+        if not self.redis:
+            return
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+        while True:
+            wait = float(
+                self._script(keys=[self.key], args=[self.rate, self.capacity, tokens])
+            )
+            if wait <= 0:
+                return
+            increment("{}.throttled".format(self.key))
+            time.sleep(wait)
@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer built on orjson. Types orjson doesn't
+    know (Decimal, sets, querysets, ...) go through DRF's JSONEncoder, so the output
+    is the same JSON: Decimals as numbers (or strings with decimal_as_string), ISO
+    datetimes with "Z" for UTC and compact separators. The only difference is that
+    NaN and infinity become null instead of failing the request.
+
+    Data orjson can't serialize, like integers above 64 bits, and requests asking
+    for an indented response are rendered by JSONRenderer.
+    """
+
+    decimal_as_string = False
+
+    def __init__(self):
+        self._encoder = JSONEncoder()
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj) if self.decimal_as_string else float(obj)
+        return self._encoder.default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # orjson only handles 64-bit integers, larger ones (e.g. raw uint256
+            # values) are rendered by JSONRenderer
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer, escape the line separators that aren't valid in
+        # javascript strings
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class DecimalStringJSONEncoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+class DecimalStringJSONRenderer(FastJSONRenderer):
+    """FastJSONRenderer that keeps the full precision of Decimals as strings"""
+
+    decimal_as_string = True
+    encoder_class = DecimalStringJSONEncoder
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+
+DOWNSAMPLE_LTTB = "lttb"
+DOWNSAMPLE_MIN_MAX = "minmax"
+DOWNSAMPLE_METHODS = [DOWNSAMPLE_LTTB, DOWNSAMPLE_MIN_MAX]
+
+
+def _edge_indices(size, points):
+    """Keeps the first and last point when there are too few points for buckets"""
+    return np.array([0, size - 1][:points], dtype=int)
+
+
+def lttb_indices(xs, ys, points):
+    """
+    Returns indices of the points picked by the Largest-Triangle-Three-Buckets
+    algorithm. The first and last points are always kept, every bucket in between
+    contributes the point that forms the largest triangle with the previously
+    picked point and the average of the next bucket.
+    """
+    size = len(xs)
+    if points >= size:
+        return np.arange(size)
+    if points < 3:
+        return _edge_indices(size, points)
+
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    # Bucket edges of the points between the first and the last one
+    edges = np.linspace(1, size - 1, points - 1).astype(int)
+    indices = np.empty(points, dtype=int)
+    indices[0] = 0
+    indices[-1] = size - 1
+
+    picked = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket < points - 3:
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = size - 1, size
+        avg_x = xs[next_start:next_end].mean()
+        avg_y = ys[next_start:next_end].mean()
+
+        areas = np.abs(
+            (xs[picked] - avg_x) * (ys[start:end] - ys[picked])
+            - (xs[picked] - xs[start:end]) * (avg_y - ys[picked])
+        )
+        picked = start + int(areas.argmax())
+        indices[bucket + 1] = picked
+    return indices
+
+
+def min_max_indices(xs, ys, points):
+    """
+    Returns indices of the lowest and highest point of each bucket, together with
+    the first and last point. Unlike LTTB it keeps every spike, which is what you
+    want when looking for price drops.
+    """
+    size = len(xs)
+    if points >= size:
+        return np.arange(size)
+    if points < 4:
+        return _edge_indices(size, points)
+
+    ys = np.asarray(ys, dtype=np.float64)
+    edges = np.linspace(1, size - 1, (points - 2) // 2 + 1).astype(int)
+    indices = {0, size - 1}
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = ys[start:end]
+        indices.add(start + int(bucket.argmin()))
+        indices.add(start + int(bucket.argmax()))
+    return np.array(sorted(indices))
+
+
+def downsample(rows, points, method=DOWNSAMPLE_LTTB, x="timestamp", y="amount"):
+    """
+    Reduces a list of dicts ordered by `x` to at most `points` rows. The rows
+    themselves are returned untouched, only a subset of them.
+    """
+    if not points or len(rows) <= points:
+        return list(rows)
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError("Unknown downsample method {}".format(method))
+
+    xs = [row[x] for row in rows]
+    ys = [row[y] for row in rows]
+    if method == DOWNSAMPLE_MIN_MAX:
+        indices = min_max_indices(xs, ys, points)
+    else:
+        indices = lttb_indices(xs, ys, points)
+    return [rows[idx] for idx in indices]
@@ -2,14 +2,34 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import hashlib
+import re
 from collections import namedtuple
+from functools import partial
 
-from django.db.models import Q
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q, QuerySet
 from django.shortcuts import get_object_or_404
-from rest_framework.pagination import PageNumberPagination
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from maker.utils.cache import get_dataset_versions, get_normalized_query
+
+CURSOR_PAGINATION = "cursor"
+COUNT_CACHE_KEY = "count.{}.{}"
+# Counts of views with cache_datasets are kept until the data changes, others only
+# for a few minutes
+COUNT_CACHE_TIMEOUT = 60 * 60 * 3
+COUNT_CACHE_TIMEOUT_NO_DATASETS = 60 * 5
+# Querysets the planner estimates to have more rows than this aren't counted exactly
+COUNT_ESTIMATE_THRESHOLD = 100000
+HEX_SEARCH_RE = re.compile(r"^(0x)?[0-9a-f]+$", re.IGNORECASE)
+PAGINATION_QUERY_PARAMS = ("p", "p_size", "cursor", "pagination", "order", "count")
+
 
 def fetch_one(cursor):
     """Return first row from a cursor as a namedtuple"""
@@ -27,15 +47,110 @@ def fetch_all(cursor):
     return [nt_result(*row)._asdict() for row in cursor.fetchall()]
 
 
+class CountedPaginator(Paginator):
+    """Django Paginator that gets its count from `get_count(object_list)`"""
+
+    def __init__(self, object_list, per_page, get_count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        return self.get_count(self.object_list)
+
+    def set_count(self, count):
+        self.__dict__["count"] = count
+        # num_pages is cached from the previous count
+        self.__dict__.pop("num_pages", None)
+
+
 class Pagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = "p_size"
     max_page_size = 1000
     page_query_param = "p"
 
+    def django_paginator_class(self, object_list, per_page):
+        return CountedPaginator(object_list, per_page, self.get_count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_skipped = view is not None and view.skip_count(request)
+        if self.count_skipped:
+            self.get_count = partial(self.get_lower_bound_count, request=request)
+        elif view is not None:
+            self.get_count = partial(self.get_view_count, request=request, view=view)
+        else:
+            self.get_count = self.get_exact_count
+        page = super().paginate_queryset(queryset, request, view=view)
+        if page is not None and len(page) < self.page.paginator.per_page:
+            # Estimated or cached counts can also be too high. A short page is the
+            # last one, so the count is known and there's no next link.
+            offset = (self.page.number - 1) * self.page.paginator.per_page
+            self.page.paginator.set_count(offset + len(page))
+        return page
+
+    def get_exact_count(self, object_list):
+        if isinstance(object_list, QuerySet):
+            return object_list.count()
+        return len(object_list)
+
+    def get_view_count(self, queryset, request, view):
+        count = view.get_count(queryset, request)
+        offset, page_size = self._get_offset(request)
+        if offset + page_size >= count:
+            # Estimated or cached counts can be too low, so make sure the requested
+            # page is still reachable
+            count = max(count, self.get_lower_bound_count(queryset, request))
+        return count
+
+    def get_lower_bound_count(self, queryset, request):
+        """
+        Counts rows up to the first row of the next page, which is all the paginator
+        needs to know whether there is a next page
+        """
+        offset, page_size = self._get_offset(request)
+        return offset + queryset[offset : offset + page_size + 1].count()
+
+    def _get_offset(self, request):
+        page_size = self.get_page_size(request)
+        try:
+            page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            page_number = 1
+        return max(page_number - 1, 0) * page_size, page_size
+
     def get_paginated_response(self, results, additional_data):
         response_data = {
-            "count": self.page.paginator.count,
+            "count": None if self.count_skipped else self.page.paginator.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": results,
+        }
+        response_data.update(additional_data)
+        return Response(response_data)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on the view's ordering. Pages are fetched with
+    `WHERE order_field < position` instead of OFFSET, so deep pages are as cheap as
+    the first one.
+    """
+
+    page_size = 100
+    page_size_query_param = "p_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def get_paginated_response(self, results, additional_data, count=None):
+        response_data = {
+            "count": count,
             "next": self.get_next_link(),
             "previous": self.get_previous_link(),
             "results": results,
@@ -44,14 +159,40 @@ class Pagination(PageNumberPagination):
         return Response(response_data)
 
 
+def estimate_count(queryset):
+    """Returns the PostgreSQL planner estimate of the number of rows in queryset"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) {}".format(sql), params)
+        plan = cursor.fetchone()[0]
+    return plan[0]["Plan"]["Plan Rows"]
+
+
 class PaginatedApiView(APIView):
     ordering_fields = []
     search_fields = []
+    # Search fields holding hex strings (addresses, hashes). They're only searched
+    # for hex terms, and terms starting with 0x match them by prefix.
+    hex_search_fields = []
     default_order = None
     serializer_class = None
     model = None
     lookup_field = None
     queryset_extra = None
+    # Views with cursor_pagination also accept `pagination=cursor`, which pages on
+    # the ordering field instead of page numbers. cursor_tiebreaker is appended to
+    # the ordering so rows with equal values keep a stable order. Only orderings on
+    # cursor_ordering_fields are paged with a cursor, the rest fall back to page
+    # numbers. These fields must not be nullable, as a cursor can't point at NULL.
+    cursor_pagination = False
+    cursor_ordering_fields = []
+    cursor_tiebreaker = None
+    cursor_approximate_count = True
+    count_estimate_threshold = COUNT_ESTIMATE_THRESHOLD
+    # Datasets the view reads from, used for ETags and response caching.
+    # cache_time_bucket (seconds) also expires them with the wall clock.
+    cache_datasets = ()
+    cache_time_bucket = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -68,11 +209,29 @@ class PaginatedApiView(APIView):
         raise NotImplementedError
 
     def get_search_filters(self, request):
-        search = request.query_params.get("search")
+        """
+        Builds the search as icontains/istartswith on the search fields, which the
+        UPPER(<field>) trigram and pattern indexes from migration 0028 can serve
+        """
+        search = (request.query_params.get("search") or "").strip()
         filters = Q()
-        if search:
-            for field in self.search_fields:
-                filters |= Q(**{"{}__icontains".format(field): search})
+        if not search:
+            return filters
+
+        is_hex = HEX_SEARCH_RE.match(search) is not None
+        is_hex_prefix = is_hex and search[:2].lower() == "0x"
+        for field in self.search_fields:
+            lookup = "icontains"
+            if field in self.hex_search_fields:
+                if not is_hex:
+                    continue
+                if is_hex_prefix:
+                    lookup = "istartswith"
+            filters |= Q(**{"{}__{}".format(field, lookup): search})
+
+        if not filters:
+            # None of the fields can contain the term
+            return Q(pk__in=[])
         return filters
 
     def get_ordering(self, request):
@@ -84,6 +243,71 @@ class PaginatedApiView(APIView):
     def paginate_queryset(self, queryset):
         return self.paginator.paginate_queryset(queryset, self.request, view=self)
 
+    def use_cursor_pagination(self, request, order):
+        return (
+            self.cursor_pagination
+            and request.query_params.get("pagination") == CURSOR_PAGINATION
+            and order.lstrip("-") in self.cursor_ordering_fields
+        )
+
+    def get_cursor_ordering(self, order):
+        ordering = [order]
+        if self.cursor_tiebreaker:
+            sign = "-" if order.startswith("-") else ""
+            ordering.append("{}{}".format(sign, self.cursor_tiebreaker))
+        return tuple(ordering)
+
+    def get_cursor_response(self, queryset, order, **kwargs):
+        paginator = KeysetPagination(self.get_cursor_ordering(order))
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        if self.serializer_class:
+            page = self.serializer_class(page, many=True).data
+        count = None
+        if self.cursor_approximate_count and not self.skip_count(self.request):
+            count = estimate_count(queryset)
+        additional_data = self.get_additional_data(queryset, **kwargs)
+        return paginator.get_paginated_response(page, additional_data, count=count)
+
+    def skip_count(self, request):
+        """Clients that don't show totals can send `count=false`"""
+        return request.query_params.get("count") in ("false", "0")
+
+    def get_count_cache_key(self, request):
+        versions = get_dataset_versions(self.cache_datasets)
+        digest = hashlib.sha1(
+            "{}?{}|{}".format(
+                request.path,
+                get_normalized_query(request, exclude=PAGINATION_QUERY_PARAMS),
+                ",".join(str(versions[dataset]) for dataset in sorted(versions)),
+            ).encode()
+        ).hexdigest()
+        return COUNT_CACHE_KEY.format(self.__class__.__name__, digest)
+
+    def get_count(self, queryset, request):
+        """
+        Count strategy hook. Exact counts are cached per view and filters until one
+        of cache_datasets changes. Querysets too large to count exactly get the
+        planner estimate instead.
+        """
+        key = self.get_count_cache_key(request)
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+        estimate = estimate_count(queryset)
+        if estimate >= self.count_estimate_threshold:
+            return estimate
+
+        count = queryset.count()
+        cache.set(
+            key,
+            count,
+            COUNT_CACHE_TIMEOUT
+            if self.cache_datasets
+            else COUNT_CACHE_TIMEOUT_NO_DATASETS,
+        )
+        return count
+
     def get_additional_data(self, queryset, **kwargs):
         return {}
 
@@ -100,6 +324,8 @@ class PaginatedApiView(APIView):
             search_filters=search_filters, query_params=request.GET, **kwargs
         )
         order = self.get_ordering(request)
+        if order and self.use_cursor_pagination(request, order):
+            return self.get_cursor_response(queryset, order, **kwargs)
         if order:
             queryset = queryset.order_by(order)
 
@@ -2,7 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from collections import Counter, defaultdict
+from collections import Counter
 from datetime import date, datetime, timedelta
 
 from django.db.models import F, Sum, Value
@@ -13,7 +13,11 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from maker.constants import (
+    DATASET_OHLCV,
+    DATASET_OSM,
     DRAWDOWN_PAIRS_HISTORY_DAYS,
+    DRAWDOWN_SOURCE_OHLCV,
+    DRAWDOWN_SOURCE_OSM,
     OHLCV_TYPE_DAILY,
     OHLCV_TYPE_HOURLY,
     OHLCV_TYPES,
@@ -35,7 +39,14 @@ from maker.models import (
     Vault,
     Volatility,
 )
+from maker.modules.drawdowns import (
+    get_drawdown_histogram,
+    get_drawdown_histograms,
+    get_drawdown_ohlcv_types,
+    get_drawdown_timestamps,
+)
 from maker.modules.slippage import get_slippage_from_asset, get_slippage_history
+from maker.utils.cache import cache_response, stale_while_revalidate
 from maker.utils.utils import date_to_timestamp, round_to_closest
 
 
@@ -195,6 +206,7 @@ class AssetSlippageHistoryView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetCEXTradingActivityView(APIView):
     def get(self, request, symbol):
         get_object_or_404(MakerAsset, symbol=symbol)
@@ -215,6 +227,7 @@ class AssetCEXTradingActivityView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetCEXTradingActivityPerExchangeView(APIView):
     def get(self, request, symbol):
         get_object_or_404(MakerAsset, symbol=symbol)
@@ -234,6 +247,7 @@ class AssetCEXTradingActivityPerExchangeView(APIView):
         return Response(ohlcvs, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetCEXTradingActivityPerAssetView(APIView):
     def get(self, request, symbol):
         get_object_or_404(MakerAsset, symbol=symbol)
@@ -293,6 +307,7 @@ class AssetDEXTradingActivityLiquidityView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetDailyVolatilityView(APIView):
     def _get_pair(self, symbol):
         if symbol in {"WBTC", "WSTETH"}:
@@ -323,60 +338,30 @@ class AssetDailyVolatilityView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetPriceDrawdownsView(APIView):
-    def _get_drawdawn_pair_ids_for_asset(self, symbol):
-        keys = DRAWDOWN_PAIRS_HISTORY_DAYS.keys()
-        pairs = defaultdict(list)
-        for key in keys:
-            from_symbol, to_symbol, exchange, ohlcv_type = key.split("-")
-            if from_symbol != symbol:
-                continue
-
-            pair_ids = OHLCVPair.objects.filter(
-                from_asset_symbol=from_symbol,
-                to_asset_symbol=to_symbol,
-                ohlcv_type=ohlcv_type,
-                exchange=exchange,
-            ).values_list("id", flat=True)
-            pairs[ohlcv_type] += pair_ids
-        return pairs
-
     def get(self, request, symbol):
         asset = get_object_or_404(MakerAsset, symbol=symbol)
 
         if asset.symbol in {"WBTC", "WSTETH"}:
             symbol = symbol.lstrip("W")
 
-        ohlcv_pairs = self._get_drawdawn_pair_ids_for_asset(symbol)
-
         results = []
         timestamps = {}
-        for ohlcv_type, pair_ids in ohlcv_pairs.items():
+        for ohlcv_type in get_drawdown_ohlcv_types(symbol):
             key_type = dict(OHLCV_TYPES)[ohlcv_type]
-            ohlcvs = OHLCV.objects.filter(
-                pair_id__in=pair_ids,
-                drawdown__lt=-2,
-                drawdown_hl__isnull=False,
-            ).order_by("timestamp")
-
-            drawdown_hls = ohlcvs.values_list("drawdown_hl", flat=True)
-
-            start_timestamp = ohlcvs.first().timestamp
-            end_timestamp = ohlcvs.last().timestamp
-
-            counter = defaultdict(int)
-            for drawdown_hl in drawdown_hls:
-                bucket = round_to_closest(drawdown_hl)
-                if bucket < 0 and bucket > -80:
-                    counter[bucket] += 1
-
-            timestamps[key_type] = {
-                "start_timestamp": start_timestamp,
-                "end_timestamp": end_timestamp,
-            }
+            drawdown_timestamps = get_drawdown_timestamps(
+                DRAWDOWN_SOURCE_OHLCV, symbol, ohlcv_type
+            )
+            if not drawdown_timestamps:
+                continue
+            timestamps[key_type] = drawdown_timestamps
 
             key = "{} {}".format(symbol, key_type)
-            for drop, count in counter.items():
+            histogram = get_drawdown_histogram(
+                DRAWDOWN_SOURCE_OHLCV, symbol, ohlcv_type
+            )
+            for drop, count in histogram.items():
                 results.append(
                     {
                         "key": key,
@@ -386,28 +371,19 @@ class AssetPriceDrawdownsView(APIView):
                 )
 
         if asset.symbol != "ETH" and timestamps:
-            eth_pairs = self._get_drawdawn_pair_ids_for_asset("ETH")
-
-            for ohlcv_type, pair_ids in eth_pairs.items():
+            for ohlcv_type in get_drawdown_ohlcv_types("ETH"):
                 key_type = dict(OHLCV_TYPES)[ohlcv_type]
-
-                ohlcvs = OHLCV.objects.filter(
-                    pair_id__in=pair_ids,
-                    drawdown__lt=-2,
-                    drawdown_hl__isnull=False,
-                    timestamp__gte=timestamps[key_type]["start_timestamp"],
-                ).order_by("timestamp")
-
-                drawdown_hls = ohlcvs.values_list("drawdown_hl", flat=True)
-
-                counter = defaultdict(int)
-                for drawdown_hl in drawdown_hls:
-                    bucket = round_to_closest(drawdown_hl)
-                    if bucket < 0 and bucket > -80:
-                        counter[bucket] += 1
+                if key_type not in timestamps:
+                    continue
 
                 key = "ETH {}".format(key_type)
-                for drop, count in counter.items():
+                histogram = get_drawdown_histogram(
+                    DRAWDOWN_SOURCE_OHLCV,
+                    "ETH",
+                    ohlcv_type,
+                    since_timestamp=timestamps[key_type]["start_timestamp"],
+                )
+                for drop, count in histogram.items():
                     results.append(
                         {
                             "key": key,
@@ -420,30 +396,27 @@ class AssetPriceDrawdownsView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OSM)
 class AssetOSMDrawdownsCountView(APIView):
     def _get_OSM_hourly_count(self, asset):
-        osms = (
-            OSM.objects.filter(symbol=asset.symbol, current_price__gt=0)
-            .values("current_price", "next_price", "datetime")
-            .order_by("datetime")
+        osms = OSM.objects.filter(symbol=asset.symbol, current_price__gt=0)
+        first_datetimes = list(
+            osms.order_by("block_number").values_list("datetime", flat=True)[:2]
         )
-        osms = list(osms)
-
-        if len(osms) < 2:
+        if len(first_datetimes) < 2:
             return None, None, None
+        last_datetime = (
+            osms.order_by("-block_number").values_list("datetime", flat=True).first()
+        )
 
-        start_timestamp = osms[0]["datetime"].timestamp()
-        end_timestamp = osms[-1]["datetime"].timestamp()
-        drawdowns = []
-        for osm in osms:
-            drawdown = (
-                (osm["next_price"] - osm["current_price"]) / osm["current_price"] * 100
-            )
-            if drawdown <= -2:
-                bucket = round_to_closest(drawdown)
-                if bucket < 0:
-                    drawdowns.append(bucket)
-        return start_timestamp, end_timestamp, Counter(drawdowns)
+        histogram = get_drawdown_histogram(
+            DRAWDOWN_SOURCE_OSM, asset.symbol, OHLCV_TYPE_HOURLY, min_bucket=None
+        )
+        return (
+            first_datetimes[0].timestamp(),
+            last_datetime.timestamp(),
+            Counter(histogram),
+        )
 
     def _get_OSM_daily_count(self, asset):
         osms = list(OSMDaily.objects.filter(symbol=asset.symbol).order_by("date"))
@@ -549,6 +522,7 @@ class AssetsSlippagesView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetsCEXVolumeView(APIView):
     def get(self, request):
         data = []
@@ -627,6 +601,7 @@ class AssetsDEXLiquidityView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OHLCV)
 class AssetsVolatilityView(APIView):
     def _get_pairs(self):
         asset_symbols = (
@@ -678,24 +653,8 @@ class AssetsVolatilityView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@stale_while_revalidate(DATASET_OHLCV, fresh_for=60 * 60 * 3)
 class AssetsDrawdownsView(APIView):
-    def _get_drawdawn_pair_ids_for_asset(self, symbol):
-        keys = DRAWDOWN_PAIRS_HISTORY_DAYS.keys()
-        pairs = defaultdict(list)
-        for key in keys:
-            from_symbol, to_symbol, exchange, ohlcv_type = key.split("-")
-            if from_symbol != symbol or ohlcv_type != OHLCV_TYPE_DAILY:
-                continue
-
-            pair_ids = OHLCVPair.objects.filter(
-                from_asset_symbol=from_symbol,
-                to_asset_symbol=to_symbol,
-                ohlcv_type=ohlcv_type,
-                exchange=exchange,
-            ).values_list("id", flat=True)
-            pairs[ohlcv_type] += pair_ids
-        return pairs
-
     def get(self, request):
         data = []
 
@@ -704,36 +663,23 @@ class AssetsDrawdownsView(APIView):
             .values_list("symbol", flat=True)
             .order_by("symbol")
         )
+        symbols = [
+            symbol.lstrip("W") if symbol in {"WBTC", "WSTETH"} else symbol
+            for symbol in symbols
+        ]
 
+        histograms = get_drawdown_histograms(
+            DRAWDOWN_SOURCE_OHLCV, symbols, OHLCV_TYPE_DAILY
+        )
         for symbol in symbols:
-            if symbol in {"WBTC", "WSTETH"}:
-                symbol = symbol.lstrip("W")
-
-            ohlcv_pairs = self._get_drawdawn_pair_ids_for_asset(symbol)
-
-            for ohlcv_type, pair_ids in ohlcv_pairs.items():
-                ohlcvs = OHLCV.objects.filter(
-                    pair_id__in=pair_ids,
-                    drawdown__lt=-2,
-                    drawdown_hl__isnull=False,
-                ).order_by("timestamp")
-
-                drawdown_hls = ohlcvs.values_list("drawdown_hl", flat=True)
-
-                counter = defaultdict(int)
-                for drawdown_hl in drawdown_hls:
-                    bucket = round_to_closest(drawdown_hl)
-                    if bucket < 0 and bucket > -80:
-                        counter[bucket] += 1
-
-                for drop, count in counter.items():
-                    data.append(
-                        {
-                            "key": symbol,
-                            "drop": drop,
-                            "amount": count,
-                        }
-                    )
+            for drop, count in histograms.get(symbol, {}).items():
+                data.append(
+                    {
+                        "key": symbol,
+                        "drop": drop,
+                        "amount": count,
+                    }
+                )
 
         return Response(data, status.HTTP_200_OK)
 
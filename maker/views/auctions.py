@@ -9,8 +9,10 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from ..constants import DATASET_OSM
 from ..models import Ilk
 from ..modules.auctions import AuctionKickSim
+from ..utils.cache import stale_while_revalidate
 
 AUCTION_KICK_SIM_ILK_MAP = {"ETH": "ETH-A", "BTC": "WBTC-A"}
 
@@ -69,6 +71,7 @@ class AuctionKickSimPerDayOSMView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@stale_while_revalidate(DATASET_OSM, fresh_for=60 * 60)
 class AuctionKickSimPerParamView(APIView):
     def get(self, request, symbol):
         if symbol not in ["ETH", "BTC"]:
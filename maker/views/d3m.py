@@ -2,14 +2,23 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import math
 from decimal import Decimal
 
+import numpy as np
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from ..modules.d3m import aave, compound, spark
-from ..modules.d3m.d3m import get_d3m_stats, get_protocol_stats
+from ..modules.d3m.d3m import (
+    HEATMAP_STEPS,
+    MAX_HEATMAP_POINTS,
+    get_d3m_compute,
+    get_d3m_stats,
+    get_heatmap,
+    get_protocol_stats,
+)
 
 
 class D3MsView(APIView):
@@ -94,3 +103,54 @@ class D3MDaiBorrowCurveView(APIView):
         else:
             d3m = aave.D3MAaveCompute()
         return Response(d3m.dai_curve, status.HTTP_200_OK)
+
+
+def _parse_floats(value):
+    values = [float(item) for item in value.split(",") if item.strip()]
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError("Values must be finite")
+    return values
+
+
+class D3MHeatmapView(APIView):
+    """
+    Simulate a grid of debt ceilings and target borrow rates (in %) at once
+    """
+
+    def get(self, request, protocol):
+        d3m = get_d3m_compute(protocol)
+        if not d3m:
+            return Response(None, status.HTTP_404_NOT_FOUND)
+
+        line = float(d3m.d3m_model.max_debt_ceiling)
+        bar = float(d3m.d3m_model.target_borrow_rate)
+        try:
+            if "debt_ceilings" in request.GET:
+                debt_ceilings = _parse_floats(request.GET["debt_ceilings"])
+            else:
+                debt_ceilings = np.linspace(0, line * 2, HEATMAP_STEPS)
+
+            if "target_borrow_rates" in request.GET:
+                target_borrow_rates = (
+                    np.array(_parse_floats(request.GET["target_borrow_rates"])) / 100
+                )
+            else:
+                target_borrow_rates = np.linspace(0, max(bar * 2, 0.1), HEATMAP_STEPS)
+        except ValueError:
+            return Response(None, status.HTTP_400_BAD_REQUEST)
+
+        points = len(debt_ceilings) * len(target_borrow_rates)
+        if not points or points > MAX_HEATMAP_POINTS:
+            return Response(None, status.HTTP_400_BAD_REQUEST)
+
+        metrics = None
+        if "metrics" in request.GET:
+            metrics = request.GET["metrics"].split(",")
+        try:
+            data = get_heatmap(d3m, debt_ceilings, target_borrow_rates, metrics)
+        except KeyError:
+            return Response(None, status.HTTP_400_BAD_REQUEST)
+
+        data["line"] = line
+        data["bar"] = bar
+        return Response(data, status.HTTP_200_OK)
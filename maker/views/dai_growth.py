@@ -12,10 +12,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from ..modules.dai_growth import MAIN_ILKS, DAISupplyRiskModule
+from ..utils.cache import stale_while_revalidate
 
 
 # Chache for 1 hr
 @method_decorator(cache_control(max_age=60 * 60), name="dispatch")
+@stale_while_revalidate(fresh_for=60 * 60)
 class DaiGrowth(APIView):
     def _group_other(self, vault_type_data):
         data = []
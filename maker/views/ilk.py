@@ -13,6 +13,8 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from maker.constants import DATASET_ILKS, DATASET_OSM, DATASET_RISK_PREMIUM
+from maker.utils.cache import cache_response
 from maker.utils.views import fetch_all
 
 from ..models import Ilk, IlkHistoricStats, RiskPremium
@@ -24,7 +26,7 @@ from ..modules.ilk import (
     get_risk_premium_historic_stats_for_ilk,
     get_stats_for_ilk,
 )
-from ..modules.osm import get_osm_and_medianizer
+from ..modules.osm import TO_NEXT_CHANGE_TIME_BUCKET, get_osm_and_medianizer
 from ..modules.risk_premium import (
     get_capital_at_risk_for_ilk,
     get_capital_at_risk_history_for_ilk,
@@ -37,6 +39,8 @@ class IlksView(APIView):
     Get all tokens info
     """
 
+    cache_datasets = (DATASET_ILKS,)
+
     def get(self, request):
         days_ago = int(request.GET.get("days_ago", 0))
         type = request.GET.get("type")
@@ -121,6 +125,8 @@ class IlkView(APIView):
     Get ilk
     """
 
+    cache_datasets = (DATASET_ILKS,)
+
     def get(self, request, ilk):
         ilk = get_object_or_404(Ilk, ilk=ilk, is_active=True)
         data = {
@@ -147,6 +153,8 @@ class IlkStatsView(APIView):
     Get ilk stats
     """
 
+    cache_datasets = (DATASET_ILKS,)
+
     def get(self, request, ilk):
         days_ago = int(request.GET.get("days_ago", 0))
         data = get_stats_for_ilk(ilk, days_ago)
@@ -158,6 +166,8 @@ class IlkHistoricStatsView(APIView):
     Get ilk stats
     """
 
+    cache_datasets = (DATASET_ILKS,)
+
     def get(self, request, ilk):
         days_ago = int(request.GET.get("days_ago", 30))
         stat_type = request.GET.get("type", "total_debt")
@@ -178,6 +188,9 @@ class IlkOSMView(APIView):
     Get OSM and medianizer for ilk
     """
 
+    cache_datasets = (DATASET_OSM,)
+    cache_time_bucket = TO_NEXT_CHANGE_TIME_BUCKET
+
     def get(self, request, ilk):
         ilk = get_object_or_404(Ilk, ilk=ilk)
         data = get_osm_and_medianizer(ilk.collateral)
@@ -230,6 +243,7 @@ class IlkCapitalAtRiskChartView(APIView):
         return Response(response, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_RISK_PREMIUM)
 class IlkRiskPremiumModelChartView(APIView):
     """
     Get risk premium
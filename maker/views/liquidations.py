@@ -139,6 +139,9 @@ class LiquidationsView(PaginatedApiView):
     """
 
     default_order = "-block_number"
+    cursor_pagination = True
+    cursor_ordering_fields = ["block_number"]
+    cursor_tiebreaker = "id"
     ordering_fields = ["collateral_seized_usd", "debt_repaid_usd"]
     serializer_class = LiquidationsSerializer
 
@@ -6,11 +6,19 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from maker.constants import DATASET_OSM
 from maker.models import MakerAsset
+from maker.utils.cache import cache_response
+from maker.utils.timeseries import DOWNSAMPLE_LTTB, DOWNSAMPLE_METHODS
 
-from ..modules.osm import get_osm_and_medianizer, get_price_history
+from ..modules.osm import (
+    TO_NEXT_CHANGE_TIME_BUCKET,
+    get_osm_and_medianizer,
+    get_price_history,
+)
 
 
+@cache_response(DATASET_OSM, time_bucket=TO_NEXT_CHANGE_TIME_BUCKET)
 class OSMAsset(APIView):
     """
     Get OSM and medianizer for symbol
@@ -21,6 +29,7 @@ class OSMAsset(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_OSM, time_bucket=TO_NEXT_CHANGE_TIME_BUCKET)
 class OSMTableView(APIView):
     def get(self, request):
         assets = []
@@ -51,8 +60,30 @@ class OSMTableView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+# Upper bound for the `points` query param, so clients can't ask for the whole
+# history in one go
+MAX_PRICE_HISTORY_POINTS = 5000
+
+
+@cache_response(DATASET_OSM)
 class OracleHistoricStatsView(APIView):
+    """
+    Get OSM, medianizer and chainlink price history for symbol. Pass `points` to
+    downsample each series to at most that many points, and `downsample` to pick
+    the method (`lttb` or `minmax`).
+    """
+
     def get(self, request, symbol):
         days_ago = int(request.GET.get("days_ago"))
-        data = get_price_history(symbol, days_ago)
+        points = request.GET.get("points")
+        method = request.GET.get("downsample", DOWNSAMPLE_LTTB)
+        if points is not None:
+            try:
+                points = int(points)
+            except ValueError:
+                return Response(None, status.HTTP_400_BAD_REQUEST)
+            if points < 1 or method not in DOWNSAMPLE_METHODS:
+                return Response(None, status.HTTP_400_BAD_REQUEST)
+            points = min(points, MAX_PRICE_HISTORY_POINTS)
+        data = get_price_history(symbol, days_ago, points=points, method=method)
         return Response(data, status.HTTP_200_OK)
@@ -16,6 +16,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from maker.models import Asset, Ilk, IlkHistoricStats, PSMDAISupply, UrnEventState
+from maker.utils.cache import stale_while_revalidate
 from maker.utils.views import PaginatedApiView, fetch_all, fetch_one
 
 log = logging.getLogger(__name__)
@@ -39,12 +40,17 @@ class PSMEventsView(PaginatedApiView):
     """
 
     default_order = "-block_number"
+    cursor_pagination = True
+    cursor_ordering_fields = ["block_number", "datetime"]
+    cursor_tiebreaker = "id"
     ordering_fields = ["block_number", "principal", "datetime"]
     serializer_class = PSMEventsSerializer
+    search_fields = ["tx_hash"]
+    hex_search_fields = ["tx_hash"]
 
     def get_queryset(self, search_filters, query_params, **kwargs):
         return (
-            UrnEventState.objects.filter(ilk=kwargs["ilk"])
+            UrnEventState.objects.filter(search_filters, ilk=kwargs["ilk"])
             .annotate(principal=F("dart") / Decimal("1e18"))
             .values(
                 "block_number",
@@ -119,6 +125,7 @@ class PSMDAISupplyHistoryView(APIView):
         return Response(debts, status.HTTP_200_OK)
 
 
+@stale_while_revalidate(fresh_for=60 * 5)
 class PSMsView(APIView):
     def get(self, request):
         days_ago = self.request.GET.get("days_ago")
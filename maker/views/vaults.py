@@ -12,6 +12,7 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from maker.constants import DATASET_RISK_PREMIUM, DATASET_VAULTS
 from maker.models import (
     OSM,
     Ilk,
@@ -20,6 +21,7 @@ from maker.models import (
     Vault,
     VaultProtectionScore,
 )
+from maker.utils.cache import cache_response
 from maker.utils.views import PaginatedApiView
 
 
@@ -89,8 +91,11 @@ class VaultView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_VAULTS)
 class VaultEventsView(PaginatedApiView):
     default_order = "-order_index"
+    cursor_pagination = True
+    cursor_ordering_fields = ["order_index"]
     ordering_fields = [
         "order_index",
     ]
@@ -155,6 +160,7 @@ class VaultEventsView(PaginatedApiView):
         )
 
 
+@cache_response(DATASET_VAULTS)
 class VaultPositionsView(PaginatedApiView):
     default_order = "-debt"
     ordering_fields = [
@@ -181,6 +187,7 @@ class VaultPositionsView(PaginatedApiView):
         "owner_name",
         "ds_proxy_address",
     ]
+    hex_search_fields = ["owner_address", "ds_proxy_address"]
 
     def get_queryset(self, search_filters, **kwargs):
         type = self.request.GET.get("vaults")
@@ -219,6 +226,7 @@ class VaultPositionsView(PaginatedApiView):
         }
 
 
+@cache_response(DATASET_VAULTS)
 class AllVaultPositionsView(PaginatedApiView):
     default_order = "-debt"
     ordering_fields = [
@@ -243,6 +251,7 @@ class AllVaultPositionsView(PaginatedApiView):
         "uid",
         "owner_name",
     ]
+    hex_search_fields = ["owner_address"]
 
     def get_queryset(self, search_filters, **kwargs):
         type = self.request.GET.get("vaults")
@@ -407,6 +416,7 @@ class VaultCrHistoryView(APIView):
         return Response(response, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_RISK_PREMIUM)
 class VaultsProtectionScoreHistoryView(APIView):
     def get(self, request):
         days_ago = request.GET.get("days_ago")
@@ -431,6 +441,7 @@ class VaultsProtectionScoreHistoryView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_RISK_PREMIUM)
 class VaultProtectionScoreMatrix(APIView):
     def get(self, request, ilk, uid):
         protection_scores = VaultProtectionScore.objects.filter(
@@ -444,6 +455,7 @@ class VaultProtectionScoreMatrix(APIView):
         return Response(protection_scores, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_VAULTS)
 class VaultDebtHistoryView(APIView):
     def get(self, request, ilk, uid):
         vault = get_object_or_404(Vault, uid=uid, ilk=ilk)
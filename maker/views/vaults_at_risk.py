@@ -7,11 +7,15 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from maker.constants import DATASET_OSM, DATASET_VAULTS
 from maker.models import Vault
+from maker.utils.cache import cache_response
 
+from ..modules.osm import TO_NEXT_CHANGE_TIME_BUCKET
 from ..modules.vaults_at_risk import get_vaults_at_risk, get_vaults_at_risk_market
 
 
+@cache_response(DATASET_VAULTS, DATASET_OSM, time_bucket=TO_NEXT_CHANGE_TIME_BUCKET)
 class VaultsAtRiskView(APIView):
     """
     Get vaults at risk
@@ -22,6 +26,7 @@ class VaultsAtRiskView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_VAULTS, DATASET_OSM, time_bucket=TO_NEXT_CHANGE_TIME_BUCKET)
 class VaultsAtRiskMarketView(APIView):
     """
     Get vaults at risk market
@@ -32,6 +37,7 @@ class VaultsAtRiskMarketView(APIView):
         return Response(data, status.HTTP_200_OK)
 
 
+@cache_response(DATASET_VAULTS, DATASET_OSM)
 class VaultsAtRiskCountView(APIView):
     def get(self, request):
         at_risk = (
@@ -139,6 +139,9 @@ class WalletDebtHistoryView(WalletMixin, APIView):
 
 class WalletEventsView(WalletMixin, PaginatedApiView):
     default_order = "-datetime"
+    cursor_pagination = True
+    cursor_ordering_fields = ["datetime"]
+    cursor_tiebreaker = "id"
     ordering_fields = [
         "datetime",
     ]
@@ -7,9 +7,12 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from maker.constants import DATASET_VAULTS
 from maker.models import Ilk, Vault, VaultOwnerGroup
+from maker.utils.cache import stale_while_revalidate
 
 
+@stale_while_revalidate(DATASET_VAULTS, fresh_for=60 * 60)
 class WhalesView(APIView):
     """
     Get whales
@@ -2,9 +2,13 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import json
+
 import pytest
 import responses as responses_
 
+ETH_NODE_STUB_URL = "http://localhost:8545"
+
 
 def pytest_runtest_setup(item):
     responses_.start()
@@ -20,7 +24,67 @@ def pytest_runtest_teardown(item):
         pass
 
 
+@pytest.fixture(autouse=True)
+def clear_block_timestamps_lru():
+    from maker.modules.block import _block_timestamps_lru
+
+    _block_timestamps_lru.clear()
+
+
 @pytest.fixture
 def responses():
     with responses_.RequestsMock() as rsps:
         yield rsps
+
+
+class JSONRPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class JSONRPCStub:
+    """Answers JSON-RPC requests (single and batched) with registered handlers"""
+
+    def __init__(self, rsps, url):
+        self.handlers = {}
+        self.payloads = []
+        rsps.add_callback(responses_.POST, url, callback=self._callback)
+
+    def add(self, method, handler):
+        self.handlers[method] = handler
+
+    def calls(self, method):
+        calls = []
+        for payload in self.payloads:
+            items = payload if isinstance(payload, list) else [payload]
+            calls.extend(item for item in items if item["method"] == method)
+        return calls
+
+    def _dispatch(self, item):
+        try:
+            result = self.handlers[item["method"]](*item["params"])
+        except JSONRPCError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": item["id"],
+                "error": {"code": e.code, "message": e.message},
+            }
+        return {"jsonrpc": "2.0", "id": item["id"], "result": result}
+
+    def _callback(self, request):
+        payload = json.loads(request.body)
+        self.payloads.append(payload)
+        if isinstance(payload, list):
+            body = [self._dispatch(item) for item in payload]
+        else:
+            body = self._dispatch(payload)
+        return (200, {"Content-Type": "application/json"}, json.dumps(body))
+
+
+@pytest.fixture
+def rpc_stub(responses, settings):
+    settings.ETH_NODE = ETH_NODE_STUB_URL
+    settings.ETH_NODE_MAKER = ETH_NODE_STUB_URL
+    return JSONRPCStub(responses, ETH_NODE_STUB_URL)
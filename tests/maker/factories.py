@@ -17,6 +17,10 @@ def _random_string(length):
     return "".join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
 
+def _random_address():
+    return "0x{}".format("".join(random.choices("0123456789abcdef", k=40)))
+
+
 class DAITradeFactory(DjangoModelFactory):
     timestamp = Decimal("1631191736.563")
     datetime = datetime(2021, 9, 9, 12, 48, 56, 563000)
@@ -67,3 +71,14 @@ class SlippagePairFactory(DjangoModelFactory):
 
     class Meta:
         model = "maker.SlippagePair"
+
+
+class MakerAssetFactory(DjangoModelFactory):
+    symbol = factory.Sequence(lambda n: f"ASSET{n}")
+    type = "asset"
+    oracle_address = factory.LazyFunction(_random_address)
+    medianizer_address = factory.LazyFunction(_random_address)
+    is_active = True
+
+    class Meta:
+        model = "maker.MakerAsset"
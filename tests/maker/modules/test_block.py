@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import datetime
+
+import pytest
+
+from maker.models import Block
+from maker.modules.block import BlockResolver, get_block_timestamps
+from maker.utils.blockchain.chain import Blockchain
+from tests.conftest import ETH_NODE_STUB_URL
+
+
+def _add_block_handlers(rpc_stub):
+    # Every block is 12 seconds apart
+    rpc_stub.add("eth_blockNumber", lambda: hex(10000))
+    rpc_stub.add(
+        "eth_getBlockByNumber",
+        lambda block, full: {"timestamp": hex(1600000000 + int(block, 16) * 12)},
+    )
+
+
+class TestBlockResolver:
+    @pytest.mark.django_db
+    def test_get_timestamps_resolves_misses_in_one_batch(self, rpc_stub):
+        _add_block_handlers(rpc_stub)
+        Block.objects.create(
+            block_number=5, timestamp=5, datetime=datetime.fromtimestamp(5)
+        )
+        resolver = BlockResolver(chain=Blockchain(node=ETH_NODE_STUB_URL))
+
+        timestamps = resolver.get_timestamps([5, 6, 7])
+
+        assert timestamps == {5: 5, 6: 1600000072, 7: 1600000084}
+        assert len(rpc_stub.payloads) == 1
+        assert len(rpc_stub.calls("eth_getBlockByNumber")) == 2
+        assert Block.objects.count() == 3
+
+        # Resolved blocks are served from the in-process cache
+        Block.objects.all().delete()
+        assert resolver.get_timestamps([6, 7]) == {6: 1600000072, 7: 1600000084}
+        assert len(rpc_stub.payloads) == 1
+
+    @pytest.mark.django_db
+    def test_get_estimated_timestamps_interpolates_between_anchors(self, rpc_stub):
+        _add_block_handlers(rpc_stub)
+        resolver = BlockResolver(chain=Blockchain(node=ETH_NODE_STUB_URL))
+
+        timestamps = resolver.get_estimated_timestamps([1500, 1700, 2999], step=1000)
+
+        assert timestamps == {
+            1500: 1600018000,
+            1700: 1600020400,
+            2999: 1600035988,
+        }
+        fetched = {
+            int(call["params"][0], 16)
+            for call in rpc_stub.calls("eth_getBlockByNumber")
+        }
+        assert fetched == {1000, 2000, 3000}
+
+
+@pytest.mark.django_db
+def test_get_block_timestamps_returns_timestamps(rpc_stub):
+    _add_block_handlers(rpc_stub)
+    chain = Blockchain(node=ETH_NODE_STUB_URL)
+
+    assert get_block_timestamps([6], chain=chain) == {6: 1600000072}
+    assert get_block_timestamps([1500], chain=chain, estimate=True) == {
+        1500: 1600018000
+    }
+    # Only exactly resolved blocks are stored
+    assert not Block.objects.filter(block_number=1500).exists()
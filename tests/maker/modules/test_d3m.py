@@ -0,0 +1,176 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from django.core.cache import cache
+
+from maker.models import D3M
+from maker.modules.d3m import aave
+from maker.modules.d3m.aave import D3MAaveCompute
+from maker.modules.d3m.compound import D3MCompoundCompute
+from maker.modules.d3m.d3m import get_heatmap, refresh_market_states
+
+
+def _aave_compute():
+    compute = D3MAaveCompute()
+    compute._d3m_model = D3M(balance=Decimal("150000000"))
+    compute._rates = {
+        "borrow_rate": Decimal("0.035"),
+        "total_supply": Decimal("900000000.5"),
+        "total_borrow": Decimal("600000000.25"),
+        "borrow_stable_rate": Decimal("0.11"),
+        "variable_debt": Decimal("590000000.25"),
+        "stable_debt": Decimal("10000000"),
+    }
+    return compute
+
+
+def _compound_compute():
+    compute = D3MCompoundCompute()
+    compute._d3m_model = D3M(balance=Decimal("50000000"))
+    compute._rates = {
+        "total_supply": Decimal("500000000.5"),
+        "total_borrow": Decimal("350000000.25"),
+        "borrow_rate": Decimal("0.04"),
+        "supply_rate": Decimal("0.025"),
+        "supply_rate_reward": Decimal("0.025"),
+        "comp_price": Decimal("45"),
+        "comp_supply_rewards_per_year": Decimal("100000"),
+    }
+    return compute
+
+
+class TestD3MCompute:
+    @pytest.mark.parametrize("compute", [_aave_compute(), _compound_compute()])
+    def test_curve_lookups_match_scanning_the_curve(self, compute):
+        curve = compute.dai_curve
+        for value in ["0", "0.01", "0.0312", "0.04", "0.1", "0.35", "0.5"]:
+            value = Decimal(value)
+            expected = [
+                point["utilization_rate"]
+                for point in curve
+                if point["borrow_rate"] <= value
+            ][-1]
+            assert compute.get_utilization_rate_gte(value) == expected
+
+        for value in ["0", "0.00005", "0.5", "0.80001", "0.9999", "1"]:
+            value = Decimal(value)
+            expected = [
+                point["borrow_rate"]
+                for point in curve
+                if point["utilization_rate"] >= value
+            ][0]
+            assert compute.get_borrow_rate_gte(value) == expected
+
+    @pytest.mark.parametrize("compute", [_aave_compute(), _compound_compute()])
+    @pytest.mark.parametrize("heatmap", [True, False])
+    def test_vectorized_metrics_match_compute_metrics(self, compute, heatmap):
+        target_borrow_rates = [Decimal("0"), Decimal("0.02"), Decimal("0.05")]
+        d3m_dcs = [Decimal("100000000"), Decimal("400000000")]
+
+        grid = compute.compute_metrics_vectorized(
+            np.array(target_borrow_rates, dtype=float)[:, None],
+            np.array(d3m_dcs, dtype=float)[None, :],
+            heatmap=heatmap,
+        )
+        for i, target_borrow_rate in enumerate(target_borrow_rates):
+            for j, d3m_dc in enumerate(d3m_dcs):
+                metrics = compute.compute_metrics(
+                    target_borrow_rate, d3m_dc, heatmap=heatmap
+                )
+                for key, value in metrics.items():
+                    assert grid[key][i, j] == pytest.approx(
+                        float(value), rel=1e-9, abs=1e-6
+                    ), key
+
+
+class TestD3MHeatmap:
+    def test_heatmap_matches_compute_metrics(self):
+        compute = _aave_compute()
+        data = get_heatmap(
+            compute,
+            [100000000, 200000000, 300000000],
+            [0.02, 0.03],
+            metrics=["d3m_exposure_total", "simulation_borrow_rate"],
+        )
+
+        assert data["debt_ceilings"] == [100000000, 200000000, 300000000]
+        assert data["target_borrow_rates"] == [0.02, 0.03]
+        assert list(data["metrics"].keys()) == [
+            "d3m_exposure_total",
+            "simulation_borrow_rate",
+        ]
+        # One row per target borrow rate
+        assert len(data["metrics"]["d3m_exposure_total"]) == 2
+        assert len(data["metrics"]["d3m_exposure_total"][0]) == 3
+
+        metrics = compute.compute_metrics(
+            Decimal("0.03"), Decimal("200000000"), heatmap=True
+        )
+        assert data["metrics"]["d3m_exposure_total"][1][1] == pytest.approx(
+            float(metrics["d3m_exposure_total"])
+        )
+        assert data["metrics"]["simulation_borrow_rate"][1][1] == pytest.approx(
+            float(metrics["simulation_borrow_rate"])
+        )
+
+    def test_unknown_metric(self):
+        with pytest.raises(KeyError):
+            get_heatmap(_aave_compute(), [1], [0.02], metrics=["unknown"])
+
+
+class TestMarketState:
+    @pytest.fixture(autouse=True)
+    def locmem_cache(self, settings):
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        cache.clear()
+
+    def test_refresh_saves_state_per_block_and_readers_use_it(self, monkeypatch):
+        latest_block = [100]
+        monkeypatch.setattr(
+            "maker.modules.d3m.d3m.Blockchain.get_latest_block",
+            lambda self: latest_block[0],
+        )
+        fetched = []
+
+        def fetch(block_number):
+            fetched.append(block_number)
+            return {
+                "block_number": block_number,
+                "balance": Decimal("150000000"),
+                "market": {
+                    "borrow_rate": Decimal("0.035"),
+                    "total_supply": Decimal("900000000.5"),
+                    "total_borrow": Decimal("600000000.25"),
+                    "borrow_stable_rate": Decimal("0.11"),
+                    "variable_debt": Decimal("590000000.25"),
+                    "stable_debt": Decimal("10000000"),
+                },
+            }
+
+        monkeypatch.setattr(
+            "maker.modules.d3m.d3m.MARKET_STATE_FETCHERS", {"aave": fetch}
+        )
+
+        refresh_market_states()
+        # Nothing changed until the next block
+        refresh_market_states()
+        assert fetched == [100]
+        latest_block[0] = 101
+        refresh_market_states()
+        assert fetched == [100, 101]
+
+        def fail(block_number):
+            raise AssertionError("Node shouldn't be called")
+
+        monkeypatch.setattr("maker.modules.d3m.aave.fetch_market_state", fail)
+        state = aave.get_cached_market_state()
+        assert state["block_number"] == 101
+        compute = D3MAaveCompute()
+        assert compute.get_rates()["total_borrow"] == Decimal("600000000.25")
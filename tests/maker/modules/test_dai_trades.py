@@ -2,13 +2,21 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 import pytest
+from django.core.cache import cache
 
-from maker.models import DAITrade
-from maker.modules.dai_trades import DAITradesFetcher
+from maker.models import DAITrade, DAITradeMinute
+from maker.modules.dai_trades import (
+    DAITradesFetcher,
+    get_stats,
+    rebuild_dai_trade_minutes,
+    trade_data_for_last_day,
+    trade_volume_data,
+)
 from tests.maker.factories import DAITradeFactory
 
 
@@ -164,3 +172,171 @@ class TestDAITradesFetcher:
         assert trades[0].price == Decimal("1.000053")
         assert trades[0].dai_amount == Decimal("43.28412")
         assert trades[0].dai_price == Decimal("1.000053")
+
+    @pytest.mark.django_db
+    def test_fetch_in_chunks_prices_both_pair_sides(self, responses, monkeypatch):
+        body = (
+            "timestamp,pair,exchange,amount,price\n"
+            "1631191736.563,DAI-USDC,kraken,100,1.001\n"
+            "1631191736.962,DAI-USDC,kraken,0.5,1.001\n"
+            "1631191843.001,WETH-DAI,uniswap,1,3419.5\n"
+            "1631191859.999,DAI-USD,coinbase,10,1.0001\n"
+        )
+        responses.add(
+            responses.GET,
+            "https://dai.stablecoin.science/data/combined-DAI-trades-30d.csv",
+            status=200,
+            body=body,
+        )
+        monkeypatch.setattr("maker.modules.dai_trades.DAI_TRADES_CHUNK_SIZE", 2)
+
+        fetcher = DAITradesFetcher()
+        monkeypatch.setattr(
+            fetcher,
+            "_usd_prices",
+            {
+                "ETH": {1631191800: Decimal("3420")},
+                "USDC": {1631191680: Decimal("0.999")},
+            },
+        )
+        fetcher.fetch()
+
+        trades = DAITrade.objects.all().order_by("id")
+        assert [trade.pair for trade in trades] == ["DAI-USDC", "WETH-DAI", "DAI-USD"]
+        assert trades[0].dai_price == Decimal("0.999999")
+        assert trades[0].dai_amount == Decimal("100")
+        assert trades[1].dai_price == Decimal("1.000146220207632695")
+        assert trades[1].dai_amount == Decimal("3419.5")
+        assert trades[2].datetime == datetime(2021, 9, 9, 12, 50, 59, 999000)
+
+
+class TestDAITradesIncrementalFetch:
+    URL = "https://dai.stablecoin.science/data/combined-DAI-trades-30d.csv"
+    BODY = (
+        "timestamp,pair,exchange,amount,price\n"
+        "1631191736.563,DAI-USD,coinbase,43.2841200000000,1.000053000000000000\n"
+        "1631191736.962,DAI-USD,coinbase,114.736600000000,1.000058000000000000\n"
+    )
+    NEW_ROWS = "1631191843.001,DAI-USD,coinbase,17.1307800000000,1.000053000000000000\n"
+
+    @pytest.fixture(autouse=True)
+    def locmem_cache(self, settings):
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        cache.clear()
+
+    def _fetch(self, responses, callback):
+        requests = []
+
+        def handler(request):
+            requests.append(request.headers)
+            return callback(request)
+
+        responses.add_callback(responses.GET, self.URL, callback=handler)
+        DAITradesFetcher().fetch(incremental=True)
+        responses.reset()
+        return requests
+
+    @pytest.mark.django_db
+    def test_skips_unchanged_file_and_fetches_only_new_bytes(self, responses):
+        requests = self._fetch(
+            responses, lambda request: (200, {"ETag": '"v1"'}, self.BODY)
+        )
+        assert "If-None-Match" not in requests[0]
+        assert DAITrade.objects.count() == 2
+
+        requests = self._fetch(responses, lambda request: (304, {}, ""))
+        assert requests[0]["If-None-Match"] == '"v1"'
+        assert requests[0]["Range"] == "bytes=0-"
+        assert DAITrade.objects.count() == 2
+
+        body = self.BODY + self.NEW_ROWS
+        requests = self._fetch(
+            responses, lambda request: (206, {"ETag": '"v2"'}, body.encode())
+        )
+        assert DAITrade.objects.count() == 3
+        assert DAITrade.objects.latest("timestamp").timestamp == Decimal(
+            "1631191843.001"
+        )
+
+        # Next range starts at the tail of the last download
+        requests = self._fetch(responses, lambda request: (304, {}, ""))
+        assert requests[0]["If-None-Match"] == '"v2"'
+        assert requests[0]["Range"] == "bytes=0-"
+
+    @pytest.mark.django_db
+    def test_rewritten_file_is_fetched_whole(self, responses, monkeypatch):
+        monkeypatch.setattr("maker.modules.dai_trades.DAI_TRADES_TAIL_BYTES", 20)
+        self._fetch(responses, lambda request: (200, {"ETag": '"v1"'}, self.BODY))
+
+        body = "timestamp,pair,exchange,amount,price\n" + self.NEW_ROWS
+
+        def callback(request):
+            if "Range" in request.headers:
+                return (206, {"ETag": '"v2"'}, body[len(body) - 20 :])
+            return (200, {"ETag": '"v2"'}, body)
+
+        requests = self._fetch(responses, callback)
+        assert requests[0]["Range"] == "bytes={}-".format(len(self.BODY) - 20)
+        assert "Range" not in requests[1]
+        assert DAITrade.objects.count() == 3
+
+
+class TestDAITradeMinutes:
+    @pytest.mark.django_db
+    def test_minutes_are_updated_at_ingest_and_match_trades(
+        self, responses, monkeypatch
+    ):
+        minute = datetime.now().replace(second=0, microsecond=0) - timedelta(hours=1)
+        timestamp = int(minute.timestamp())
+        body = (
+            "timestamp,pair,exchange,amount,price\n"
+            f"{timestamp}.563,DAI-USD,coinbase,43.2841200000000,1.0005\n"
+            f"{timestamp}.962,DAI-USD,coinbase,114.736600000000,1.0015\n"
+            f"{timestamp + 7}.001,DAI-USD,coinbase,17.1307800000000,1.0011\n"
+            f"{timestamp + 7}.17,DAI-USD,kraken,10,0.999\n"
+        )
+        responses.add(
+            responses.GET,
+            "https://dai.stablecoin.science/data/combined-DAI-trades-30d.csv",
+            status=200,
+            body=body,
+        )
+        # Trades of the same minute are split between chunks
+        monkeypatch.setattr("maker.modules.dai_trades.DAI_TRADES_CHUNK_SIZE", 2)
+        DAITradesFetcher().fetch()
+
+        minutes = DAITradeMinute.objects.order_by("exchange", "price_bucket")
+        assert [
+            (minute.exchange, minute.price_bucket, minute.count) for minute in minutes
+        ] == [
+            ("coinbase", Decimal("1.000"), 1),
+            ("coinbase", Decimal("1.001"), 1),
+            ("coinbase", Decimal("1.002"), 1),
+            ("kraken", Decimal("0.999"), 1),
+        ]
+        ingested = list(minutes.values_list("exchange", "price_bucket", "amount"))
+        rebuild_dai_trade_minutes()
+        assert (
+            list(minutes.values_list("exchange", "price_bucket", "amount")) == ingested
+        )
+
+        # Buckets match round(dai_price, 3) of the trades
+        expected = defaultdict(Decimal)
+        for trade in DAITrade.objects.all():
+            expected[round(trade.dai_price, 3)] += trade.dai_amount
+        assert trade_volume_data() == [
+            {"price": price, "amount": amount}
+            for price, amount in sorted(expected.items())
+        ]
+
+        stats = get_stats()["last_24h"]
+        assert stats["max"] == Decimal("1.0015")
+        assert stats["min"] == Decimal("0.999")
+        assert stats["avg"] == Decimal("1.000525")
+        assert stats["amount_total"] == Decimal("185.1515")
+
+        data = trade_data_for_last_day()
+        assert [trade["dt"] for trade in data["trades"]] == [minute]
+        assert data["trades"][0]["amount_total"] == Decimal("185.1515")
@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from maker.constants import (
+    DRAWDOWN_SOURCE_OHLCV,
+    DRAWDOWN_SOURCE_OSM,
+    OHLCV_TYPE_HOURLY,
+)
+from maker.models import OHLCV, OSM, DrawdownHistogram, OHLCVPair
+from maker.modules.drawdowns import (
+    get_drawdown_histogram,
+    get_drawdown_timestamps,
+    update_drawdown_histograms,
+)
+from tests.maker.factories import MakerAssetFactory
+
+
+def _ohlcv(pair, dt, drawdown_hl, drawdown=-3):
+    return OHLCV(
+        pair=pair,
+        ohlcv_type=pair.ohlcv_type,
+        timestamp=int(dt.timestamp()),
+        datetime=dt,
+        close=1,
+        open=1,
+        volume_to=1,
+        volume_usd=1,
+        drawdown=drawdown,
+        drawdown_hl=Decimal(drawdown_hl),
+    )
+
+
+@pytest.fixture
+def eth_pair():
+    return OHLCVPair.objects.create(
+        from_asset_symbol="ETH",
+        to_asset_symbol="USD",
+        exchange="Coinbase",
+        ohlcv_type=OHLCV_TYPE_HOURLY,
+    )
+
+
+class TestDrawdownHistograms:
+    @pytest.mark.django_db
+    def test_ohlcv_histogram_is_updated_incrementally(self, eth_pair):
+        OHLCV.objects.bulk_create(
+            [
+                _ohlcv(eth_pair, datetime(2022, 1, 1, 1), "-4.1"),
+                _ohlcv(eth_pair, datetime(2022, 1, 1, 2), "-6"),
+                # Not a drawdown
+                _ohlcv(eth_pair, datetime(2022, 1, 1, 3), "-20", drawdown=-1),
+                _ohlcv(eth_pair, datetime(2022, 1, 2, 1), "-11"),
+                # Below the visible range
+                _ohlcv(eth_pair, datetime(2022, 1, 2, 2), "-90"),
+            ]
+        )
+        update_drawdown_histograms()
+
+        assert get_drawdown_histogram(
+            DRAWDOWN_SOURCE_OHLCV, "ETH", OHLCV_TYPE_HOURLY
+        ) == {-5: 2, -10: 1}
+
+        _ohlcv(eth_pair, datetime(2022, 1, 2, 5), "-9").save()
+        update_drawdown_histograms()
+
+        assert get_drawdown_histogram(
+            DRAWDOWN_SOURCE_OHLCV, "ETH", OHLCV_TYPE_HOURLY
+        ) == {-5: 2, -10: 2}
+        # Only the day with new rows was recomputed
+        assert (
+            DrawdownHistogram.objects.filter(date=date(2022, 1, 1))
+            .values("modified")
+            .distinct()
+            .count()
+            == 1
+        )
+        assert DrawdownHistogram.objects.filter(date=date(2022, 1, 2)).count() == 2
+
+        assert get_drawdown_timestamps(
+            DRAWDOWN_SOURCE_OHLCV, "ETH", OHLCV_TYPE_HOURLY
+        ) == {
+            "start_timestamp": int(datetime(2022, 1, 1, 1).timestamp()),
+            "end_timestamp": int(datetime(2022, 1, 2, 5).timestamp()),
+        }
+        # The first day is only partially counted
+        assert get_drawdown_histogram(
+            DRAWDOWN_SOURCE_OHLCV,
+            "ETH",
+            OHLCV_TYPE_HOURLY,
+            since_timestamp=int(datetime(2022, 1, 1, 2).timestamp()),
+        ) == {-5: 1, -10: 2}
+
+    @pytest.mark.django_db
+    def test_osm_histogram(self):
+        MakerAssetFactory(symbol="LINK")
+        OSM.objects.bulk_create(
+            [
+                OSM(
+                    symbol="LINK",
+                    current_price=Decimal(current_price),
+                    next_price=Decimal(next_price),
+                    block_number=idx,
+                    datetime=datetime(2022, 1, 1, idx),
+                )
+                for idx, (current_price, next_price) in enumerate(
+                    [("100", "97"), ("97", "96"), ("96", "83"), ("83", "85")]
+                )
+            ]
+        )
+
+        update_drawdown_histograms()
+
+        assert get_drawdown_histogram(
+            DRAWDOWN_SOURCE_OSM, "LINK", OHLCV_TYPE_HOURLY, min_bucket=None
+        ) == {-5: 1, -15: 1}
@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from maker.constants import (
+    INGESTION_CHUNK_STATUS_DONE,
+    INGESTION_CHUNK_STATUS_FAILED,
+    INGESTION_CHUNK_STATUS_RUNNING,
+)
+from maker.models import IngestionChunk
+from maker.modules import ingestion
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    calls = []
+
+    def handler(key, from_block, to_block):
+        if from_block == 666:
+            raise ValueError("boom")
+        calls.append((key, from_block, to_block))
+
+    monkeypatch.setitem(ingestion.INGESTION_HANDLERS, "test", handler)
+    return calls
+
+
+class TestIngestionRunner:
+    @pytest.mark.django_db
+    def test_plan_chunks_splits_range_and_is_idempotent(self, processed):
+        ingestion.plan_chunks("test", 100, 349, key="ETH", chunk_size=100)
+        ingestion.plan_chunks("test", 100, 349, key="ETH", chunk_size=100)
+
+        chunks = IngestionChunk.objects.filter(stream="test", key="ETH")
+        assert list(chunks.values_list("from_block", "to_block")) == [
+            (100, 199),
+            (200, 299),
+            (300, 349),
+        ]
+
+    @pytest.mark.django_db
+    def test_process_chunks_and_cursor(self, processed):
+        ingestion.plan_chunks("test", 0, 299, chunk_size=100)
+        chunk_ids = ingestion.get_runnable_chunk_ids(stream="test")
+
+        assert ingestion.process_chunk(chunk_ids[0]) is True
+        assert ingestion.process_chunk(chunk_ids[2]) is True
+        # Already done chunks are not processed again
+        assert ingestion.process_chunk(chunk_ids[0]) is False
+
+        assert processed == [("", 0, 99), ("", 200, 299)]
+        assert IngestionChunk.objects.cursor("test") == 99
+        assert ingestion.get_runnable_chunk_ids(stream="test") == [chunk_ids[1]]
+
+        ingestion.process_chunk(chunk_ids[1])
+        assert IngestionChunk.objects.cursor("test") == 299
+
+    @pytest.mark.django_db
+    def test_failed_and_stale_chunks_are_resumed(self, processed):
+        ingestion.plan_chunks("test", 666, 865, chunk_size=100)
+        failing_id, stale_id = ingestion.get_runnable_chunk_ids(stream="test")
+
+        with pytest.raises(ValueError):
+            ingestion.process_chunk(failing_id)
+        failing = IngestionChunk.objects.get(id=failing_id)
+        assert failing.status == INGESTION_CHUNK_STATUS_FAILED
+        assert failing.error == "boom"
+
+        # Simulate a worker that died while processing the chunk
+        IngestionChunk.objects.filter(id=stale_id).update(
+            status=INGESTION_CHUNK_STATUS_RUNNING, modified=datetime.now()
+        )
+        assert ingestion.get_runnable_chunk_ids(stream="test") == [failing_id]
+
+        IngestionChunk.objects.filter(id=stale_id).update(
+            modified=datetime.now()
+            - timedelta(seconds=ingestion.STALE_CHUNK_SECONDS + 1)
+        )
+        assert ingestion.get_runnable_chunk_ids(stream="test") == [
+            failing_id,
+            stale_id,
+        ]
+        assert ingestion.process_chunk(stale_id) is True
+        stale = IngestionChunk.objects.get(id=stale_id)
+        assert stale.status == INGESTION_CHUNK_STATUS_DONE
+        assert stale.attempts == 1
+
+    @pytest.mark.django_db
+    def test_resume_block_waits_for_pending_chunks(self, processed):
+        assert IngestionChunk.objects.resume_block("test", 1000) == 1000
+
+        ingestion.plan_chunks("test", 0, 299, chunk_size=100)
+        chunk_ids = ingestion.get_runnable_chunk_ids(stream="test")
+        assert IngestionChunk.objects.resume_block("test", 1000) == -1
+        assert IngestionChunk.objects.resume_block("test", None) == -1
+
+        # The last chunk finishing first doesn't move the resume point past the
+        # chunks that haven't run yet
+        ingestion.process_chunk(chunk_ids[0])
+        ingestion.process_chunk(chunk_ids[2])
+        assert IngestionChunk.objects.resume_block("test", 299) == 99
+
+        ingestion.process_chunk(chunk_ids[1])
+        assert IngestionChunk.objects.resume_block("test", 1000) == 1000
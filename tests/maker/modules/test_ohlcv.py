@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import math
+import random
+import statistics
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from maker.constants import OHLCV_TYPE_HOURLY
+from maker.models import OHLCV, OHLCVPair
+from maker.modules.ohlcv import (
+    _save_asset_pair_ohlcv,
+    calculate_volatility,
+    calculate_volatility_history,
+    get_ohlcv_pairs_sync_order,
+)
+
+
+def _pair(from_symbol, to_symbol, exchange="Coinbase", is_stable=True):
+    return OHLCVPair.objects.create(
+        from_asset_symbol=from_symbol,
+        to_asset_symbol=to_symbol,
+        exchange=exchange,
+        ohlcv_type=OHLCV_TYPE_HOURLY,
+        to_asset_is_stable=is_stable,
+        is_active=True,
+    )
+
+
+def _candle(timestamp, volume_to):
+    return {
+        "time": timestamp,
+        "close": 1,
+        "high": 1,
+        "low": 1,
+        "open": 1,
+        "volumefrom": 1,
+        "volumeto": volume_to,
+    }
+
+
+class TestSaveAssetPairOHLCV:
+    @pytest.mark.django_db
+    def test_volume_usd_is_converted_in_bulk(self, django_assert_max_num_queries):
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        timestamps = [
+            int((now - timedelta(hours=hours)).timestamp()) for hours in range(5)
+        ]
+        for exchange, offset in [("Coinbase", 0), ("Kraken", 2)]:
+            conversion_pair = _pair("ETH", "USD", exchange=exchange)
+            OHLCV.objects.bulk_create(
+                [
+                    OHLCV(
+                        pair=conversion_pair,
+                        ohlcv_type=OHLCV_TYPE_HOURLY,
+                        timestamp=timestamp,
+                        datetime=datetime.fromtimestamp(timestamp),
+                        close=Decimal(1000 + idx * 10 + offset),
+                        open=1,
+                        volume_to=1,
+                        volume_usd=1,
+                    )
+                    # The oldest candle has no conversion price
+                    for idx, timestamp in enumerate(timestamps[:-1])
+                ]
+            )
+        pair = _pair("LINK", "ETH", exchange="Unknown", is_stable=False)
+
+        with django_assert_max_num_queries(6):
+            _save_asset_pair_ohlcv(
+                pair, [_candle(timestamp, 2) for timestamp in timestamps], 90
+            )
+
+        volumes = dict(
+            OHLCV.objects.filter(pair=pair).values_list("timestamp", "volume_usd")
+        )
+        # Unknown exchanges get a haircut of 100
+        assert volumes == {
+            timestamp: Decimal(2 * (1001 + idx * 10) * 100)
+            for idx, timestamp in enumerate(timestamps[:-1])
+        }
+
+
+class TestOHLCVPairsSyncOrder:
+    @pytest.mark.django_db
+    def test_conversion_pairs_are_grouped_with_dependent_pairs(self):
+        eth_usd = _pair("ETH", "USD")
+        btc_usd = _pair("BTC", "USD")
+        link_usd = _pair("LINK", "USD")
+        link_eth = _pair("LINK", "ETH", is_stable=False)
+        link_btc = _pair("LINK", "BTC", is_stable=False)
+        yfi_eth = _pair("YFI", "ETH", is_stable=False)
+
+        independent, groups = get_ohlcv_pairs_sync_order(
+            OHLCVPair.objects.order_by("id")
+        )
+
+        assert independent == [link_usd.id]
+        assert groups == [
+            ([btc_usd.id], [link_btc.id]),
+            ([eth_usd.id], [link_eth.id, yfi_eth.id]),
+        ]
+
+
+class TestVolatility:
+    @pytest.fixture
+    def pair(self):
+        pair = _pair("ETH", "USD")
+        rng = random.Random(42)
+        start = datetime(2022, 1, 1)
+        OHLCV.objects.bulk_create(
+            [
+                OHLCV(
+                    pair=pair,
+                    ohlcv_type=OHLCV_TYPE_HOURLY,
+                    timestamp=int((start + timedelta(hours=hour)).timestamp()),
+                    datetime=start + timedelta(hours=hour),
+                    close=1,
+                    open=1,
+                    volume_to=1,
+                    volume_usd=1,
+                    drawdown=Decimal(str(round(rng.gauss(0, 2), 3))),
+                )
+                # Skip a few days to have gaps in the history
+                for hour in range(24 * 40)
+                if not 10 * 24 <= hour < 13 * 24
+            ]
+        )
+        return pair
+
+    @pytest.mark.django_db
+    def test_calculate_volatility_matches_pstdev(self, pair):
+        for_date = date(2022, 1, 20)
+        drawdowns = OHLCV.objects.filter(
+            pair=pair,
+            datetime__gte=for_date - timedelta(days=10),
+            datetime__date__lte=for_date,
+        ).values_list("drawdown", flat=True)
+        expected = statistics.pstdev(drawdowns) * Decimal(math.sqrt(24))
+
+        volatility = calculate_volatility(pair, trailing_days=10, for_date=for_date)
+
+        assert volatility == pytest.approx(expected, rel=Decimal("1e-9"))
+
+    @pytest.mark.django_db
+    def test_volatility_history_matches_daily_calculation(self, pair):
+        history = calculate_volatility_history(
+            pair, date(2021, 12, 30), date(2022, 2, 15), trailing_days=10
+        )
+
+        # Dates without any drawdowns in their window are skipped
+        assert min(history) == date(2022, 1, 1)
+        assert max(history) == date(2022, 2, 15)
+        for for_date, volatility in history.items():
+            assert volatility == pytest.approx(
+                calculate_volatility(pair, trailing_days=10, for_date=for_date),
+                rel=Decimal("1e-9"),
+            )
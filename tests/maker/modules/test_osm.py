@@ -0,0 +1,185 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from maker.models import OSM, Block, Medianizer, OSMDaily
+from maker.modules.osm import (
+    save_medianizer_prices_for_assets,
+    save_osm_daily,
+    save_osm_for_asset,
+)
+from maker.utils.utils import date_to_timestamp
+from tests.maker.factories import MakerAssetFactory
+
+
+def _storage_value(price):
+    # OSM stores the price in the lower 128 bits of the slot
+    return "0x" + "1".zfill(32) + hex(int(price * 10**18))[2:].zfill(32)
+
+
+def _log(block_number, address="0x" + "0" * 40):
+    return {
+        "address": address,
+        "blockHash": "0x" + "0" * 64,
+        "blockNumber": hex(block_number),
+        "data": "0x",
+        "logIndex": "0x0",
+        "removed": False,
+        "topics": [],
+        "transactionHash": "0x" + "0" * 64,
+        "transactionIndex": "0x0",
+    }
+
+
+class TestSaveOSMForAsset:
+    @pytest.mark.django_db
+    def test_reads_prices_and_blocks_in_batches(self, rpc_stub):
+        asset = MakerAssetFactory(symbol="ETH")
+        Block.objects.create(
+            block_number=101,
+            timestamp=1000101,
+            datetime=datetime.fromtimestamp(1000101),
+        )
+
+        rpc_stub.add("eth_getLogs", lambda filters: [_log(102), _log(101), _log(103)])
+        rpc_stub.add(
+            "eth_getStorageAt",
+            lambda address, slot, block: _storage_value(
+                Decimal(int(block, 16)) + (Decimal("0.5") if slot == "0x4" else 0)
+            ),
+        )
+        rpc_stub.add(
+            "eth_getBlockByNumber",
+            lambda block, full: {"timestamp": hex(1000000 + int(block, 16))},
+        )
+
+        save_osm_for_asset(asset.symbol, last_block=100, to_block=200)
+
+        osms = list(OSM.objects.filter(symbol="ETH").order_by("block_number"))
+        assert [osm.block_number for osm in osms] == [101, 102, 103]
+        assert [osm.current_price for osm in osms] == [101, 102, 103]
+        assert osms[0].next_price == Decimal("101.5")
+        assert [osm.timestamp for osm in osms] == [1000101, 1000102, 1000103]
+        assert Block.objects.count() == 3
+
+        # Only blocks missing in the DB are requested from the node
+        assert len(rpc_stub.calls("eth_getBlockByNumber")) == 2
+        assert len(rpc_stub.calls("eth_getStorageAt")) == 6
+        # Storage slots and blocks are fetched with a single batch each
+        assert len([p for p in rpc_stub.payloads if isinstance(p, list)]) == 2
+
+
+class TestSaveMedianizerPricesForAssets:
+    @pytest.mark.django_db
+    def test_reads_prices_for_all_assets_in_one_batch(self, rpc_stub):
+        eth = MakerAssetFactory(symbol="ETH")
+        btc = MakerAssetFactory(symbol="WBTC")
+        prices = {eth.medianizer_address: 1000, btc.medianizer_address: 20000}
+
+        rpc_stub.add(
+            "eth_getLogs",
+            lambda filters: [
+                _log(101, eth.medianizer_address),
+                _log(101, btc.medianizer_address),
+                _log(105, btc.medianizer_address),
+                _log(110, eth.medianizer_address),
+            ],
+        )
+        rpc_stub.add(
+            "eth_getStorageAt",
+            lambda address, slot, block: _storage_value(
+                Decimal(prices[address.lower()] + int(block, 16))
+            ),
+        )
+        rpc_stub.add(
+            "eth_getBlockByNumber",
+            lambda block, full: {"timestamp": hex(1000000 + int(block, 16))},
+        )
+
+        save_medianizer_prices_for_assets(
+            [eth, btc], {"ETH": 100, "WBTC": 102}, to_block=200
+        )
+
+        medianizers = Medianizer.objects.order_by("symbol", "block_number")
+        assert [(m.symbol, m.block_number, m.price) for m in medianizers] == [
+            ("ETH", 101, Decimal("1101")),
+            ("ETH", 110, Decimal("1110")),
+            ("WBTC", 105, Decimal("20105")),
+        ]
+        assert medianizers[0].timestamp == 1000101
+        # One log scan for both medianizers
+        assert len(rpc_stub.calls("eth_getLogs")) == 1
+        assert len(rpc_stub.calls("eth_getStorageAt")) == 3
+
+
+def _osm(symbol, dt, current_price, next_price):
+    return OSM(
+        symbol=symbol,
+        current_price=Decimal(current_price),
+        next_price=Decimal(next_price),
+        block_number=int(dt.timestamp()),
+        timestamp=int(dt.timestamp()),
+        datetime=dt,
+    )
+
+
+class TestSaveOSMDaily:
+    @pytest.mark.django_db
+    def test_saves_missing_days(self):
+        MakerAssetFactory(symbol="ETH")
+        OSMDaily.objects.create(
+            symbol="ETH",
+            date=date(2022, 1, 1),
+            timestamp=date_to_timestamp(date(2022, 1, 1)),
+            open=1,
+            close=1,
+            drawdown=0,
+            daily_low=1,
+            daily_high=1,
+            greatest_drop=0,
+            drop_start=1,
+            drop_end=1,
+        )
+        OSM.objects.bulk_create(
+            [
+                # Already processed day
+                _osm("ETH", datetime(2022, 1, 1, 1), 10, 1),
+                _osm("ETH", datetime(2022, 1, 1, 2), 1, 10),
+                _osm("ETH", datetime(2022, 1, 2, 1), 100, 110),
+                _osm("ETH", datetime(2022, 1, 2, 2), 110, 90),
+                _osm("ETH", datetime(2022, 1, 2, 3), 90, 95),
+                # Single update during the day
+                _osm("ETH", datetime(2022, 1, 3, 1), 95, 80),
+                # No drop during the day
+                _osm("ETH", datetime(2022, 1, 4, 1), 100, 101),
+                _osm("ETH", datetime(2022, 1, 4, 2), 101, 102),
+            ]
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            save_osm_daily()
+
+        # The whole missing range is loaded with a single query
+        osm_queries = [
+            query for query in context.captured_queries if '"maker_osm"' in query["sql"]
+        ]
+        assert len(osm_queries) == 1
+
+        dailies = list(OSMDaily.objects.filter(symbol="ETH").order_by("date"))
+        assert [daily.date for daily in dailies] == [date(2022, 1, 1), date(2022, 1, 2)]
+        daily = dailies[1]
+        assert daily.open == Decimal("100")
+        assert daily.close == Decimal("95")
+        assert daily.drawdown == Decimal("-5")
+        assert daily.daily_low == Decimal("90")
+        assert daily.daily_high == Decimal("110")
+        assert daily.greatest_drop == Decimal("-18.18")
+        assert daily.drop_start == Decimal("110")
+        assert daily.drop_end == Decimal("90")
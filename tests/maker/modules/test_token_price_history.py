@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from decimal import Decimal
+
+import pytest
+
+from maker.models import TokenPriceHistory
+from maker.modules import token_price_history
+from tests.maker.factories import AssetFactory
+
+
+def _proxy_round(phase, aggregator_round):
+    return phase << 64 | aggregator_round
+
+
+@pytest.fixture
+def chainlink(monkeypatch):
+    aggregators = {1: "0xaggregator1", 2: "0xaggregator2"}
+    latest_rounds = {"0xaggregator1": 5, "0xaggregator2": 2}
+    fetched = []
+
+    def get_price_history(underlying_address, rounds, chain=None):
+        fetched.append(list(rounds))
+        # Answers are in ETH with 18 decimals and timestamps grow with every round
+        return {
+            round_id: (
+                round_id,
+                10**17,
+                0,
+                1000 + (round_id >> 64) * 100 + (round_id & 0xFFFF),
+                round_id,
+            )
+            for round_id in rounds
+        }
+
+    monkeypatch.setattr(
+        token_price_history, "get_token_phase_id", lambda *a, **kw: {"id": 2}
+    )
+    monkeypatch.setattr(
+        token_price_history,
+        "get_token_aggregator",
+        lambda address, phase, chain=None: {"address": aggregators[phase]},
+    )
+    monkeypatch.setattr(
+        token_price_history,
+        "get_token_aggregators",
+        lambda address, phase, chain=None: aggregators,
+    )
+    monkeypatch.setattr(
+        token_price_history,
+        "get_latest_round",
+        lambda address, chain=None: latest_rounds[address],
+    )
+    monkeypatch.setattr(
+        token_price_history, "get_token_decimals", lambda *a, **kw: {"number": 18}
+    )
+    monkeypatch.setattr(token_price_history, "get_price_history", get_price_history)
+    monkeypatch.setattr(token_price_history, "ROUNDS_CHUNK_SIZE", 2)
+    return fetched
+
+
+class TestSyncTokenRounds:
+    @pytest.mark.django_db
+    def test_saves_new_rounds_across_phases_in_usd(self, chainlink):
+        token = AssetFactory(symbol="YFI", underlying_symbol="YFI")
+        TokenPriceHistory.objects.create(
+            underlying_symbol="YFI",
+            underlying_address=token.address,
+            price=Decimal("100"),
+            timestamp=1103,
+            round_id=str(_proxy_round(1, 3)),
+        )
+        for timestamp, price in [(1000, 1000), (1104, 2000), (1150, 3000)]:
+            TokenPriceHistory.objects.create(
+                underlying_symbol="ETH",
+                underlying_address="0xeth",
+                price=Decimal(price),
+                timestamp=timestamp,
+                round_id=str(timestamp),
+            )
+
+        token_price_history.sync_token_rounds(token, convert_to_usd=True)
+
+        expected_rounds = [
+            _proxy_round(1, 4),
+            _proxy_round(1, 5),
+            _proxy_round(2, 1),
+            _proxy_round(2, 2),
+        ]
+        assert chainlink == [expected_rounds[:2], expected_rounds[2:]]
+        prices = dict(
+            TokenPriceHistory.objects.filter(underlying_symbol="YFI").values_list(
+                "timestamp", "price"
+            )
+        )
+        assert prices == {
+            1103: Decimal("100"),
+            1104: Decimal("200"),
+            1105: Decimal("200"),
+            1201: Decimal("300"),
+            1202: Decimal("300"),
+        }
+
+    @pytest.mark.django_db
+    def test_missing_eth_price_raises(self, chainlink):
+        token = AssetFactory(symbol="YFI", underlying_symbol="YFI")
+
+        with pytest.raises(TokenPriceHistory.DoesNotExist):
+            token_price_history.sync_token_rounds(
+                token, convert_to_usd=True, first_aggregator_round=4
+            )
+        assert chainlink[0] == [_proxy_round(1, 4), _proxy_round(1, 5)]
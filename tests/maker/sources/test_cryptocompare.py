@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from maker.sources.cryptocompare import (
+    HISTORY_INTERVALS,
+    HISTORY_PAGE_LIMIT,
+    CryptoCompareClient,
+)
+
+HOUR = HISTORY_INTERVALS["histohour"]
+TO_TIMESTAMP = 1640995199  # 2021-12-31 23:59:59 UTC
+
+
+class CountingRateLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, tokens=1):
+        self.acquired += tokens
+
+
+def _history_callback(requests):
+    def callback(request):
+        params = parse_qs(urlparse(request.url).query)
+        to_ts = int(params["toTs"][0])
+        requests.append(to_ts)
+        time_to = to_ts // HOUR * HOUR
+        time_from = time_to - HISTORY_PAGE_LIMIT * HOUR
+        data = [
+            {"time": time, "close": 1, "volumeto": 1}
+            for time in range(time_from, time_to + 1, HOUR)
+        ]
+        body = {
+            "Response": "Success",
+            "Data": {"TimeFrom": time_from, "TimeTo": time_to, "Data": data},
+        }
+        return 200, {}, json.dumps(body)
+
+    return callback
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+
+class TestCryptoCompareClient:
+    def test_fetch_full_history_fetches_pages_concurrently_and_caches_them(
+        self, responses, locmem_cache
+    ):
+        requests = []
+        responses.add_callback(
+            responses.GET,
+            "https://min-api.cryptocompare.com/data/histohour",
+            callback=_history_callback(requests),
+        )
+        rate_limiter = CountingRateLimiter()
+        client = CryptoCompareClient(api_key="key", rate_limiter=rate_limiter)
+
+        data = client.fetch_full_history(
+            "ETH",
+            "USD",
+            "Coinbase",
+            ts=TO_TIMESTAMP,
+            ohlcv_type="histohour",
+            number_of_days=200,
+        )
+
+        times = [row["time"] for row in data]
+        from_timestamp = TO_TIMESTAMP - 200 * 24 * HOUR
+        assert times == list(
+            range(from_timestamp // HOUR * HOUR + HOUR, TO_TIMESTAMP, HOUR)
+        )
+        # 200 days of hourly candles need 3 pages of 2000 candles
+        assert len(requests) == 3
+        assert rate_limiter.acquired == 3
+
+        # Pages of closed candles are served from the cache
+        assert (
+            client.fetch_full_history(
+                "ETH",
+                "USD",
+                "Coinbase",
+                ts=TO_TIMESTAMP,
+                ohlcv_type="histohour",
+                number_of_days=200,
+            )
+            == data
+        )
+        assert len(requests) == 3
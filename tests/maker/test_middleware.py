@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from maker.middleware import DatasetConditionalGetMiddleware
+from maker.utils.cache import bump_dataset_version
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+class IlksView(APIView):
+    cache_datasets = ("ilks",)
+
+    def get(self, request):
+        IlksView.calls += 1
+        return Response({"ilks": []})
+
+
+class TestDatasetConditionalGetMiddleware:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        IlksView.calls = 0
+        self.view = IlksView.as_view()
+        self.middleware = DatasetConditionalGetMiddleware(self._get_response)
+
+    def _get_response(self, request):
+        response = self.middleware.process_view(request, self.view, (), {})
+        if response is None:
+            response = self.view(request)
+        return response
+
+    def _get(self, **headers):
+        return self.middleware(RequestFactory().get("/ilks/?type=risky", **headers))
+
+    def test_returns_304_until_dataset_changes(self):
+        response = self._get()
+        assert response.status_code == 200
+        etag = response["ETag"]
+
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        assert IlksView.calls == 1
+
+        bump_dataset_version("ilks")
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert IlksView.calls == 2
+
+    def test_time_bucket_changes_etag(self, monkeypatch):
+        now = [1000]
+        monkeypatch.setattr("maker.utils.cache.time.time", lambda: now[0])
+        monkeypatch.setattr(IlksView, "cache_time_bucket", 60, raising=False)
+        etag = self._get()["ETag"]
+
+        now[0] = 1019
+        assert self._get(HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        now[0] = 1020
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_skips_views_without_datasets(self):
+        IlksView.cache_datasets = ()
+        try:
+            response = self._get()
+        finally:
+            IlksView.cache_datasets = ("ilks",)
+        assert response.status_code == 200
+        assert not response.has_header("ETag")
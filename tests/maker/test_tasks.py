@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+
+from maker import tasks
+from maker.constants import DATASET_OSM, DATASET_VAULTS
+from maker.models import IngestionChunk
+
+
+def _record_calls(monkeypatch, names):
+    calls = []
+    for name in names:
+        monkeypatch.setattr(
+            tasks, name, lambda *args, _name=name, **kwargs: calls.append(_name)
+        )
+    return calls
+
+
+def test_sync_d3m_task_saves_surplus_buffer_and_overall_stats(monkeypatch):
+    calls = _record_calls(
+        monkeypatch,
+        ["refresh_market_states", "save_surplus_buffer", "save_overall_stats"],
+    )
+    for module in (tasks.aave, tasks.compound, tasks.spark):
+        monkeypatch.setattr(module, "save_d3m", lambda: calls.append("save_d3m"))
+
+    tasks.sync_d3m_task()
+
+    assert calls == [
+        "save_d3m",
+        "save_d3m",
+        "save_d3m",
+        "save_surplus_buffer",
+        "save_overall_stats",
+    ]
+
+
+def test_refresh_d3m_market_states_task_only_refreshes_market_states(monkeypatch):
+    calls = _record_calls(
+        monkeypatch,
+        ["refresh_market_states", "save_surplus_buffer", "save_overall_stats"],
+    )
+
+    tasks.refresh_d3m_market_states_task()
+
+    assert calls == ["refresh_market_states"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "stream, processed, expected",
+    [
+        ("medianizer", True, [DATASET_OSM]),
+        ("urn_event_states", True, [DATASET_OSM, DATASET_VAULTS]),
+        ("clipper_events", True, []),
+        ("medianizer", False, []),
+    ],
+)
+def test_process_ingestion_chunk_task_bumps_stream_datasets(
+    monkeypatch, stream, processed, expected
+):
+    chunk = IngestionChunk.objects.create(stream=stream, from_block=1, to_block=10)
+    monkeypatch.setattr(tasks, "process_chunk", lambda chunk_id: processed)
+    bumped = []
+    monkeypatch.setattr(tasks, "bump_dataset_version", bumped.append)
+
+    tasks.process_ingestion_chunk_task(chunk.id)
+
+    assert bumped == expected
@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from maker.modules.osm import TO_NEXT_CHANGE_TIME_BUCKET
+from maker.utils import cache as response_cache
+from maker.utils.cache import (
+    bump_dataset_version,
+    cache_response,
+    revalidate_response,
+    stale_while_revalidate,
+)
+from maker.views.ilk import IlkOSMView
+from maker.views.osm import OSMAsset, OSMTableView
+from maker.views.vaults_at_risk import VaultsAtRiskMarketView, VaultsAtRiskView
+
+SWR_CALLS = []
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@stale_while_revalidate("vaults", fresh_for=60)
+class SWRView(APIView):
+    def get(self, request, symbol):
+        SWR_CALLS.append(symbol)
+        return Response({"calls": len(SWR_CALLS)}, status=status.HTTP_200_OK)
+
+
+@stale_while_revalidate("vaults", fresh_for=60)
+class QuerySWRView(APIView):
+    def get(self, request, symbol):
+        return Response(
+            {
+                "url": request.build_absolute_uri(request.path),
+                "query": dict(request.GET.lists()),
+                "symbol": symbol,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+def _make_view(calls, response_status=status.HTTP_200_OK):
+    @cache_response("vaults", "osm")
+    class View(APIView):
+        def get(self, request):
+            calls.append(request.GET.dict())
+            return Response({"calls": len(calls)}, status=response_status)
+
+    return View.as_view()
+
+
+def _get(view, query):
+    return view(APIRequestFactory().get("/vaults/" + query))
+
+
+def test_cache_response_serves_same_query_until_dataset_is_bumped():
+    calls = []
+    view = _make_view(calls)
+
+    assert _get(view, "?a=1&b=2").data == {"calls": 1}
+    assert _get(view, "?b=2&a=1").data == {"calls": 1}
+    assert _get(view, "?a=2&b=2").data == {"calls": 2}
+
+    bump_dataset_version("osm")
+    assert _get(view, "?a=1&b=2").data == {"calls": 3}
+    assert _get(view, "?a=1&b=2").data == {"calls": 3}
+
+
+def test_cache_response_is_cached_per_host(settings):
+    settings.ALLOWED_HOSTS = ["a.example.com", "b.example.com"]
+    calls = []
+    view = _make_view(calls)
+
+    for host in ["a.example.com", "b.example.com", "a.example.com"]:
+        view(APIRequestFactory().get("/vaults/", HTTP_HOST=host))
+
+    assert len(calls) == 2
+
+
+def test_cache_response_skips_unsuccessful_responses():
+    calls = []
+    view = _make_view(calls, response_status=status.HTTP_400_BAD_REQUEST)
+
+    assert _get(view, "?a=1").status_code == status.HTTP_400_BAD_REQUEST
+    assert _get(view, "?a=1").status_code == status.HTTP_400_BAD_REQUEST
+    assert len(calls) == 2
+
+
+def test_cache_response_with_time_bucket_expires_with_the_bucket(monkeypatch):
+    now = [1000]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    calls = []
+
+    @cache_response("osm", time_bucket=60)
+    class View(APIView):
+        def get(self, request):
+            calls.append(request.GET.dict())
+            return Response({"calls": len(calls)}, status=status.HTTP_200_OK)
+
+    view = View.as_view()
+    assert _get(view, "?a=1").data == {"calls": 1}
+    now[0] = 1019
+    assert _get(view, "?a=1").data == {"calls": 1}
+    now[0] = 1020
+    assert _get(view, "?a=1").data == {"calls": 2}
+
+
+@pytest.mark.parametrize(
+    "view_class",
+    [OSMAsset, OSMTableView, IlkOSMView, VaultsAtRiskView, VaultsAtRiskMarketView],
+)
+def test_views_with_osm_countdown_use_time_bucket(view_class):
+    # to_next_change depends on the current time, not only on the OSM dataset
+    assert "osm" in view_class.cache_datasets
+    assert view_class.cache_time_bucket == TO_NEXT_CHANGE_TIME_BUCKET
+
+
+class TestStaleWhileRevalidate:
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        SWR_CALLS.clear()
+        self.scheduled = []
+        monkeypatch.setattr(
+            "maker.tasks.revalidate_response_task.delay",
+            lambda *args: self.scheduled.append(args),
+        )
+        self.now = 1000
+        monkeypatch.setattr(response_cache.time, "time", lambda: self.now)
+
+    def _get(self):
+        request = APIRequestFactory().get("/whales/ETH/?a=1")
+        return SWRView.as_view()(request, symbol="ETH").data
+
+    def test_serves_stale_response_and_schedules_one_revalidation(self):
+        assert self._get() == {"calls": 1}
+        assert self._get() == {"calls": 1}
+        assert self.scheduled == []
+
+        self.now += 61
+        assert self._get() == {"calls": 1}
+        assert self._get() == {"calls": 1}
+        assert self.scheduled == [
+            (
+                "tests.maker.utils.test_cache.SWRView",
+                "http://testserver/whales/ETH/",
+                "a=1",
+                {"symbol": "ETH"},
+            )
+        ]
+
+        revalidate_response(*self.scheduled[0])
+        assert self._get() == {"calls": 2}
+
+        # the lock was released, so the next stale read schedules again
+        bump_dataset_version("vaults")
+        assert self._get() == {"calls": 2}
+        assert len(self.scheduled) == 2
+
+    def test_revalidation_recomputes_with_url_and_query(self, settings):
+        settings.ALLOWED_HOSTS = ["api.example.com"]
+        response = revalidate_response(
+            "tests.maker.utils.test_cache.QuerySWRView",
+            "https://api.example.com/whales/ETH/",
+            "a=1&b=2&b=3",
+            {"symbol": "ETH"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "url": "https://api.example.com/whales/ETH/",
+            "query": {"a": ["1"], "b": ["2", "3"]},
+            "symbol": "ETH",
+        }
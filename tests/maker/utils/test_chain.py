@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from maker.utils.blockchain.chain import Blockchain, LogScanner
+from tests.conftest import ETH_NODE_STUB_URL, JSONRPCError
+
+
+def _log(block_number):
+    return {
+        "address": "0x" + "0" * 40,
+        "blockHash": "0x" + "0" * 64,
+        "blockNumber": hex(block_number),
+        "data": "0x",
+        "logIndex": "0x0",
+        "removed": False,
+        "topics": [],
+        "transactionHash": "0x" + "0" * 64,
+        "transactionIndex": "0x0",
+    }
+
+
+class TestLogScanner:
+    def test_scan_adapts_window_size_and_keeps_order(self, rpc_stub):
+        # Sparse history with a dense part that's over the result limit of the node
+        event_blocks = [5, 950, 2500] + list(range(3000, 3020)) + [9999]
+
+        def get_logs(filters):
+            from_block = int(filters["fromBlock"], 16)
+            to_block = int(filters["toBlock"], 16)
+            logs = [_log(b) for b in event_blocks if from_block <= b <= to_block]
+            if len(logs) > 10:
+                raise JSONRPCError(-32005, "query returned more than 10 results")
+            return logs
+
+        rpc_stub.add("eth_getLogs", get_logs)
+        scanner = LogScanner(
+            Blockchain(node=ETH_NODE_STUB_URL),
+            step=500,
+            target_results=8,
+            workers=3,
+        )
+
+        windows = list(scanner.scan({"topics": []}, 0, 9999))
+
+        blocks = [log["blockNumber"] for _, _, logs in windows for log in logs]
+        assert blocks == event_blocks
+        # Windows are consecutive and cover the whole range
+        assert windows[0][0] == 0
+        assert windows[-1][1] == 9999
+        for (_, prev_end, _), (start, _, _) in zip(windows, windows[1:]):
+            assert start == prev_end + 1
+        # Sparse windows make the window size grow
+        assert windows[-1][1] - windows[-1][0] > 500
@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from maker.utils.renderers import DecimalStringJSONRenderer, FastJSONRenderer
+
+PAYLOAD = {
+    "results": [
+        {
+            "datetime": datetime(2022, 1, 1, 12, 30, 15, 123000),
+            "aware": datetime(2022, 1, 1, tzinfo=timezone.utc),
+            "date": date(2022, 1, 1),
+            "duration": timedelta(hours=1),
+            "amount": Decimal("3012.551234567890000000"),
+            "ratio": 175.654321,
+            "numpy": np.float64(1.5),
+            "symbols": {"ETH"},
+            "name": "Vault\u2028ünïcode",
+            "empty": None,
+        }
+    ],
+    1: "non str key",
+}
+
+
+def test_fast_renderer_output_matches_json_renderer():
+    expected = JSONRenderer().render(PAYLOAD)
+    rendered = FastJSONRenderer().render(PAYLOAD)
+
+    assert json.loads(rendered) == json.loads(expected)
+    assert b"\\u2028" in rendered
+    assert b'"aware":"2022-01-01T00:00:00Z"' in rendered
+
+
+def test_decimal_string_renderer_keeps_precision():
+    rendered = DecimalStringJSONRenderer().render({"amount": Decimal("1.10")})
+
+    assert rendered == b'{"amount":"1.10"}'
+
+
+@pytest.mark.parametrize("data, expected", [(None, b""), ({"a": 1}, b'{"a":1}')])
+def test_fast_renderer_render(data, expected):
+    assert FastJSONRenderer().render(data) == expected
+
+
+def test_fast_renderer_falls_back_for_indented_responses():
+    rendered = FastJSONRenderer().render(
+        {"a": 1}, "application/json; indent=2", renderer_context={}
+    )
+
+    assert rendered == b'{\n  "a": 1\n}'
+
+
+def test_fast_renderer_falls_back_for_integers_over_64_bits():
+    rendered = FastJSONRenderer().render({"a": 2**70, "amount": Decimal("1.5")})
+
+    assert json.loads(rendered) == {"a": 2**70, "amount": 1.5}
+
+
+def test_decimal_string_renderer_falls_back_for_integers_over_64_bits():
+    rendered = DecimalStringJSONRenderer().render(
+        {"a": 2**70, "amount": Decimal("1.10")}
+    )
+
+    assert json.loads(rendered) == {"a": 2**70, "amount": "1.10"}
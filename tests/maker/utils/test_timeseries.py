@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from maker.utils.timeseries import (
+    DOWNSAMPLE_LTTB,
+    DOWNSAMPLE_MIN_MAX,
+    downsample,
+    lttb_indices,
+    min_max_indices,
+)
+
+
+def _rows(prices):
+    return [
+        {"key": "OSM", "timestamp": 1000 + idx, "amount": Decimal(price)}
+        for idx, price in enumerate(prices)
+    ]
+
+
+class TestDownsample:
+    def test_short_series_is_returned_as_is(self):
+        rows = _rows([1, 2, 3])
+        assert downsample(rows, 10) == rows
+        assert downsample(rows, None) == rows
+
+    def test_lttb_keeps_edges_and_spikes(self):
+        prices = [10] * 100
+        prices[42] = 50
+        rows = downsample(_rows(prices), 10)
+
+        assert len(rows) == 10
+        assert rows[0]["timestamp"] == 1000
+        assert rows[-1]["timestamp"] == 1099
+        assert {"key": "OSM", "timestamp": 1042, "amount": Decimal(50)} in rows
+
+    def test_min_max_keeps_extremes_of_each_bucket(self):
+        prices = np.sin(np.linspace(0, 20, 1000)) * 100 + 1000
+        indices = min_max_indices(np.arange(1000), prices, 50)
+
+        assert len(indices) <= 50
+        assert list(indices) == sorted(indices)
+        assert int(prices.argmin()) in indices
+        assert int(prices.argmax()) in indices
+
+        rows = downsample(_rows(prices), 50, method=DOWNSAMPLE_MIN_MAX)
+        assert [row["timestamp"] - 1000 for row in rows] == list(indices)
+
+    def test_lttb_indices_are_sorted_and_unique(self):
+        ys = np.random.default_rng(1).random(5000)
+        indices = lttb_indices(np.arange(5000), ys, 500)
+
+        assert len(indices) == 500
+        assert len(set(indices)) == 500
+        assert list(indices) == sorted(indices)
+
+    @pytest.mark.parametrize(
+        "method, points, expected",
+        [
+            (DOWNSAMPLE_LTTB, 1, [1000]),
+            (DOWNSAMPLE_LTTB, 2, [1000, 1099]),
+            (DOWNSAMPLE_MIN_MAX, 1, [1000]),
+            (DOWNSAMPLE_MIN_MAX, 3, [1000, 1099]),
+        ],
+    )
+    def test_small_budgets_keep_first_and_last_point(self, method, points, expected):
+        rows = downsample(_rows(range(100)), points, method=method)
+
+        assert [row["timestamp"] for row in rows] == expected
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            downsample(_rows(range(10)), 5, method="median")
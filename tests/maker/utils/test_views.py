@@ -0,0 +1,193 @@
+# SPDX-FileCopyrightText: © 2022 Dai Foundation <www.daifoundation.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from maker.models import DAITrade
+from maker.utils.cache import bump_dataset_version
+from maker.utils.views import PaginatedApiView, estimate_count
+from maker.views.liquidations import LiquidationsView
+from maker.views.psm import PSMEventsView
+from maker.views.wallets import WalletEventsView
+from tests.maker.factories import DAITradeFactory
+
+
+class TradesView(PaginatedApiView):
+    default_order = "-timestamp"
+    ordering_fields = ["dai_price"]
+    cursor_pagination = True
+    cursor_ordering_fields = ["timestamp"]
+    cursor_tiebreaker = "id"
+
+    def get_queryset(self, **kwargs):
+        return DAITrade.objects.values("id", "timestamp", "dai_price")
+
+
+class CachedCountTradesView(TradesView):
+    cache_datasets = ("trades",)
+
+
+def _get(url, view_class=TradesView):
+    return view_class.as_view()(APIRequestFactory().get(url)).data
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_all_rows_in_order():
+    for timestamp in [5, 4, 4, 4, 3, 1]:
+        DAITradeFactory(timestamp=Decimal(timestamp))
+    expected = list(
+        DAITrade.objects.order_by("-timestamp", "-id").values_list("id", flat=True)
+    )
+
+    data = _get("/trades/?pagination=cursor&p_size=2")
+    assert data["count"] > 0
+    ids = [row["id"] for row in data["results"]]
+    while data["next"]:
+        data = _get(data["next"])
+        ids.extend(row["id"] for row in data["results"])
+
+    assert ids == expected
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_falls_back_to_pages_for_nullable_ordering():
+    for dai_price in [None, Decimal("1.01"), None, Decimal("0.99"), None]:
+        DAITradeFactory(dai_price=dai_price)
+
+    data = _get("/trades/?pagination=cursor&order=-dai_price&p_size=2")
+    assert data["count"] == 5
+    assert "p=2" in data["next"]
+    ids = [row["id"] for row in data["results"]]
+    while data["next"]:
+        data = _get(data["next"])
+        ids.extend(row["id"] for row in data["results"])
+
+    assert sorted(ids) == sorted(DAITrade.objects.values_list("id", flat=True))
+
+
+@pytest.mark.parametrize(
+    "view_class", [LiquidationsView, PSMEventsView, WalletEventsView]
+)
+def test_cursor_ordering_on_non_unique_fields_has_tiebreaker(view_class):
+    for field in view_class.cursor_ordering_fields:
+        assert view_class().get_cursor_ordering("-" + field) == (
+            "-" + field,
+            "-id",
+        )
+
+
+@pytest.mark.django_db
+def test_page_number_pagination_is_the_default():
+    DAITradeFactory.create_batch(3)
+
+    data = _get("/trades/?p_size=2")
+
+    assert data["count"] == 3
+    assert len(data["results"]) == 2
+    assert "p=2" in data["next"]
+
+
+@pytest.mark.django_db
+def test_count_false_skips_counting_but_keeps_next_link():
+    DAITradeFactory.create_batch(3)
+
+    data = _get("/trades/?p_size=2&count=false")
+    assert data["count"] is None
+    assert "p=2" in data["next"]
+
+    data = _get(data["next"])
+    assert data["count"] is None
+    assert data["next"] is None
+    assert len(data["results"]) == 1
+
+
+@pytest.mark.django_db
+def test_exact_count_is_cached_until_dataset_changes(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    DAITradeFactory.create_batch(3)
+    url = "/trades/?p_size=2"
+
+    assert _get(url, CachedCountTradesView)["count"] == 3
+    DAITradeFactory()
+    assert _get(url, CachedCountTradesView)["count"] == 3
+
+    bump_dataset_version("trades")
+    assert _get(url, CachedCountTradesView)["count"] == 4
+
+
+@pytest.mark.django_db
+def test_large_querysets_use_planner_estimate(monkeypatch):
+    DAITradeFactory.create_batch(3)
+    monkeypatch.setattr(TradesView, "count_estimate_threshold", 0)
+
+    data = _get("/trades/?p_size=2")
+
+    assert data["count"] == estimate_count(DAITrade.objects.values("id"))
+
+
+@pytest.mark.django_db
+def test_too_high_count_is_clamped_on_the_last_page(monkeypatch):
+    DAITradeFactory.create_batch(3)
+    monkeypatch.setattr(TradesView, "get_count", lambda self, queryset, request: 100)
+
+    data = _get("/trades/?p_size=2")
+    assert data["count"] == 100
+    assert "p=2" in data["next"]
+
+    data = _get(data["next"])
+    assert data["count"] == 3
+    assert data["next"] is None
+
+    data = _get("/trades/?p_size=2&p=4")
+    assert data["results"] == []
+    assert data["next"] is None
+
+
+class SearchView(PaginatedApiView):
+    search_fields = ["owner_address", "uid", "owner_name"]
+    hex_search_fields = ["owner_address"]
+
+
+@pytest.mark.parametrize(
+    "search, expected",
+    [
+        ("", Q()),
+        (
+            " 0xAB12 ",
+            Q(owner_address__istartswith="0xAB12")
+            | Q(uid__icontains="0xAB12")
+            | Q(owner_name__icontains="0xAB12"),
+        ),
+        (
+            "ab12",
+            Q(owner_address__icontains="ab12")
+            | Q(uid__icontains="ab12")
+            | Q(owner_name__icontains="ab12"),
+        ),
+        ("maker", Q(uid__icontains="maker") | Q(owner_name__icontains="maker")),
+    ],
+)
+def test_get_search_filters(search, expected):
+    request = Request(APIRequestFactory().get("/vaults/", {"search": search}))
+
+    assert SearchView().get_search_filters(request) == expected
+
+
+def test_get_search_filters_matches_nothing_for_non_hex_term_on_hex_fields():
+    class TxSearchView(PaginatedApiView):
+        search_fields = ["tx_hash"]
+        hex_search_fields = ["tx_hash"]
+
+    request = Request(APIRequestFactory().get("/events/", {"search": "maker"}))
+
+    assert TxSearchView().get_search_filters(request) == Q(pk__in=[])